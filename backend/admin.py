@@ -1,9 +1,200 @@
-from django.contrib import admin
+import re
+
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.shortcuts import render
+from django.utils.functional import cached_property
+
+from backend.forms import AddMembersForm, ReassignOwnerForm
+from backend.models import (
+    ArchivedLease,
+    Subscription,
+    Community,
+    Item,
+    Job,
+    Lease,
+    Request,
+)
+from backend.services import add_members, bulk_update_owned_objects
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Unfiltered changelists of tables with more than ``ESTIMATE_ABOVE`` rows
+    use Postgres' planner estimate instead of a ``COUNT(*)`` over the table.
+    """
+
+    ESTIMATE_ABOVE = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                estimate = cursor.fetchone()[0]
+            if estimate > self.ESTIMATE_ABOVE:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Defaults for tables too large to count or scan. Changelists estimate the
+    unfiltered ``COUNT(*)``, and searches only use lookups an index answers:
+    a number finds the primary key, anything else is matched against the
+    start of the ``search_fields``.
+    """
+
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    list_per_page = 50
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term.isdecimal():
+            return queryset.filter(pk=search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class OwnedObjectAdmin(LargeTableAdmin):
+    list_display = ["name", "owner", "is_active", "updated_at"]
+    list_filter = ["is_active"]
+    list_select_related = ["owner"]
+    search_fields = ["name__startswith"]
+    raw_id_fields = ["owner"]
+    actions = ["deactivate", "activate", "reassign_owner"]
+
+    @admin.action(description="Deactivate selected %(verbose_name_plural)s")
+    def deactivate(self, request, queryset):
+        updated = bulk_update_owned_objects(queryset, is_active=False)
+        self.message_user(request, f"Deactivated {updated}.", messages.SUCCESS)
+
+    @admin.action(description="Activate selected %(verbose_name_plural)s")
+    def activate(self, request, queryset):
+        updated = bulk_update_owned_objects(queryset, is_active=True)
+        self.message_user(request, f"Activated {updated}.", messages.SUCCESS)
+
+    @admin.action(description="Reassign owner of selected %(verbose_name_plural)s")
+    def reassign_owner(self, request, queryset):
+        form = ReassignOwnerForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            # With "select all" the selection is the filtered changelist, so
+            # only the pks that were ticked are passed along.
+            return render(
+                request,
+                "admin/backend/reassign_owner.html",
+                {
+                    **self.admin_site.each_context(request),
+                    "title": "Reassign owner",
+                    "opts": self.model._meta,
+                    "form": form,
+                    "selected": request.POST.getlist(ACTION_CHECKBOX_NAME),
+                    "select_across": request.POST.get("select_across") == "1",
+                    "action_checkbox_name": ACTION_CHECKBOX_NAME,
+                },
+            )
+
+        owner = form.cleaned_data["username"]
+        updated = bulk_update_owned_objects(queryset, owner_id=owner.pk)
+        self.message_user(
+            request, f"Gave {updated} to {owner.username}.", messages.SUCCESS
+        )
+
+
+class CommunityAdmin(OwnedObjectAdmin):
+    list_display = ["name", "owner", "member_count", "is_active", "updated_at"]
+    raw_id_fields = ["owner", "members"]
+    actions = OwnedObjectAdmin.actions + ["add_members_by_username"]
+
+    @admin.action(description="Add members by username")
+    def add_members_by_username(self, request, queryset):
+        form = AddMembersForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return render(
+                request,
+                "admin/backend/community/add_members.html",
+                {
+                    **self.admin_site.each_context(request),
+                    "title": "Add members by username",
+                    "opts": self.model._meta,
+                    "form": form,
+                    "communities": queryset,
+                    "action_checkbox_name": ACTION_CHECKBOX_NAME,
+                },
+            )
+
+        usernames = set(re.split(r"[\s,]+", form.cleaned_data["usernames"])) - {""}
+        user_ids = dict(
+            User.objects.filter(username__in=usernames).values_list("username", "id")
+        )
+        communities = list(queryset)
+        for community in communities:
+            add_members(community, user_ids.values())
+        self.message_user(
+            request,
+            f"Added {len(user_ids)} users to {len(communities)} communities.",
+            messages.SUCCESS,
+        )
+        unknown = sorted(usernames - user_ids.keys())
+        if unknown:
+            self.message_user(
+                request, f"Unknown usernames: {', '.join(unknown)}", messages.WARNING
+            )
+
+
+class SharedObjectAdmin(OwnedObjectAdmin):
+    autocomplete_fields = ["shared_with"]
+
+
+class ItemAdmin(SharedObjectAdmin):
+    list_display = ["name", "owner", "item_type", "is_active", "updated_at"]
+    list_filter = ["is_active", "item_type"]
+
+
+class SubscriptionAdmin(SharedObjectAdmin):
+    list_display = ["name", "owner", "seats", "seats_taken", "is_active", "updated_at"]
+    raw_id_fields = ["owner", "shared_to"]
+
+
+class RequestAdmin(SharedObjectAdmin):
+    list_display = ["name", "owner", "request_type", "is_completed", "updated_at"]
+    list_filter = ["is_active", "is_completed", "request_type"]
+
+
+class LeaseAdmin(LargeTableAdmin):
+    list_display = ["item", "lessee", "start_date", "end_date"]
+    list_select_related = ["item__owner", "lessee"]
+    search_fields = ["item__name__startswith"]
+    raw_id_fields = ["item", "lessee"]
+    date_hierarchy = "start_date"
+    ordering = ["-start_date"]
+
+
+class ArchivedLeaseAdmin(LeaseAdmin):
+    # Only (item, end_date) is indexed here.
+    date_hierarchy = None
+    ordering = ["-id"]
+
+
+class JobAdmin(LargeTableAdmin):
+    list_display = ["name", "status", "run_at", "attempts", "updated_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["name__startswith"]
 
-from backend.models import Subscription, Community, Item, Lease
 
 # Register your models here.
-admin.site.register(Subscription)
-admin.site.register(Community)
-admin.site.register(Item)
-admin.site.register(Lease)
+admin.site.register(Subscription, SubscriptionAdmin)
+admin.site.register(Community, CommunityAdmin)
+admin.site.register(Item, ItemAdmin)
+admin.site.register(Request, RequestAdmin)
+admin.site.register(Lease, LeaseAdmin)
+admin.site.register(ArchivedLease, ArchivedLeaseAdmin)
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,351 @@
+"""
+Versioned JSON API over the same service functions as the HTML views.
+
+Lists use keyset (cursor) pagination on the primary key and sparse field
+selection, ``?fields=id,name``. Only the selected columns are fetched from the
+database. Responses are gzipped for clients that accept it.
+"""
+
+import base64
+from datetime import datetime, time, timedelta
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from backend.models import Community, Request
+from backend.services import (
+    get_activity_feed,
+    get_dashboard_data,
+    get_items_availability,
+    get_items_available_between,
+    get_pending_requests_for_user,
+    get_user_communities,
+    get_user_items,
+    get_user_subscriptions,
+    get_visible_items,
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_AVAILABILITY_DAYS = 30
+MAX_AVAILABILITY_DAYS = 366
+
+# Public field name -> ORM lookup, plus the fields returned by default.
+ITEM_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "item_type": "item_type",
+    "owner": "owner__username",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+ITEM_DEFAULT_FIELDS = ["id", "name", "item_type", "owner"]
+
+SUBSCRIPTION_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "owner": "owner__username",
+    "is_active": "is_active",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+SUBSCRIPTION_DEFAULT_FIELDS = ["id", "name", "owner"]
+
+REQUEST_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "request_type": "request_type",
+    "owner": "owner__username",
+    "is_completed": "is_completed",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+REQUEST_DEFAULT_FIELDS = ["id", "name", "request_type", "owner"]
+
+COMMUNITY_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "owner": "owner__username",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+COMMUNITY_DEFAULT_FIELDS = ["id", "name", "owner"]
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def api_view(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required"}, status=401)
+        try:
+            return JsonResponse(view(request, *args, **kwargs))
+        except ApiError as error:
+            return JsonResponse({"error": error.message}, status=error.status)
+
+    return gzip_page(require_GET(wrapper))
+
+
+def encode_cursor(pk: int) -> str:
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(cursor + padding).decode())
+    except ValueError:
+        raise ApiError("Invalid cursor")
+
+
+def get_selected_fields(request, available: dict, default: list[str]) -> list[str]:
+    if not request.GET.get("fields"):
+        return default
+    fields = [field for field in request.GET["fields"].split(",") if field]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def get_page_size(request) -> int:
+    try:
+        page_size = int(request.GET.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("Invalid limit")
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def get_page(queryset, available: dict, fields: list[str], page_size: int, after=None):
+    queryset = queryset.order_by("pk")
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+
+    lookups = {available[field]: field for field in fields}
+    # The primary key is always needed to build the next cursor.
+    rows = list(queryset.values("pk", *lookups)[: page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    return {
+        "results": [
+            {public: row[lookup] for lookup, public in lookups.items()} for row in rows
+        ],
+        "next_cursor": encode_cursor(rows[-1]["pk"]) if has_more else None,
+    }
+
+
+def paginate(request, queryset, available: dict, default: list[str]) -> dict:
+    cursor = request.GET.get("cursor")
+    return get_page(
+        queryset,
+        available,
+        get_selected_fields(request, available, default),
+        get_page_size(request),
+        after=decode_cursor(cursor) if cursor else None,
+    )
+
+
+def parse_moment(value: str):
+    moment = parse_datetime(value)
+    if moment is None:
+        date = parse_date(value)
+        if date is None:
+            raise ApiError(f"Invalid date {value!r}")
+        moment = datetime.combine(date, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def get_window(request):
+    try:
+        start = parse_moment(request.GET["start"]) if "start" in request.GET else None
+        end = parse_moment(request.GET["end"]) if "end" in request.GET else None
+    except ValueError:
+        raise ApiError("Invalid date")
+    start = start or timezone.now()
+    end = end or start + timedelta(days=DEFAULT_AVAILABILITY_DAYS)
+    if end <= start:
+        raise ApiError("end must be after start")
+    if end - start > timedelta(days=MAX_AVAILABILITY_DAYS):
+        raise ApiError(f"The window can be at most {MAX_AVAILABILITY_DAYS} days")
+    return start, end
+
+
+def get_scoped_queryset(scopes: dict, scope: str):
+    if scope not in scopes:
+        raise ApiError(f"Unknown scope, expected one of: {', '.join(scopes)}", 404)
+    return scopes[scope]
+
+
+@api_view
+def items_view(request, scope):
+    items = get_user_items(request.user_context)
+    scopes = {"discover": items["discover"], "owned": items["owned"]}
+    if scope == "available":
+        scopes["available"] = get_items_available_between(
+            request.user_context, *get_window(request)
+        )
+    return paginate(
+        request, get_scoped_queryset(scopes, scope), ITEM_FIELDS, ITEM_DEFAULT_FIELDS
+    )
+
+
+@api_view
+def subscriptions_view(request, scope):
+    scopes = get_user_subscriptions(request.user_context)
+    return paginate(
+        request,
+        get_scoped_queryset(scopes, scope),
+        SUBSCRIPTION_FIELDS,
+        SUBSCRIPTION_DEFAULT_FIELDS,
+    )
+
+
+@api_view
+def requests_view(request, scope):
+    scopes = {
+        "discover": get_pending_requests_for_user(request.user_context),
+        "owned": Request.objects.filter(owner=request.user),
+    }
+    return paginate(
+        request,
+        get_scoped_queryset(scopes, scope),
+        REQUEST_FIELDS,
+        REQUEST_DEFAULT_FIELDS,
+    )
+
+
+@api_view
+def feed_view(request):
+    """
+    The user's activity feed, newest and closest first. Cursors are opaque
+    like everywhere else, but order by score rather than by primary key.
+    """
+    try:
+        feed = get_activity_feed(request.user_context, request.GET.get("cursor"))
+    except ValueError:
+        raise ApiError("Invalid cursor")
+    return {
+        "results": [
+            {
+                "id": entry.pk,
+                "verb": entry.verb,
+                "actor": entry.actor.username,
+                "community": entry.community.name,
+                "object_id": entry.object_id,
+                "object_name": entry.object_name,
+                "count": entry.count,
+                "created_at": entry.created_at,
+            }
+            for entry in feed["feed"]
+        ],
+        "next_cursor": feed["next_cursor"],
+    }
+
+
+@api_view
+def communities_view(request, scope):
+    scopes = get_user_communities(request.user_context)
+    return paginate(
+        request,
+        get_scoped_queryset(scopes, scope),
+        COMMUNITY_FIELDS,
+        COMMUNITY_DEFAULT_FIELDS,
+    )
+
+
+def availability_response(item_ids, start, end) -> dict:
+    availability = get_items_availability(item_ids, start, end)
+    return {
+        "start": start,
+        "end": end,
+        "items": {str(item_id): slots for item_id, slots in availability.items()},
+    }
+
+
+@api_view
+def item_availability_view(request, pk):
+    start, end = get_window(request)
+    if not get_visible_items(request.user_context).filter(pk=pk).exists():
+        raise ApiError("Item not found", 404)
+    return availability_response([pk], start, end)
+
+
+@api_view
+def availability_view(request):
+    """
+    Availability of many items at once, either ``?items=1,2,3`` or every item
+    shared with one of the user's communities, ``?community=1``.
+    """
+    start, end = get_window(request)
+    items = get_visible_items(request.user_context)
+    if "community" in request.GET:
+        community_id = request.GET["community"]
+        if not community_id.isdecimal():
+            raise ApiError("Invalid community")
+        if int(community_id) not in request.user_context.community_ids:
+            raise ApiError("Community not found", 404)
+        items = items.filter(shared_with=community_id)
+    elif "items" in request.GET:
+        try:
+            ids = [int(pk) for pk in request.GET["items"].split(",") if pk]
+        except ValueError:
+            raise ApiError("Invalid items")
+        items = items.filter(pk__in=ids[:MAX_PAGE_SIZE])
+    else:
+        raise ApiError("Pass either items or community")
+
+    item_ids = list(items.order_by("pk").values_list("pk", flat=True)[:MAX_PAGE_SIZE])
+    return availability_response(item_ids, start, end)
+
+
+@api_view
+def batch_view(request):
+    """
+    Everything the home screen of a client needs in a single round trip: the
+    dashboard, open requests from the user's communities and a summary of the
+    communities themselves. Every section returns its first page only.
+    """
+    page_size = get_page_size(request)
+    dashboard = get_dashboard_data(request.user_context)
+
+    communities = (
+        Community.objects.filter(id__in=request.user_context.community_ids)
+        .order_by("pk")
+        .values("id", "name", "member_count")
+    )
+    return {
+        "dashboard": {
+            "items": get_page(
+                dashboard["items_available_for_lease"],
+                ITEM_FIELDS,
+                ITEM_DEFAULT_FIELDS,
+                page_size,
+            ),
+            "subscriptions": get_page(
+                dashboard["subscriptions_available_for_share"],
+                SUBSCRIPTION_FIELDS,
+                SUBSCRIPTION_DEFAULT_FIELDS,
+                page_size,
+            ),
+        },
+        "requests": get_page(
+            get_pending_requests_for_user(request.user_context),
+            REQUEST_FIELDS,
+            REQUEST_DEFAULT_FIELDS,
+            page_size,
+        ),
+        "communities": list(communities),
+    }
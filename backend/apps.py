@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BackendConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "backend"
+
+    def ready(self):
+        # Registers the deployment checks.
+        from backend import checks  # noqa: F401
+
+        if settings.RAISE_ON_LAZY_LOADS:
+            from backend import lazyload
+
+            lazyload.install()
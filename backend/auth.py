@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+
+def user_cache_key(user_id) -> str:
+    return f"auth_user:{user_id}"
+
+
+def get_cached_user(request):
+    """
+    Same as ``django.contrib.auth.get_user`` but serves the user from the cache.
+    Cached users are invalidated whenever the user is saved or deleted, the
+    session hash is still verified on every request so password changes log
+    other sessions out just like before.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    backend_path = request.session.get(BACKEND_SESSION_KEY)
+    if user_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    cache_key = user_cache_key(user_id)
+    user = cache.get(cache_key)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(cache_key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(
+        session_hash, user.get_session_auth_hash()
+    ):
+        # Let Django deal with fallback secret keys and flushing the session.
+        return auth.get_user(request)
+
+    user.backend = backend_path
+    return user
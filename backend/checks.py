@@ -0,0 +1,38 @@
+"""
+Deployment checks, run by ``manage.py check --deploy`` and by the WSGI and ASGI
+entry points before they serve requests.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.core.exceptions import ImproperlyConfigured
+
+SHARED_CACHE_BACKENDS = ("django.core.cache.backends.redis.RedisCache",)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs=None, **kwargs) -> list[Error]:
+    """
+    Production caches sessions, users and version stamps, which every worker
+    on every machine has to see, so it needs a cache they all share.
+    """
+    if os.environ.get("DJANGO_ENV") != "production":
+        return []
+    if settings.CACHES["default"]["BACKEND"] in SHARED_CACHE_BACKENDS:
+        return []
+    return [
+        Error(
+            "The default cache is not shared between processes and machines.",
+            hint="Set REDIS_URL.",
+            id="backend.E001",
+        )
+    ]
+
+
+def ensure_shared_cache() -> None:
+    """Refuses to serve requests in production without a shared cache."""
+    errors = check_shared_cache()
+    if errors:
+        raise ImproperlyConfigured(f"{errors[0].msg} {errors[0].hint}")
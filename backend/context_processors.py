@@ -0,0 +1,5 @@
+from django.conf import settings
+
+
+def event_stream(request):
+    return {"event_stream_enabled": settings.EVENT_STREAM_ENABLED}
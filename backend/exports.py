@@ -0,0 +1,132 @@
+"""
+Streaming CSV and JSON Lines exports.
+
+Rows are read with ``.iterator()`` and formatted one at a time, so an export
+never holds more than one chunk of rows in memory and the first bytes go out
+as soon as the first chunk is fetched. Lease exports stream the archived
+leases after the live ones, with the same columns.
+"""
+
+import csv
+import json
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+
+from backend.models import (
+    ArchivedLease,
+    Community,
+    Item,
+    Lease,
+    Request,
+    Subscription,
+)
+from backend.routers import reads_from_replica
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def _lease_id(lease: Lease | ArchivedLease) -> int:
+    # Archived leases keep the id they had as a lease.
+    return lease.lease_id if isinstance(lease, ArchivedLease) else lease.pk
+
+
+EXPORT_COLUMNS = {
+    "items": [
+        ("id", lambda item: item.pk),
+        ("name", lambda item: item.name),
+        ("item_type", lambda item: item.item_type),
+        ("is_active", lambda item: item.is_active),
+        ("owner", lambda item: item.owner.username),
+        ("created_at", lambda item: item.created_at),
+    ],
+    "subscriptions": [
+        ("id", lambda subscription: subscription.pk),
+        ("name", lambda subscription: subscription.name),
+        ("is_active", lambda subscription: subscription.is_active),
+        ("owner", lambda subscription: subscription.owner.username),
+        ("created_at", lambda subscription: subscription.created_at),
+    ],
+    "requests": [
+        ("id", lambda request: request.pk),
+        ("name", lambda request: request.name),
+        ("request_type", lambda request: request.request_type),
+        ("is_completed", lambda request: request.is_completed),
+        ("owner", lambda request: request.owner.username),
+        ("created_at", lambda request: request.created_at),
+    ],
+    "leases": [
+        ("id", lambda lease: _lease_id(lease)),
+        ("item", lambda lease: lease.item.name),
+        ("owner", lambda lease: lease.item.owner.username),
+        ("lessee", lambda lease: lease.lessee.username),
+        ("start_date", lambda lease: lease.start_date),
+        ("end_date", lambda lease: lease.end_date),
+    ],
+}
+
+
+@reads_from_replica
+def get_export_querysets(
+    kind: str, user: User | None = None, community: Community | None = None
+) -> list[QuerySet]:
+    """
+    Everything of one kind that belongs to a user, or what members see of a
+    community: its active shared objects and open requests. Leases are those
+    of the user's items and those they borrowed, limited to the active items
+    shared with the community for a community export, followed by the same
+    leases from the archive. Lease history is private, so a community export
+    of leases needs the user.
+    """
+    if kind == "leases":
+        querysets = []
+        for model in (Lease, ArchivedLease):
+            leases = model.objects.select_related("item__owner", "lessee").filter(
+                Q(lessee=user) | Q(item__owner=user)
+            )
+            if community is not None:
+                leases = leases.filter(
+                    item__in=Item.active.filter(shared_with=community).values("pk")
+                )
+            querysets.append(leases.order_by("pk"))
+        return querysets
+
+    model = {"items": Item, "subscriptions": Subscription, "requests": Request}[kind]
+    if community is not None:
+        objects = model.active.filter(shared_with=community)
+        if model is Request:
+            objects = objects.filter(is_completed=False)
+    else:
+        objects = model.objects.filter(owner=user)
+    return [objects.select_related("owner").order_by("pk")]
+
+
+def _iter_rows(kind: str, querysets: list[QuerySet]):
+    columns = EXPORT_COLUMNS[kind]
+    for queryset in querysets:
+        for obj in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [get_value(obj) for _, get_value in columns]
+
+
+class _Echo:
+    # csv.writer only needs an object with a write method.
+    def write(self, value):
+        return value
+
+
+def stream_export(kind: str, querysets: list[QuerySet], file_format: str):
+    """Yields the export one line at a time."""
+    header = [name for name, _ in EXPORT_COLUMNS[kind]]
+    if file_format == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(header)
+        for row in _iter_rows(kind, querysets):
+            yield writer.writerow(row)
+    else:
+        for row in _iter_rows(kind, querysets):
+            yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + "\n"
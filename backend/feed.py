@@ -0,0 +1,270 @@
+"""
+Activity feeds: what's new in the user's communities.
+
+Feeds are written ahead of time. The ``feed`` outbox consumer turns share and
+lease events into ``FeedEntry`` rows, one per member of every community the
+object was shared with, so reading a page of a feed is a single index range
+scan. Communities with more than ``FAN_OUT_MAX_MEMBERS`` members get one entry
+without a user instead, their shared timeline, which is merged into the feeds
+of their members as they are read.
+
+Entries are ordered by a score fixed when they are written: the time of the
+event plus ``CLOSENESS_SECONDS`` per doubling of the communities the reader
+shares with whoever caused it. Entries of large communities get no bonus.
+Pages are cursored on ``(score, id)``, so new entries never shift later pages.
+
+Feeds are bounded: ``trim_feeds`` runs daily and drops entries older than
+``MAX_AGE_DAYS`` and all but the newest ``MAX_ENTRIES`` of every timeline.
+"""
+
+import base64
+import math
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.models import Community, FeedEntry, Item, Request, Subscription
+from backend.versions import bump_versions
+
+FAN_OUT_MAX_MEMBERS = 500
+CLOSENESS_SECONDS = 6 * 60 * 60
+MAX_ENTRIES = 500
+MAX_AGE_DAYS = 90
+PAGE_SIZE = 20
+
+SHARED_MODELS = {
+    "item": (Item, FeedEntry.ITEM_SHARED, FeedEntry.ITEMS_SHARED),
+    "subscription": (
+        Subscription,
+        FeedEntry.SUBSCRIPTION_SHARED,
+        FeedEntry.SUBSCRIPTIONS_SHARED,
+    ),
+    "request": (Request, FeedEntry.REQUEST_SHARED, None),
+}
+
+
+def encode_cursor(entry: FeedEntry) -> str:
+    return base64.urlsafe_b64encode(f"{entry.score!r}:{entry.pk}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    """Raises ValueError for anything ``encode_cursor`` didn't return."""
+    score, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+    return float(score), int(pk)
+
+
+def get_feed(
+    user: User, community_ids, after: tuple[float, int] | None = None, limit=None
+) -> tuple[list[FeedEntry], str | None]:
+    """
+    A page of the user's feed and the cursor of the next one. Only entries of
+    communities the user still belongs to are shown.
+    """
+    limit = limit or PAGE_SIZE
+    entries = (
+        FeedEntry.objects.filter(
+            Q(user=user) | Q(user__isnull=True), community_id__in=community_ids
+        )
+        .exclude(actor=user)
+        .select_related("actor", "community")
+        .only(
+            "verb",
+            "object_id",
+            "object_name",
+            "count",
+            "score",
+            "created_at",
+            "actor__username",
+            "community__name",
+        )
+        .order_by("-score", "-id")
+    )
+    if after is not None:
+        score, pk = after
+        entries = entries.filter(Q(score__lt=score) | Q(score=score, id__lt=pk))
+
+    page = list(entries[: limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    # An object shared with several of the user's communities is shown once.
+    seen, unique = set(), []
+    for entry in page[:limit]:
+        key = (entry.verb, entry.object_id) if entry.object_id else entry.pk
+        if key not in seen:
+            seen.add(key)
+            unique.append(entry)
+    return unique, next_cursor
+
+
+def _fan_out(event, verb, actor_id, community_ids, **fields) -> None:
+    communities = Community.active.filter(pk__in=community_ids).values_list(
+        "pk", "member_count"
+    )
+    large, small = [], []
+    for community_id, member_count in communities:
+        if member_count > FAN_OUT_MAX_MEMBERS:
+            large.append(community_id)
+        else:
+            small.append(community_id)
+
+    recency = event.created_at.timestamp()
+    entries = [
+        FeedEntry(
+            community_id=community_id,
+            actor_id=actor_id,
+            verb=verb,
+            event_id=event.pk,
+            score=recency,
+            **fields,
+        )
+        for community_id in large
+    ]
+
+    memberships = Community.members.through.objects
+    recipients = {}
+    for user_id, community_id in (
+        memberships.filter(community_id__in=small)
+        .exclude(user_id=actor_id)
+        .values_list("user_id", "community_id")
+    ):
+        recipients.setdefault(user_id, community_id)
+    shared_communities = dict(
+        memberships.filter(
+            user_id__in=recipients,
+            community_id__in=memberships.filter(user_id=actor_id).values(
+                "community_id"
+            ),
+        )
+        .values("user_id")
+        .annotate(count=Count("community_id"))
+        .values_list("user_id", "count")
+    )
+    entries += [
+        FeedEntry(
+            user_id=user_id,
+            community_id=community_id,
+            actor_id=actor_id,
+            verb=verb,
+            event_id=event.pk,
+            score=recency
+            + CLOSENESS_SECONDS * math.log2(1 + shared_communities.get(user_id, 1)),
+            **fields,
+        )
+        for user_id, community_id in recipients.items()
+    ]
+    FeedEntry.objects.bulk_create(entries, batch_size=1000)
+    bump_versions(user_ids=recipients, community_ids=large)
+
+
+def _add_shared(event, kind: str) -> None:
+    model, verb, _ = SHARED_MODELS[kind]
+    objects = model.active.filter(pk__in=event.payload["ids"])
+    if model is Request:
+        objects = objects.filter(is_completed=False)
+    for obj in objects.only("name", "owner_id"):
+        _fan_out(
+            event,
+            verb,
+            obj.owner_id,
+            event.payload["community_ids"],
+            object_id=obj.pk,
+            object_name=obj.name,
+        )
+
+
+def _add_lease_returned(event) -> None:
+    end_date = parse_datetime(event.payload["end_date"])
+    if end_date is None or end_date > event.created_at:
+        return
+    item = Item.active.filter(pk=event.payload["item_id"]).only("name", "owner_id")
+    item = item.first()
+    if item is None:
+        return
+    _fan_out(
+        event,
+        FeedEntry.LEASE_RETURNED,
+        item.owner_id,
+        list(item.shared_with.values_list("pk", flat=True)),
+        object_id=item.pk,
+        object_name=item.name,
+    )
+
+
+def _remove_objects(verbs, object_ids, community_ids=None) -> None:
+    entries = FeedEntry.objects.filter(verb__in=verbs, object_id__in=object_ids)
+    if community_ids is not None:
+        entries = entries.filter(community_id__in=community_ids)
+    entries.delete()
+
+
+def _is_hidden(fields: dict) -> bool:
+    """Whether a change hides the object, its detail page no longer opens."""
+    return fields.get("is_active") is False or fields.get("is_completed") is True
+
+
+def add_events(events) -> None:
+    """Updates the feeds for a batch of outbox events, safe to repeat."""
+    FeedEntry.objects.filter(event_id__in=[event.pk for event in events]).delete()
+    for event in events:
+        kind, _, action = event.event_type.partition(".")
+        payload = event.payload
+        if kind in SHARED_MODELS:
+            _, verb, bulk_verb = SHARED_MODELS[kind]
+            # Entries about an item that is gone or hidden, whatever their verb.
+            verbs = [verb, FeedEntry.LEASE_RETURNED] if kind == "item" else [verb]
+            if action == "shared":
+                _add_shared(event, kind)
+            elif action == "unshared":
+                _remove_objects(verbs, payload["ids"], payload["community_ids"])
+            elif action == "deleted" or (action == "updated" and _is_hidden(payload)):
+                _remove_objects(verbs, [payload["id"]])
+            elif action == "bulk_updated" and _is_hidden(payload["changes"]):
+                _remove_objects(verbs, payload["ids"])
+            elif action == "bulk_shared" and bulk_verb:
+                _fan_out(
+                    event,
+                    bulk_verb,
+                    payload["owner_id"],
+                    [payload["community_id"]],
+                    count=payload["count"],
+                )
+            elif action == "imported" and bulk_verb:
+                _fan_out(
+                    event,
+                    bulk_verb,
+                    payload["owner_id"],
+                    payload["community_ids"],
+                    count=payload["count"],
+                )
+        elif event.event_type == "lease.updated":
+            _add_lease_returned(event)
+
+
+def _trim_timelines(owner_field: str, **filters) -> int:
+    crowded = (
+        FeedEntry.objects.filter(**filters)
+        .values(owner_field)
+        .annotate(count=Count("id"))
+        .filter(count__gt=MAX_ENTRIES)
+        .values_list(owner_field, flat=True)
+    )
+    deleted = 0
+    for owner_id in crowded:
+        timeline = FeedEntry.objects.filter(**filters, **{owner_field: owner_id})
+        oldest = list(
+            timeline.order_by("-score", "-id").values_list("pk", flat=True)[
+                MAX_ENTRIES:
+            ]
+        )
+        deleted += FeedEntry.objects.filter(pk__in=oldest).delete()[0]
+    return deleted
+
+
+def trim_feeds() -> int:
+    cutoff = timezone.now() - timedelta(days=MAX_AGE_DAYS)
+    deleted = FeedEntry.objects.filter(created_at__lt=cutoff).delete()[0]
+    deleted += _trim_timelines("user_id", user__isnull=False)
+    deleted += _trim_timelines("community_id", user__isnull=True)
+    return deleted
@@ -9,7 +9,19 @@ class RegistrationForm(UserCreationForm):
     usable_password = None
 
 
-class SubscriptionAddForm(forms.ModelForm):
+class SeatLimitMixin:
+    def clean(self):
+        cleaned_data = super().clean()
+        seats = cleaned_data.get("seats")
+        shared_to = cleaned_data.get("shared_to")
+        if seats is not None and shared_to is not None and len(shared_to) > seats:
+            self.add_error(
+                "shared_to", f"The subscription only has {seats} seats to share."
+            )
+        return cleaned_data
+
+
+class SubscriptionAddForm(SeatLimitMixin, forms.ModelForm):
     shared_to = forms.ModelMultipleChoiceField(
         queryset=User.objects.none(),
         required=False,
@@ -23,10 +35,10 @@ class SubscriptionAddForm(forms.ModelForm):
 
     class Meta:
         model = Subscription
-        fields = ["name", "is_active", "shared_to", "shared_with"]
+        fields = ["name", "is_active", "seats", "shared_to", "shared_with"]
 
 
-class SubscriptionUpdateForm(forms.ModelForm):
+class SubscriptionUpdateForm(SeatLimitMixin, forms.ModelForm):
     shared_to = forms.ModelMultipleChoiceField(
         queryset=User.objects.none(),
         required=False,
@@ -40,7 +52,7 @@ class SubscriptionUpdateForm(forms.ModelForm):
 
     class Meta:
         model = Subscription
-        fields = ["name", "is_active", "shared_to", "shared_with"]
+        fields = ["name", "is_active", "seats", "shared_to", "shared_with"]
 
 
 class CommunityUpdateForm(forms.ModelForm):
@@ -53,6 +65,23 @@ class UpdateCommunityMembersForm(forms.Form):
     user_name = forms.CharField(label="username", max_length=100)
 
 
+class AddMembersForm(forms.Form):
+    usernames = forms.CharField(
+        widget=forms.Textarea,
+        help_text="Separated by commas, spaces or new lines.",
+    )
+
+
+class ReassignOwnerForm(forms.Form):
+    username = forms.CharField(label="New owner")
+
+    def clean_username(self):
+        user = User.objects.filter(username=self.cleaned_data["username"]).first()
+        if user is None:
+            raise forms.ValidationError("No user with this username.")
+        return user
+
+
 class ItemCreateForm(forms.ModelForm):
     shared_with = forms.ModelMultipleChoiceField(
         queryset=Community.objects.none(),
@@ -77,6 +106,55 @@ class ItemUpdateForm(forms.ModelForm):
         fields = ["name", "is_active", "item_type", "shared_with"]
 
 
+class ItemImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="A CSV file with name and item_type columns, or a .jsonl file "
+        "with one item per line."
+    )
+    shared_with = forms.ModelMultipleChoiceField(
+        queryset=Community.objects.none(),
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+    )
+
+
+class AvailabilitySearchForm(forms.Form):
+    start = forms.DateTimeField(
+        label="From",
+        widget=forms.widgets.DateTimeInput(attrs={"type": "datetime-local"}),
+    )
+    end = forms.DateTimeField(
+        label="Until",
+        widget=forms.widgets.DateTimeInput(attrs={"type": "datetime-local"}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and end <= start:
+            raise forms.ValidationError("End date must be after start date.")
+        return cleaned_data
+
+
+class BulkShareForm(forms.Form):
+    ITEMS = "items"
+    SUBSCRIPTIONS = "subscriptions"
+    KIND_CHOICES = [
+        (ITEMS, "All my items"),
+        (SUBSCRIPTIONS, "All my subscriptions"),
+    ]
+
+    kind = forms.ChoiceField(label="Share", choices=KIND_CHOICES)
+    item_type = forms.ChoiceField(
+        choices=[("", "Any type"), *Item.ITEM_TYPE_CHOICES],
+        required=False,
+        help_text="Only applies to items.",
+    )
+    community = forms.ModelChoiceField(
+        label="With", queryset=Community.objects.none()
+    )
+
+
 class RequestCreateForm(forms.ModelForm):
     shared_with = forms.ModelMultipleChoiceField(
         queryset=Community.objects.none(),
@@ -0,0 +1,217 @@
+"""
+Background jobs stored in the ``Job`` table.
+
+Jobs are enqueued in the caller's transaction, so a job is only visible to
+workers once the change that asked for it has committed. Workers claim due
+jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any number of threads and
+processes can share the table without handing the same job out twice.
+
+A job that raises is retried with exponential backoff until it used up its
+``max_attempts``, and a job whose worker died is handed out again after
+``JOB_TIMEOUT_SECONDS``. Either way a job can run more than once, handlers
+have to be idempotent.
+
+Register handlers with the ``job`` decorator, run them with
+``python manage.py run_workers``.
+"""
+
+import logging
+import random
+import traceback
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from backend import feed, reminders
+from backend.models import Job
+from backend.routers import use_replica
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+
+@dataclass
+class JobHandler:
+    func: Callable
+    max_attempts: int
+    # Periodic jobs enqueue their next run whenever one finishes.
+    every: timedelta | None
+
+
+JOBS: dict[str, JobHandler] = {}
+
+
+def job(name: str, max_attempts: int = 5, every: timedelta | None = None):
+    def register(func):
+        JOBS[name] = JobHandler(func, max_attempts, every)
+        return func
+
+    return register
+
+
+def enqueue(
+    name: str,
+    run_at: datetime | None = None,
+    unique_key: str | None = None,
+    **kwargs,
+) -> Job | None:
+    """
+    Queues a job to run at ``run_at``, as soon as possible by default. Returns
+    None instead when a job with the same ``unique_key`` is already queued or
+    running.
+    """
+    handler = JOBS[name]
+    new_job = Job(
+        name=name,
+        kwargs=kwargs,
+        run_at=run_at or timezone.now(),
+        unique_key=unique_key,
+        max_attempts=handler.max_attempts,
+    )
+    if unique_key is None:
+        new_job.save()
+        return new_job
+    try:
+        with transaction.atomic():
+            new_job.save()
+    except IntegrityError:
+        return None
+    return new_job
+
+
+def schedule_periodic_jobs() -> None:
+    """Makes sure every periodic job has a queued or running instance."""
+    for name, handler in JOBS.items():
+        if handler.every is not None:
+            enqueue(name, unique_key=f"periodic:{name}")
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    # Jitter keeps jobs that failed together from retrying together.
+    return timedelta(seconds=delay * random.uniform(1, 1.1))
+
+
+def claim_job(worker: str) -> Job | None:
+    with transaction.atomic():
+        claimed = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=timezone.now())
+            .order_by("run_at", "id")
+            .first()
+        )
+        if claimed is None:
+            return None
+        claimed.status = Job.RUNNING
+        claimed.attempts += 1
+        claimed.locked_by = worker
+        claimed.locked_at = timezone.now()
+        # Without SKIP LOCKED (SQLite) two workers can select the same job, only
+        # the first one to update it gets it.
+        updated = Job.objects.filter(pk=claimed.pk, status=Job.QUEUED).update(
+            status=claimed.status,
+            attempts=claimed.attempts,
+            locked_by=claimed.locked_by,
+            locked_at=claimed.locked_at,
+            updated_at=claimed.locked_at,
+        )
+        if not updated:
+            return None
+    return claimed
+
+
+def run_job(claimed: Job) -> None:
+    handler = JOBS.get(claimed.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {claimed.name!r}")
+        handler.func(**claimed.kwargs)
+    except Exception:
+        logger.exception("Job %s failed", claimed)
+        claimed.last_error = traceback.format_exc()
+        if claimed.attempts < claimed.max_attempts:
+            claimed.status = Job.QUEUED
+            claimed.run_at = timezone.now() + get_retry_delay(claimed.attempts)
+        else:
+            claimed.status = Job.FAILED
+    else:
+        claimed.status = Job.DONE
+
+    with transaction.atomic():
+        claimed.locked_by = ""
+        claimed.locked_at = None
+        claimed.save(
+            update_fields=[
+                "status",
+                "run_at",
+                "last_error",
+                "locked_by",
+                "locked_at",
+                "updated_at",
+            ]
+        )
+        if claimed.status != Job.QUEUED and handler and handler.every:
+            enqueue(
+                claimed.name,
+                run_at=timezone.now() + handler.every,
+                unique_key=f"periodic:{claimed.name}",
+            )
+
+
+def run_next_job(worker: str) -> bool:
+    claimed = claim_job(worker)
+    if claimed is None:
+        return False
+    run_job(claimed)
+    return True
+
+
+def requeue_stale_jobs() -> int:
+    """Hands jobs out again whose worker stopped without finishing them."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.QUEUED, locked_by="", locked_at=None, updated_at=timezone.now()
+    )
+
+
+@job("weekly_summary")
+def send_weekly_summary(user_id: int) -> None:
+    # The command module imports this one.
+    from backend.management.commands.weekly_summary_campaign import (
+        Command as WeeklySummaryCommand,
+    )
+
+    with use_replica():
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            WeeklySummaryCommand().send_summary(user)
+
+
+@job("archive_leases", every=timedelta(days=1))
+def archive_leases() -> None:
+    call_command("archive_leases")
+
+
+@job("prune_jobs", every=timedelta(days=1))
+def prune_jobs() -> None:
+    """Deletes finished jobs older than ``JOB_RETENTION_DAYS``."""
+    cutoff = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    Job.objects.filter(status=Job.DONE, updated_at__lt=cutoff).delete()
+
+
+@job("trim_feeds", every=timedelta(days=1))
+def trim_feeds() -> None:
+    feed.trim_feeds()
+
+
+@job("send_lease_reminders", every=timedelta(hours=1))
+def send_lease_reminders() -> None:
+    reminders.send_lease_reminders()
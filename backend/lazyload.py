@@ -0,0 +1,79 @@
+"""
+Development check for N+1 queries.
+
+While a template renders, loading a foreign key or a deferred field that the
+queryset did not fetch raises ``LazyLoadError`` instead of quietly running one
+query per object. Fix it with ``select_related`` or by adding the field to the
+``.only()`` projection, see the ``*_cards`` helpers in backend/services.py.
+
+Enabled by the ``RAISE_ON_LAZY_LOADS`` setting, on by default with ``DEBUG``.
+"""
+
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db.models import Model
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.template.backends.django import Template
+
+# None outside of templates, otherwise whether the outermost template that is
+# being rendered is checked. Includes and widgets inherit it.
+_rendering = ContextVar("rendering_template", default=None)
+
+# The admin renders single related objects through __str__ all over, its
+# changelists use list_select_related instead.
+UNCHECKED_TEMPLATE_PREFIXES = ("admin/",)
+
+
+class LazyLoadError(Exception):
+    pass
+
+
+def _rendering_template(render):
+    @wraps(render)
+    def wrapper(template, *args, **kwargs):
+        if _rendering.get() is not None:
+            return render(template, *args, **kwargs)
+        name = template.origin.template_name or ""
+        token = _rendering.set(not name.startswith(UNCHECKED_TEMPLATE_PREFIXES))
+        try:
+            return render(template, *args, **kwargs)
+        finally:
+            _rendering.reset(token)
+
+    return wrapper
+
+
+def _forbidden_while_rendering(describe):
+    def decorate(load):
+        @wraps(load)
+        def wrapper(*args, **kwargs):
+            if _rendering.get() is True:
+                raise LazyLoadError(
+                    f"{describe(*args, **kwargs)} was loaded lazily while "
+                    "rendering a template, fetch it with the queryset instead"
+                )
+            return load(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _describe_relation(descriptor, instance):
+    return f"{type(instance).__name__}.{descriptor.field.name}"
+
+
+def _describe_refresh(instance, using=None, fields=None, **kwargs):
+    return f"{type(instance).__name__}.{', '.join(fields or ['*'])}"
+
+
+def install() -> None:
+    Template.render = _rendering_template(Template.render)
+    ForwardManyToOneDescriptor.get_object = _forbidden_while_rendering(
+        _describe_relation
+    )(ForwardManyToOneDescriptor.get_object)
+    # Deferred fields are loaded with refresh_from_db(fields=[name]).
+    Model.refresh_from_db = _forbidden_while_rendering(_describe_refresh)(
+        Model.refresh_from_db
+    )
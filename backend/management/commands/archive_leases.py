@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.models import ArchivedLease, Event, Item, Lease, LeaseReminder
+from backend.versions import bump_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Move leases that ended more than LEASE_ARCHIVE_AFTER_DAYS days ago to "
+        "the archive table. Every batch is committed on its own, so an "
+        "interrupted run picks up where it stopped when started again. A batch "
+        "records a single lease.archived event instead of one lease.deleted "
+        "event per lease."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.LEASE_ARCHIVE_AFTER_DAYS
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        archived = 0
+        while True:
+            with transaction.atomic():
+                leases = list(
+                    Lease.objects.filter(end_date__lt=cutoff)
+                    .order_by("pk")
+                    .select_for_update(skip_locked=True)
+                    .values(
+                        "pk",
+                        "item_id",
+                        "item__owner_id",
+                        "lessee_id",
+                        "start_date",
+                        "end_date",
+                    )[: options["batch_size"]]
+                )
+                if not leases:
+                    break
+                ArchivedLease.objects.bulk_create(
+                    [
+                        ArchivedLease(
+                            lease_id=lease["pk"],
+                            item_id=lease["item_id"],
+                            lessee_id=lease["lessee_id"],
+                            start_date=lease["start_date"],
+                            end_date=lease["end_date"],
+                        )
+                        for lease in leases
+                    ],
+                    # Already archived by an earlier run that died before deleting.
+                    ignore_conflicts=True,
+                )
+                lease_ids = [lease["pk"] for lease in leases]
+                LeaseReminder.objects.filter(lease_id__in=lease_ids).delete()
+                # A plain DELETE without the delete signals: they would record
+                # an event and bump versions for every lease, done once per
+                # batch below.
+                table = connection.ops.quote_name(Lease._meta.db_table)
+                placeholders = ", ".join(["%s"] * len(lease_ids))
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE id IN ({placeholders})", lease_ids
+                    )
+                item_ids = {lease["item_id"] for lease in leases}
+                bump_versions(
+                    user_ids={lease["lessee_id"] for lease in leases}
+                    | {lease["item__owner_id"] for lease in leases},
+                    community_ids=set(
+                        Item.shared_with.through.objects.filter(
+                            item_id__in=item_ids
+                        ).values_list("community_id", flat=True)
+                    ),
+                )
+                Event.record("lease.archived", ids=lease_ids, before=cutoff)
+            archived += len(leases)
+            self.stdout.write(f"Archived {archived} leases")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done, archived {archived} leases that ended before {cutoff}"
+            )
+        )
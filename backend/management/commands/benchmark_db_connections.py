@@ -0,0 +1,82 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+
+def percentile(samples: list[float], percent: int) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure database connection acquisition latency under concurrent load. "
+        "Every iteration mimics a request: acquire a connection, run one query "
+        "and release it the way Django does at the end of a request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--iterations", type=int, default=50)
+
+    def handle(self, *args, **options):
+        acquire_samples: list[float] = []
+        query_samples: list[float] = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(options["threads"])
+
+        def worker():
+            acquired, queried = [], []
+            barrier.wait()
+            for _ in range(options["iterations"]):
+                started = time.perf_counter()
+                connection.ensure_connection()
+                acquired_at = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                finished = time.perf_counter()
+                acquired.append(acquired_at - started)
+                queried.append(finished - started)
+                # Same as the request_finished signal, pooled connections are
+                # returned, persistent ones are kept until CONN_MAX_AGE.
+                close_old_connections()
+            connection.close()
+            with lock:
+                acquire_samples.extend(acquired)
+                query_samples.extend(queried)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f"vendor={connection.vendor} "
+            f"pool={bool(settings_dict['OPTIONS'].get('pool'))} "
+            f"conn_max_age={settings_dict['CONN_MAX_AGE']} "
+            f"threads={options['threads']} iterations={options['iterations']}"
+        )
+        for label, samples in (
+            ("acquire", acquire_samples),
+            ("acquire+query", query_samples),
+        ):
+            self.stdout.write(
+                f"{label:>14}: "
+                f"mean={statistics.mean(samples) * 1000:.3f}ms "
+                f"p50={percentile(samples, 50) * 1000:.3f}ms "
+                f"p95={percentile(samples, 95) * 1000:.3f}ms "
+                f"p99={percentile(samples, 99) * 1000:.3f}ms "
+                f"max={max(samples) * 1000:.3f}ms"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(query_samples) / elapsed:.0f} requests/s")
+        )
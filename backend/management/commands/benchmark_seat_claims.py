@@ -0,0 +1,96 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from backend.management.commands.benchmark_db_connections import percentile
+from backend.models import SeatWaitlistEntry, Subscription
+from backend.services import claim_seat
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure seat claim latency when many users claim seats of one "
+        "subscription at the same time, and check that no seat was given out "
+        "twice. Creates its own users and subscription and deletes them after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--seats", type=int, default=10)
+        parser.add_argument("--claims", type=int, default=20, help="per thread")
+
+    def handle(self, *args, **options):
+        threads, claims = options["threads"], options["claims"]
+        prefix = f"benchmark-{uuid.uuid4().hex[:8]}"
+        owner = User.objects.create_user(username=f"{prefix}-owner")
+        subscription = Subscription.objects.create(
+            name=prefix, owner=owner, seats=options["seats"]
+        )
+        User.objects.bulk_create(
+            User(username=f"{prefix}-{i}") for i in range(threads * claims)
+        )
+        claimants = list(User.objects.filter(username__startswith=f"{prefix}-"))
+        claimants.remove(owner)
+
+        samples: list[float] = []
+        seated = 0
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def worker(users):
+            nonlocal seated
+            durations, won = [], 0
+            barrier.wait()
+            for user in users:
+                started = time.perf_counter()
+                won += claim_seat(subscription, user)
+                durations.append(time.perf_counter() - started)
+                close_old_connections()
+            connection.close()
+            with lock:
+                samples.extend(durations)
+                seated += won
+
+        try:
+            started = time.perf_counter()
+            workers = [
+                threading.Thread(target=worker, args=(claimants[i::threads],))
+                for i in range(threads)
+            ]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            subscription.refresh_from_db()
+            holders = subscription.shared_to.count()
+            waiting = SeatWaitlistEntry.objects.filter(
+                subscription=subscription
+            ).count()
+            self.stdout.write(
+                f"vendor={connection.vendor} threads={threads} claims={len(samples)} "
+                f"seats={subscription.seats} taken={subscription.seats_taken} "
+                f"holders={holders} waitlisted={waiting}"
+            )
+            self.stdout.write(
+                f"{'claim':>6}: "
+                f"mean={statistics.mean(samples) * 1000:.3f}ms "
+                f"p50={percentile(samples, 50) * 1000:.3f}ms "
+                f"p95={percentile(samples, 95) * 1000:.3f}ms "
+                f"p99={percentile(samples, 99) * 1000:.3f}ms "
+                f"max={max(samples) * 1000:.3f}ms"
+            )
+            if not (holders == seated == subscription.seats_taken <= subscription.seats):
+                raise CommandError("Seats were oversubscribed or miscounted.")
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(samples) / elapsed:.0f} claims/s")
+            )
+        finally:
+            subscription.delete()
+            User.objects.filter(username__startswith=f"{prefix}-").delete()
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from backend.models import ConsumerCheckpoint, Event
+from backend.outbox import CONSUMERS, consume_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Feed outbox events to a consumer in batches, resuming from its "
+        "checkpoint. Runs until interrupted unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("consumer", choices=list(CONSUMERS))
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Stop once the consumer caught up"
+        )
+        parser.add_argument(
+            "--replay-from",
+            type=int,
+            help="Move the checkpoint back to just before this event id first",
+        )
+
+    def handle(self, *args, **options):
+        name = options["consumer"]
+        if options["replay_from"] is not None:
+            event = Event.objects.filter(pk=options["replay_from"]).first()
+            if event is None:
+                raise CommandError(f"Event {options['replay_from']} does not exist")
+            ConsumerCheckpoint.objects.update_or_create(
+                name=name,
+                defaults={"last_txid": event.txid, "last_event_id": event.pk - 1},
+            )
+
+        while True:
+            consumed = consume_batch(name, options["batch_size"])
+            if consumed:
+                self.stderr.write(f"{name}: consumed {consumed} events")
+                continue
+            if options["once"]:
+                break
+            close_old_connections()
+            time.sleep(options["poll_interval"])
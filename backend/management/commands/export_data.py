@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.exports import (
+    EXPORT_COLUMNS,
+    EXPORT_FORMATS,
+    get_export_querysets,
+    stream_export,
+)
+from backend.models import Community
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the items, subscriptions, requests or leases of a user or a "
+        "community as CSV or JSON Lines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(EXPORT_COLUMNS))
+        parser.add_argument("--user", help="Username to export for")
+        parser.add_argument(
+            "--community",
+            type=int,
+            help="Community id to export for, leases also need --user",
+        )
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--output", help="File to write to, defaults to stdout")
+
+    def handle(self, *args, **options):
+        user, community = None, None
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"User {options['user']} does not exist")
+        if options["community"] is not None:
+            community = Community.objects.filter(pk=options["community"]).first()
+            if community is None:
+                raise CommandError(f"Community {options['community']} does not exist")
+        if user is None and (community is None or options["kind"] == "leases"):
+            raise CommandError("Pass --user, or --community for a community export")
+
+        querysets = get_export_querysets(
+            options["kind"], user=user, community=community
+        )
+        lines = stream_export(options["kind"], querysets, options["format"])
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
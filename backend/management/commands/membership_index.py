@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from backend.membership_index import (
+    IndexData,
+    build_index,
+    read_index,
+    refresh_index,
+    write_covered_through,
+    write_index,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the membership index to MEMBERSHIP_INDEX_PATH and keep it up to "
+        "date with the outbox events. Runs until interrupted unless --once is "
+        "given. Run one per machine, the file is shared by the workers on it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Read everything from the database instead of the existing file",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Stop once the index caught up"
+        )
+
+    def handle(self, *args, **options):
+        path = settings.MEMBERSHIP_INDEX_PATH
+        if path is None:
+            raise CommandError("Set MEMBERSHIP_INDEX_PATH to write the index")
+
+        index = None if options["rebuild"] else read_index(path)
+        if index is None:
+            data = build_index()
+            write_index(path, data)
+            self.stderr.write(f"Built the membership index at {path}")
+        else:
+            data = IndexData.from_index(index)
+
+        while True:
+            applied = refresh_index(data, options["batch_size"])
+            if applied:
+                write_index(path, data)
+                self.stderr.write(f"Applied {applied} events")
+                continue
+            write_covered_through(path, data)
+            if options["once"]:
+                break
+            close_old_connections()
+            time.sleep(options["poll_interval"])
@@ -0,0 +1,37 @@
+from itertools import batched
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.models import Community, UserStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the denormalized community and user counters from the source "
+        "tables, repairing any drift. Every batch is one UPDATE committed on "
+        "its own."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for label, ids, refresh_counts in (
+            (
+                "communities",
+                Community.objects.values_list("pk", flat=True),
+                Community.refresh_counts,
+            ),
+            (
+                "users",
+                User.objects.values_list("pk", flat=True),
+                UserStats.refresh_counts,
+            ),
+        ):
+            recounted = 0
+            for batch in batched(ids.order_by("pk").iterator(), options["batch_size"]):
+                with transaction.atomic():
+                    recounted += refresh_counts(batch)
+            self.stdout.write(self.style.SUCCESS(f"Recounted {recounted} {label}"))
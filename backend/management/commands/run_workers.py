@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+
+from backend.jobs import requeue_stale_jobs, run_next_job, schedule_periodic_jobs
+
+HOUSEKEEPING_SECONDS = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the Job table with a pool of worker threads, "
+        "optionally in several processes. Runs until interrupted unless --once "
+        "is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=1, help="Worker threads per process"
+        )
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Stop once no job is due"
+        )
+
+    def handle(self, *args, **options):
+        requeue_stale_jobs()
+        schedule_periodic_jobs()
+        if options["processes"] == 1:
+            self.run_threads(options)
+            return
+
+        # Forked processes must not share the parent's database connections.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=self.run_threads, args=(options,))
+            for _ in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # The children got the interrupt as well and finish their jobs.
+            for process in processes:
+                process.join()
+
+    def run_threads(self, options):
+        stop = threading.Event()
+        if options["threads"] == 1:
+            try:
+                self.work(stop, options)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        threads = [
+            threading.Thread(
+                target=self.work_in_thread, args=(stop, options), name=f"worker-{i}"
+            )
+            for i in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            # Let every thread finish the job it is running.
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work_in_thread(self, stop, options):
+        try:
+            self.work(stop, options)
+        finally:
+            connection.close()
+
+    def work(self, stop, options):
+        worker = (
+            f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        )
+        last_housekeeping = time.monotonic()
+        while not stop.is_set():
+            if run_next_job(worker):
+                close_old_connections()
+                continue
+            if options["once"]:
+                break
+            if time.monotonic() - last_housekeeping > HOUSEKEEPING_SECONDS:
+                requeue_stale_jobs()
+                schedule_periodic_jobs()
+                last_housekeeping = time.monotonic()
+            close_old_connections()
+            stop.wait(options["poll_interval"])
@@ -4,8 +4,12 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.mail import EmailMessage
+from django.db import transaction
 
+from backend.jobs import enqueue
+from backend.routers import use_replica
 from backend.services import (
+    UserContext,
     get_pending_requests_for_user,
     get_subscriptions_available_for_share,
     get_items_available_for_lease,
@@ -48,20 +52,40 @@ def format_email_content(shared_items, shared_subscriptions, shared_requests):
 class Command(BaseCommand):
     help = "Send weekly email to users about items and subscriptions shared with them"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--enqueue",
+            action="store_true",
+            help="Queue one weekly_summary job per user for run_workers instead",
+        )
+
     def handle(self, *args, **options):
-        users = User.objects.all()
+        if options["enqueue"]:
+            with transaction.atomic():
+                for user_id in User.objects.values_list("pk", flat=True).iterator():
+                    enqueue("weekly_summary", user_id=user_id)
+            return
+
+        # The campaign only reads, keep its full table scans off the primary.
+        with use_replica():
+            users = User.objects.all()
+
+            for user in users:
+                self.send_summary(user)
+
+    def send_summary(self, user):
+        user_context = UserContext(user)
 
-        for user in users:
-            # Fetch items shared with the user in the last 7 days
-            shared_items = get_items_available_for_lease(user)
+        # Fetch items shared with the user in the last 7 days
+        shared_items = get_items_available_for_lease(user_context)
 
-            # Fetch subscriptions shared with the user in the last 7 days
-            shared_subscriptions = get_subscriptions_available_for_share(user)
+        # Fetch subscriptions shared with the user in the last 7 days
+        shared_subscriptions = get_subscriptions_available_for_share(user_context)
 
-            shared_requests = get_pending_requests_for_user(user)
+        shared_requests = get_pending_requests_for_user(user_context)
 
-            if shared_items or shared_subscriptions or shared_requests:
-                self.send_email(user, shared_items, shared_subscriptions, shared_requests)
+        if shared_items or shared_subscriptions or shared_requests:
+            self.send_email(user, shared_items, shared_subscriptions, shared_requests)
 
     def send_email(self, user, shared_items, shared_subscriptions, shared_requests):
         subject = "Exciting Updates from Your Closeknit Community! 🎉"
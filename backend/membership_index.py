@@ -0,0 +1,404 @@
+"""
+Memory-mapped index of community memberships and shares.
+
+Most visibility checks boil down to "do this user and this object share a
+community?". The index answers that without a database query: for every user
+the sorted ids of their communities, for every item, subscription and request
+the sorted ids of the communities it is shared with, and the sorted ids of the
+active communities, all as int32 arrays in one file. Every gunicorn worker maps
+the same file read-only, so the operating system keeps a single copy in memory.
+
+``python manage.py membership_index`` writes the file and keeps it up to date
+from the outbox events: it re-reads the memberships and shares of whatever the
+events touched and replaces the file atomically. Workers notice the new file on
+their next lookup.
+
+The index trails the database by a few seconds. To still let users see their
+own changes, every change also stamps the affected keys in the cache, and a
+lookup falls back to the database (returns None) while a key has been changed
+after the point the index covers: the last time it had applied every committed
+event. The same happens when the index is missing
+or further behind than ``MEMBERSHIP_INDEX_MAX_LAG_SECONDS``.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from itertools import batched
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+MAGIC = b"CKMI"
+FORMAT_VERSION = 2
+# Magic, format version, outbox checkpoint as (txid, event id), covered through
+# (unix time).
+HEADER = struct.Struct("=4sIqqd")
+COVERED_THROUGH_POSITION = 24
+# Number of keys and number of values of a section.
+SECTION = struct.Struct("=QQ")
+
+ACTIVE_COMMUNITIES = "active_communities"
+USERS = "user"
+SHARED_KINDS = ("item", "subscription", "request")
+SECTIONS = (ACTIVE_COMMUNITIES, USERS, *SHARED_KINDS)
+LOAD_BATCH_SIZE = 1000
+
+COMMUNITIES_KEY = "communities"
+
+
+def user_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def object_key(kind: str, object_id) -> str:
+    return f"{kind}:{object_id}"
+
+
+def owner_key(kind: str, owner_id) -> str:
+    """Stamped when the shares of all of an owner's objects may have changed."""
+    return f"{kind}_owner:{owner_id}"
+
+
+def _stamp_key(key: str) -> str:
+    return f"membership_index:changed:{key}"
+
+
+def _set_stamps(keys: list[str]) -> None:
+    now = time.time()
+    cache.set_many(
+        {_stamp_key(key): now for key in keys},
+        timeout=settings.MEMBERSHIP_INDEX_MAX_LAG_SECONDS,
+    )
+
+
+def mark_changed(keys) -> None:
+    """Makes lookups of ``keys`` use the database until the index caught up."""
+    if settings.MEMBERSHIP_INDEX_PATH is None:
+        return
+    keys = list(keys)
+    if not keys:
+        return
+    _set_stamps(keys)
+    # Stamp again at commit, the index may read the database in between.
+    transaction.on_commit(lambda: _set_stamps(keys))
+
+
+class MembershipIndex:
+    """Read-only view of an index file, usually a memory map."""
+
+    def __init__(self, buffer):
+        magic, version, *_ = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a membership index of this version")
+        self._buffer = buffer
+        view = memoryview(buffer)
+        position = HEADER.size + SECTION.size * len(SECTIONS)
+        self._sections = {}
+        for number, name in enumerate(SECTIONS):
+            key_count, value_count = SECTION.unpack_from(
+                buffer, HEADER.size + SECTION.size * number
+            )
+            offsets_end = position + 4 * (key_count + 1)
+            values_end = offsets_end + 4 * value_count
+            self._sections[name] = (
+                view[position:offsets_end].cast("I"),
+                view[offsets_end:values_end].cast("i"),
+            )
+            position = values_end
+
+    @property
+    def last_txid(self) -> int:
+        return HEADER.unpack_from(self._buffer)[2]
+
+    @property
+    def last_event_id(self) -> int:
+        return HEADER.unpack_from(self._buffer)[3]
+
+    @property
+    def covered_through(self) -> float:
+        # Read on every access, the writer moves it forward in place.
+        return HEADER.unpack_from(self._buffer)[4]
+
+    def get(self, section: str, key: int) -> memoryview:
+        offsets, values = self._sections[section]
+        if not 0 <= key < len(offsets) - 1:
+            return values[0:0]
+        return values[offsets[key] : offsets[key + 1]]
+
+    def is_active(self, community_id: int) -> bool:
+        active = self.get(ACTIVE_COMMUNITIES, 0)
+        position = bisect_left(active, community_id)
+        return position < len(active) and active[position] == community_id
+
+    def community_ids(self, user_id: int) -> list[int]:
+        return [
+            community_id
+            for community_id in self.get(USERS, user_id)
+            if self.is_active(community_id)
+        ]
+
+    def shared_community_ids(self, kind: str, object_id: int) -> list[int]:
+        return self.get(kind, object_id).tolist()
+
+    def items(self, section: str):
+        offsets, values = self._sections[section]
+        for key in range(len(offsets) - 1):
+            if offsets[key] != offsets[key + 1]:
+                yield key, values[offsets[key] : offsets[key + 1]].tolist()
+
+
+def read_index(path: str) -> MembershipIndex | None:
+    try:
+        with open(path, "rb") as file:
+            return MembershipIndex(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
+
+
+# (path, inode) of the mapped file and its index. The writer replaces the file,
+# so a different inode means a newer index.
+_mapped = (None, None, None)
+
+
+def get_index() -> MembershipIndex | None:
+    global _mapped
+    path = settings.MEMBERSHIP_INDEX_PATH
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    identity = (stat.st_dev, stat.st_ino)
+    mapped_path, mapped_identity, index = _mapped
+    if (mapped_path, mapped_identity) != (path, identity):
+        # Threads racing here map the same file twice, which is harmless. The
+        # old map is closed once no lookup uses it anymore.
+        index = read_index(path)
+        _mapped = (path, identity, index)
+    return index
+
+
+def _fresh_index(keys: list[str]) -> MembershipIndex | None:
+    index = get_index()
+    if index is None:
+        return None
+    covered_through = index.covered_through
+    if covered_through < time.time() - settings.MEMBERSHIP_INDEX_MAX_LAG_SECONDS:
+        return None
+    stamps = cache.get_many([_stamp_key(key) for key in keys])
+    if any(stamp >= covered_through for stamp in stamps.values()):
+        return None
+    return index
+
+
+def get_community_ids(user_id: int) -> list[int] | None:
+    """The user's active communities, None if the index can't tell."""
+    index = _fresh_index([user_key(user_id), COMMUNITIES_KEY])
+    if index is None:
+        return None
+    return index.community_ids(user_id)
+
+
+def get_shared_community_ids(kind: str, object_id: int, owner_id: int) -> list | None:
+    """
+    The communities an item, subscription or request is shared with, None if
+    the index can't tell. Includes inactive communities.
+    """
+    index = _fresh_index([object_key(kind, object_id), owner_key(kind, owner_id)])
+    if index is None:
+        return None
+    return index.shared_community_ids(kind, object_id)
+
+
+@dataclass
+class IndexData:
+    """The writer's copy of the index, as ``{key: sorted community ids}``."""
+
+    last_txid: int = 0
+    last_event_id: int = 0
+    covered_through: float = 0.0
+    sections: dict = field(default_factory=lambda: {name: {} for name in SECTIONS})
+
+    @classmethod
+    def from_index(cls, index: MembershipIndex) -> "IndexData":
+        return cls(
+            last_txid=index.last_txid,
+            last_event_id=index.last_event_id,
+            covered_through=index.covered_through,
+            sections={name: dict(index.items(name)) for name in SECTIONS},
+        )
+
+
+def _pack_section(lists: dict) -> tuple[array, array]:
+    key_count = max(lists, default=-1) + 1
+    offsets = array("I", bytes(4 * (key_count + 1)))
+    values = array("i")
+    for key in range(key_count):
+        values.extend(lists.get(key, ()))
+        offsets[key + 1] = len(values)
+    return offsets, values
+
+
+def write_index(path: str, data: IndexData) -> None:
+    """Replaces the file at ``path`` atomically, mapped old files stay valid."""
+    packed = [_pack_section(data.sections[name]) for name in SECTIONS]
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(
+            HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                data.last_txid,
+                data.last_event_id,
+                data.covered_through,
+            )
+        )
+        for offsets, values in packed:
+            file.write(SECTION.pack(len(offsets) - 1, len(values)))
+        for offsets, values in packed:
+            file.write(offsets.tobytes())
+            file.write(values.tobytes())
+    os.replace(file.name, path)
+
+
+def write_covered_through(path: str, data: IndexData) -> None:
+    """Moves the covered time of an unchanged index forward, in place."""
+    with open(path, "r+b") as file:
+        os.pwrite(
+            file.fileno(),
+            struct.pack("=d", data.covered_through),
+            COVERED_THROUGH_POSITION,
+        )
+
+
+def _group(pairs) -> dict:
+    lists = {}
+    for key, community_id in pairs:
+        lists.setdefault(key, []).append(community_id)
+    return lists
+
+
+def _shared_models() -> dict:
+    # backend.models imports this module.
+    from backend.models import Item, Request, Subscription
+
+    return {"item": Item, "subscription": Subscription, "request": Request}
+
+
+def _load_active_communities(data: IndexData) -> None:
+    from backend.models import Community
+
+    data.sections[ACTIVE_COMMUNITIES] = {
+        0: list(Community.active.order_by("pk").values_list("pk", flat=True))
+    }
+
+
+def _load_users(data: IndexData, user_ids) -> None:
+    from backend.models import Community
+
+    for batch in batched(sorted(user_ids), LOAD_BATCH_SIZE):
+        memberships = Community.members.through.objects.filter(
+            user_id__in=batch
+        ).order_by("user_id", "community_id")
+        lists = _group(memberships.values_list("user_id", "community_id"))
+        for user_id in batch:
+            data.sections[USERS].pop(user_id, None)
+        data.sections[USERS].update(lists)
+
+
+def _load_objects(data: IndexData, kind: str, object_ids) -> None:
+    through = _shared_models()[kind].shared_with.through
+    for batch in batched(sorted(object_ids), LOAD_BATCH_SIZE):
+        shares = through.objects.filter(**{f"{kind}_id__in": batch}).order_by(
+            f"{kind}_id", "community_id"
+        )
+        lists = _group(shares.values_list(f"{kind}_id", "community_id"))
+        for object_id in batch:
+            data.sections[kind].pop(object_id, None)
+        data.sections[kind].update(lists)
+
+
+def build_index() -> IndexData:
+    """Reads the whole index from the membership and share tables."""
+    from backend.models import Community
+    from backend.outbox import current_position
+
+    # Events up to here are covered by the tables as read below, replaying a
+    # few of them again later is harmless.
+    started = time.time()
+    last_txid, last_event_id = current_position()
+    data = IndexData(
+        last_txid=last_txid, last_event_id=last_event_id, covered_through=started
+    )
+    _load_active_communities(data)
+    memberships = Community.members.through.objects.order_by("user_id", "community_id")
+    data.sections[USERS] = _group(
+        memberships.values_list("user_id", "community_id").iterator(chunk_size=10000)
+    )
+    for kind, model in _shared_models().items():
+        shares = model.shared_with.through.objects.order_by(
+            f"{kind}_id", "community_id"
+        )
+        data.sections[kind] = _group(
+            shares.values_list(f"{kind}_id", "community_id").iterator(chunk_size=10000)
+        )
+    return data
+
+
+def refresh_index(data: IndexData, batch_size: int) -> int:
+    """
+    Applies the next batch of outbox events to ``data`` by re-reading whatever
+    they touched. Returns the number of events applied.
+    """
+    from backend.outbox import events_after, read_events
+
+    started = time.time()
+    events = read_events(data.last_txid, data.last_event_id, batch_size)
+
+    user_ids, communities_changed = set(), False
+    object_ids = {kind: set() for kind in SHARED_KINDS}
+    owner_ids = {kind: set() for kind in SHARED_KINDS}
+    for event in events:
+        kind, _, action = event.event_type.partition(".")
+        if action in ("members_added", "members_removed"):
+            user_ids.update(event.payload["user_ids"])
+        elif kind == "community":
+            communities_changed = True
+        elif kind in SHARED_KINDS and action in ("shared", "unshared"):
+            object_ids[kind].update(event.payload["ids"])
+        elif kind in SHARED_KINDS and action in ("bulk_shared", "imported"):
+            owner_ids[kind].add(event.payload["owner_id"])
+
+    if communities_changed:
+        _load_active_communities(data)
+    if user_ids:
+        _load_users(data, user_ids)
+    for kind, model in _shared_models().items():
+        if owner_ids[kind]:
+            object_ids[kind].update(
+                model.objects.filter(owner_id__in=owner_ids[kind]).values_list(
+                    "pk", flat=True
+                )
+            )
+        if object_ids[kind]:
+            _load_objects(data, kind, object_ids[kind])
+
+    if events:
+        data.last_txid, data.last_event_id = events[-1].txid, events[-1].pk
+    if (
+        len(events) < batch_size
+        and not events_after(data.last_txid, data.last_event_id).exists()
+    ):
+        # Caught up, everything committed before we started has been applied.
+        # Events of a transaction that committed while an older one is still
+        # running stay visible above, so this waits for those.
+        data.covered_through = started
+    return len(events)
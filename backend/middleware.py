@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+from backend.auth import get_cached_user
+from backend.routers import pinning_scope, replica_configured
+from backend.services import UserContext
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pins a user's reads to the primary database for a short while after they
+    wrote something, so they never see a replica that lags behind their write.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_configured():
+            return self.get_response(request)
+
+        pinned = settings.REPLICA_PIN_COOKIE in request.COOKIES
+        with pinning_scope(pinned=pinned) as state:
+            response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS or state["wrote"]:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+
+def get_user(request):
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Drop-in replacement for Django's ``AuthenticationMiddleware`` that serves
+    ``request.user`` from the cache instead of querying ``auth_user``.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+
+
+class UserContextMiddleware:
+    """
+    Attaches a lazily evaluated ``UserContext`` to the request, so the user's
+    communities are looked up once per request no matter how many service
+    functions and forms need them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_context = UserContext(request.user)
+        return self.get_response(request)
+
+
+class AtomicWritesMiddleware:
+    """
+    Runs requests that may write in a transaction, so the outbox events
+    recorded by model signals commit or roll back together with the change.
+    Like ``ATOMIC_REQUESTS``, but safe requests keep running without one and
+    do not have to touch the database at all.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS:
+            return self.get_response(request)
+
+        with transaction.atomic():
+            response = self.get_response(request)
+            # Exceptions raised by the view arrive here as error responses.
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0009_community_updated_at_item_updated_at_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lease",
+            index=models.Index(
+                fields=["item", "start_date", "end_date"], name="lease_item_dates_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.1.15 on 2026-10-19 15:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count_of(model, group, **filters):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{group: OuterRef("pk")}, **filters)
+            .order_by()
+            .values(group)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Community = apps.get_model("backend", "Community")
+    Item = apps.get_model("backend", "Item")
+    Subscription = apps.get_model("backend", "Subscription")
+    UserStats = apps.get_model("backend", "UserStats")
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+
+    Community.objects.update(
+        member_count=_count_of(Community.members.through, "community"),
+        shared_item_count=_count_of(
+            Item.shared_with.through, "community", item__is_active=True
+        ),
+        shared_subscription_count=_count_of(
+            Subscription.shared_with.through,
+            "community",
+            subscription__is_active=True,
+        ),
+    )
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in User.objects.values_list("pk", flat=True)),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    UserStats.objects.update(
+        item_count=_count_of(Item, "owner"),
+        subscription_count=_count_of(Subscription, "owner"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("backend", "0014_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("item_count", models.IntegerField(default=0)),
+                ("subscription_count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="community",
+            name="member_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="community",
+            name="shared_item_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="community",
+            name="shared_subscription_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, reverse_code=migrations.RunPython.noop),
+    ]
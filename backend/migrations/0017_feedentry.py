@@ -0,0 +1,82 @@
+# Generated by Django 5.1.15 on 2026-10-19 15:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0016_community_community_name_prefix_idx_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedEntry",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "verb",
+                    models.CharField(
+                        choices=[
+                            ("item_shared", "Shared an item"),
+                            ("subscription_shared", "Shared a subscription"),
+                            ("request_shared", "Asked for something"),
+                            ("items_shared", "Shared items"),
+                            ("subscriptions_shared", "Shared subscriptions"),
+                            ("lease_returned", "Item available again"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField(blank=True, null=True)),
+                ("object_name", models.CharField(blank=True, max_length=100)),
+                ("count", models.PositiveIntegerField(default=1)),
+                ("event_id", models.BigIntegerField(db_index=True)),
+                ("score", models.FloatField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "community",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="backend.community",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "feed entries",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-score", "-id"], name="feed_user_score_idx"
+                    ),
+                    models.Index(
+                        condition=models.Q(("user__isnull", True)),
+                        fields=["community", "-score", "-id"],
+                        name="feed_community_score_idx",
+                    ),
+                    models.Index(fields=["verb", "object_id"], name="feed_object_idx"),
+                ],
+            },
+        ),
+    ]
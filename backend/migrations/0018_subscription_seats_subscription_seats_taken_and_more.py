@@ -0,0 +1,84 @@
+# Generated by Django 5.1.15 on 2026-10-19 15:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_seats_taken(apps, schema_editor):
+    Subscription = apps.get_model("backend", "Subscription")
+    holders = Subscription.shared_to.through.objects.filter(subscription=OuterRef("pk"))
+    Subscription.objects.update(
+        seats_taken=Coalesce(
+            Subquery(
+                holders.order_by()
+                .values("subscription")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0017_feedentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="seats",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Leave empty for no limit.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="subscription",
+            name="seats_taken",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="SeatWaitlistEntry",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "subscription",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waitlist",
+                        to="backend.subscription",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="seat_waitlist",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "seat waitlist entries",
+                "indexes": [
+                    models.Index(
+                        fields=["subscription", "id"], name="seat_waitlist_order_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("subscription", "user"),
+                        name="seat_waitlist_unique_user",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_seats_taken, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.15 on 2026-10-19 15:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0018_subscription_seats_subscription_seats_taken_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaseReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("end_date", models.DateTimeField()),
+                ("sent_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="lease",
+            index=models.Index(fields=["end_date"], name="lease_end_date_idx"),
+        ),
+        migrations.AddField(
+            model_name="leasereminder",
+            name="lease",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reminders",
+                to="backend.lease",
+            ),
+        ),
+        migrations.AddField(
+            model_name="leasereminder",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="lease_reminders",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="leasereminder",
+            constraint=models.UniqueConstraint(
+                fields=("lease", "user", "end_date"), name="lease_reminder_unique"
+            ),
+        ),
+    ]
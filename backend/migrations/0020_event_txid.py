@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-19 16:04
+
+import backend.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0019_leasereminder_lease_lease_end_date_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="consumercheckpoint",
+            name="last_txid",
+            field=models.BigIntegerField(default=0),
+        ),
+        # Existing events get 0, so they stay ordered before every new one and
+        # consumer checkpoints, which start at txid 0, keep their position.
+        migrations.AddField(
+            model_name="event",
+            name="txid",
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="event",
+            name="txid",
+            field=models.BigIntegerField(db_default=backend.models.TransactionId()),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(fields=["txid", "id"], name="event_txid_order_idx"),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.15 on 2026-10-19 16:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0020_event_txid"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="community",
+            name="community_active_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="item",
+            name="item_active_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="request",
+            name="request_open_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="subscription",
+            name="subscription_active_idx",
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["owner"],
+                name="item_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_completed", False)),
+                fields=["owner"],
+                name="request_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["owner"],
+                name="subscription_active_idx",
+            ),
+        ),
+    ]
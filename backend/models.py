@@ -1,15 +1,74 @@
 import uuid
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.urls import reverse
 from django.utils import timezone
 from django.dispatch import receiver
 
+from backend.auth import user_cache_key
+from backend.membership_index import (
+    COMMUNITIES_KEY,
+    mark_changed,
+    object_key,
+    user_key,
+)
+from backend.pubsub import publish_shared
+from backend.versions import bump_versions
 
-class Subscription(models.Model):
+
+class ActiveManager(models.Manager):
+    """Only active rows, matching the partial ``WHERE is_active`` indexes."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
+
+class TracksActiveState:
+    """Remembers ``is_active`` as loaded, so a save can tell it changed."""
+
+    _loaded_is_active = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_active = instance.__dict__.get("is_active")
+        return instance
+
+
+def _count_of(model, group: str, **filters):
+    """Correlated ``COUNT(*)`` of the rows of ``model`` belonging to the outer row."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{group: OuterRef("pk")}, **filters)
+            .order_by()
+            .values(group)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def _increments(**deltas) -> dict:
+    return {field: F(field) + delta for field, delta in deltas.items() if delta}
+
+
+class Subscription(TracksActiveState, models.Model):
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     owner = models.ForeignKey(
         "auth.User", related_name="subscriptions", on_delete=models.CASCADE
@@ -20,14 +79,85 @@ class Subscription(models.Model):
     shared_with = models.ManyToManyField(
         "Community", related_name="shared_subscriptions", blank=True
     )
+    # Seats of the plan that can be given out through shared_to, no limit when
+    # empty. seats_taken counts shared_to and is only changed in the same
+    # UPDATE that checks it against seats, see services.claim_seat.
+    seats = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Leave empty for no limit."
+    )
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = models.Manager()
+    active = ActiveManager()
+
+    class Meta:
+        indexes = [
+            # The owner's active rows, owner_id = ? AND is_active.
+            models.Index(
+                fields=["owner"],
+                condition=Q(is_active=True),
+                name="subscription_active_idx",
+            ),
+            # Admin searches by name prefix, LIKE 'x%' on Postgres.
+            models.Index(
+                fields=["name"],
+                opclasses=["varchar_pattern_ops"],
+                name="subscription_name_prefix_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def seats_left(self) -> int | None:
+        if self.seats is None:
+            return None
+        return max(self.seats - self.seats_taken, 0)
+
+    @classmethod
+    def refresh_seats_taken(cls, subscription_ids) -> int:
+        """Recounts seats_taken, has to run in a transaction."""
+        # Locking the rows first makes the count below see every claim that
+        # committed before, so none of them is counted out.
+        locked = cls.objects.select_for_update().filter(pk__in=subscription_ids)
+        list(locked.values_list("pk", flat=True))
+        return cls.objects.filter(pk__in=subscription_ids).update(
+            seats_taken=_count_of(cls.shared_to.through, "subscription")
+        )
+
+
+class SeatWaitlistEntry(models.Model):
+    """A user waiting for a seat of a full subscription, first come first served."""
+
+    id = models.BigAutoField(primary_key=True)
+    subscription = models.ForeignKey(
+        Subscription, related_name="waitlist", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        "auth.User", related_name="seat_waitlist", on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "seat waitlist entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["subscription", "user"], name="seat_waitlist_unique_user"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["subscription", "id"], name="seat_waitlist_order_idx"),
+        ]
+
+    def __str__(self):
+        return f"User #{self.user_id} waiting for subscription #{self.subscription_id}"
+
 
 class Community(models.Model):
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     owner = models.ForeignKey(
         "auth.User", related_name="communities", on_delete=models.CASCADE
@@ -36,12 +166,51 @@ class Community(models.Model):
         "auth.User", related_name="community_members", blank=True
     )
     invite_uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    # Denormalized for the stats tiles. Kept up to date by the receivers below
+    # and repaired by ``manage.py reconcile_counters``.
+    member_count = models.IntegerField(default=0)
+    shared_item_count = models.IntegerField(default=0)
+    shared_subscription_count = models.IntegerField(default=0)
+
+    objects = models.Manager()
+    active = ActiveManager()
+
+    class Meta:
+        indexes = [
+            # Admin searches by name prefix, LIKE 'x%' on Postgres.
+            models.Index(
+                fields=["name"],
+                opclasses=["varchar_pattern_ops"],
+                name="community_name_prefix_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def add_to_counts(cls, community_ids, **deltas) -> None:
+        increments = _increments(**deltas)
+        if community_ids and increments:
+            cls.objects.filter(pk__in=community_ids).update(**increments)
+
+    @classmethod
+    def refresh_counts(cls, community_ids) -> int:
+        """Recounts the counters of the given communities from scratch."""
+        return cls.objects.filter(pk__in=community_ids).update(
+            member_count=_count_of(cls.members.through, "community"),
+            shared_item_count=_count_of(
+                Item.shared_with.through, "community", item__is_active=True
+            ),
+            shared_subscription_count=_count_of(
+                Subscription.shared_with.through,
+                "community",
+                subscription__is_active=True,
+            ),
+        )
 
-class Item(models.Model):
+
+class Item(TracksActiveState, models.Model):
     BOOK = "book"
     ELECTRONICS = "electronics"
     OTHER = "other"
@@ -54,6 +223,7 @@ class Item(models.Model):
     name = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey("auth.User", on_delete=models.CASCADE)
     item_type = models.CharField(
         max_length=20,
@@ -64,6 +234,25 @@ class Item(models.Model):
         Community, related_name="shared_items", blank=True
     )
 
+    objects = models.Manager()
+    active = ActiveManager()
+
+    class Meta:
+        indexes = [
+            # The owner's active rows, owner_id = ? AND is_active.
+            models.Index(
+                fields=["owner"],
+                condition=Q(is_active=True),
+                name="item_active_idx",
+            ),
+            # Admin searches by name prefix, LIKE 'x%' on Postgres.
+            models.Index(
+                fields=["name"],
+                opclasses=["varchar_pattern_ops"],
+                name="item_name_prefix_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name} (owned by {self.owner.username})"
 
@@ -84,6 +273,20 @@ class Lease(models.Model):
     )
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Overlap checks and availability lookups are range queries per item.
+            models.Index(
+                fields=["item", "start_date", "end_date"],
+                name="lease_item_dates_idx",
+            ),
+            # The admin's date hierarchy and its newest first ordering.
+            models.Index(fields=["start_date"], name="lease_start_date_idx"),
+            # Due date reminders scan the leases ending in the next hours.
+            models.Index(fields=["end_date"], name="lease_end_date_idx"),
+        ]
 
     def clean(self):
         # Ensure that there is no overlap in leases for the same item
@@ -93,8 +296,12 @@ class Lease(models.Model):
         overlapping_leases = Lease.objects.filter(
             item=self.item, start_date__lt=self.end_date, end_date__gt=self.start_date
         ).exclude(pk=self.id)
+        # Leases back dated far enough may overlap ones moved to the archive.
+        overlapping_archived_leases = ArchivedLease.objects.filter(
+            item=self.item, start_date__lt=self.end_date, end_date__gt=self.start_date
+        ).exclude(lease_id=self.id)
 
-        if overlapping_leases.exists():
+        if overlapping_leases.exists() or overlapping_archived_leases.exists():
             raise ValidationError(
                 "This item is already leased during the given period."
             )
@@ -103,11 +310,203 @@ class Lease(models.Model):
         return f"Lease of {self.item.name} by {self.lessee.username} from {self.start_date} to {self.end_date}"
 
 
+class LeaseReminder(models.Model):
+    """
+    A due date reminder that was sent, so it is sent once per recipient. A
+    lease that is extended gets new reminders for its new end date.
+    """
+
+    lease = models.ForeignKey(Lease, related_name="reminders", on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        "auth.User", related_name="lease_reminders", on_delete=models.CASCADE
+    )
+    end_date = models.DateTimeField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["lease", "user", "end_date"], name="lease_reminder_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Reminder of lease #{self.lease_id} for user #{self.user_id}"
+
+
+class ArchivedLease(models.Model):
+    """
+    Leases that ended long ago, moved out of ``Lease`` by the archive_leases
+    command so overlap checks and lease lists only scan recent rows.
+    """
+
+    lease_id = models.BigIntegerField(unique=True)
+    item = models.ForeignKey(
+        Item, related_name="archived_leases", on_delete=models.CASCADE
+    )
+    lessee = models.ForeignKey(
+        "auth.User", related_name="archived_leases", on_delete=models.CASCADE
+    )
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["item", "-end_date"], name="archived_lease_item_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived lease of {self.item.name} by {self.lessee.username} from {self.start_date} to {self.end_date}"
+
+
+class TransactionId(models.Func):
+    """
+    Id of the current transaction on Postgres. Other databases commit writers
+    one at a time, so ids never commit out of order there and this is 0.
+    """
+
+    function = "txid_current"
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return "0", []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, **extra_context)
+
+
+class Event(models.Model):
+    """
+    Append-only outbox of domain events, written in the same transaction as the
+    change they describe and read by ``manage.py consume_events``.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # The transaction that wrote the event. Consumers read in (txid, id) order,
+    # see backend/outbox.py.
+    txid = models.BigIntegerField(db_default=TransactionId())
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["txid", "id"], name="event_txid_order_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.pk}"
+
+    @classmethod
+    def record(cls, event_type: str, **payload) -> "Event":
+        return cls.objects.create(event_type=event_type, payload=payload)
+
+
+class ConsumerCheckpoint(models.Model):
+    """The last outbox event a consumer has finished processing."""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_txid = models.BigIntegerField(default=0)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at #{self.last_event_id}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by ``manage.py run_workers``. See
+    backend/jobs.py.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # At most one queued or running job per key, see the constraint below.
+    unique_key = models.CharField(max_length=200, null=True, blank=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers only ever look for queued jobs that are due.
+            models.Index(
+                fields=["run_at", "id"],
+                condition=Q(status="queued"),
+                name="job_queued_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["unique_key"],
+                condition=Q(status__in=["queued", "running"]),
+                name="job_unique_pending_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
 @receiver(pre_save, sender=Lease)
 def pre_save_lease(sender, instance, **kwargs):
     instance.clean()
 
 
+@receiver([post_save, post_delete], sender="auth.User")
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+class UserStats(models.Model):
+    """Denormalized per-user counts, see ``Community.member_count``."""
+
+    user = models.OneToOneField(
+        "auth.User", primary_key=True, related_name="stats", on_delete=models.CASCADE
+    )
+    item_count = models.IntegerField(default=0)
+    subscription_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats of user #{self.user_id}"
+
+    @classmethod
+    def add_to_counts(cls, user_id: int, **deltas) -> int:
+        return cls.objects.filter(user_id=user_id).update(**_increments(**deltas))
+
+    @classmethod
+    def refresh_counts(cls, user_ids) -> int:
+        """Recounts the given users from scratch, creating missing rows."""
+        user_ids = list(user_ids)
+        cls.objects.bulk_create(
+            [cls(user_id=user_id) for user_id in user_ids], ignore_conflicts=True
+        )
+        return cls.objects.filter(user_id__in=user_ids).update(
+            item_count=_count_of(Item, "owner"),
+            subscription_count=_count_of(Subscription, "owner"),
+        )
+
+
 class Request(models.Model):
     ITEM = "item"
     SUBSCRIPTION = "subscription"
@@ -123,6 +522,7 @@ class Request(models.Model):
         default=ITEM,
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     is_completed = models.BooleanField(default=False)
     owner = models.ForeignKey("auth.User", on_delete=models.CASCADE)
@@ -130,5 +530,387 @@ class Request(models.Model):
         Community, related_name="shared_requests", blank=True
     )
 
+    objects = models.Manager()
+    active = ActiveManager()
+
+    class Meta:
+        indexes = [
+            # The owner's open requests.
+            models.Index(
+                fields=["owner"],
+                condition=Q(is_active=True, is_completed=False),
+                name="request_open_idx",
+            ),
+            # Admin searches by name prefix, LIKE 'x%' on Postgres.
+            models.Index(
+                fields=["name"],
+                opclasses=["varchar_pattern_ops"],
+                name="request_name_prefix_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class FeedEntry(models.Model):
+    """
+    A line of an activity feed, written by the ``feed`` outbox consumer. See
+    backend/feed.py.
+    """
+
+    ITEM_SHARED = "item_shared"
+    SUBSCRIPTION_SHARED = "subscription_shared"
+    REQUEST_SHARED = "request_shared"
+    ITEMS_SHARED = "items_shared"
+    SUBSCRIPTIONS_SHARED = "subscriptions_shared"
+    LEASE_RETURNED = "lease_returned"
+    VERB_CHOICES = [
+        (ITEM_SHARED, "Shared an item"),
+        (SUBSCRIPTION_SHARED, "Shared a subscription"),
+        (REQUEST_SHARED, "Asked for something"),
+        (ITEMS_SHARED, "Shared items"),
+        (SUBSCRIPTIONS_SHARED, "Shared subscriptions"),
+        (LEASE_RETURNED, "Item available again"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # Empty for the shared timeline of a community too large to fan out to.
+    user = models.ForeignKey(
+        "auth.User",
+        null=True,
+        blank=True,
+        related_name="feed_entries",
+        on_delete=models.CASCADE,
+    )
+    community = models.ForeignKey(Community, related_name="+", on_delete=models.CASCADE)
+    actor = models.ForeignKey("auth.User", related_name="+", on_delete=models.CASCADE)
+    verb = models.CharField(max_length=30, choices=VERB_CHOICES)
+    # The item, subscription or request, empty for ITEMS_SHARED and
+    # SUBSCRIPTIONS_SHARED.
+    object_id = models.BigIntegerField(null=True, blank=True)
+    object_name = models.CharField(max_length=100, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    event_id = models.BigIntegerField(db_index=True)
+    # Seconds since the epoch plus a bonus for closeness, higher comes first.
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "feed entries"
+        indexes = [
+            models.Index(fields=["user", "-score", "-id"], name="feed_user_score_idx"),
+            models.Index(
+                fields=["community", "-score", "-id"],
+                condition=Q(user__isnull=True),
+                name="feed_community_score_idx",
+            ),
+            models.Index(fields=["verb", "object_id"], name="feed_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_verb_display()} #{self.pk}"
+
+    def get_absolute_url(self):
+        url_names = {
+            self.ITEM_SHARED: "item_detail",
+            self.SUBSCRIPTION_SHARED: "subscription_detail",
+            self.REQUEST_SHARED: "request_detail",
+            self.LEASE_RETURNED: "item_detail",
+        }
+        if self.verb in url_names:
+            return reverse(url_names[self.verb], args=[self.object_id])
+        return reverse("community_detail", args=[self.community_id])
+
+
+@receiver(pre_delete, sender=Item)
+@receiver(pre_delete, sender=Subscription)
+@receiver(pre_delete, sender=Request)
+def pre_delete_shared_object(sender, instance, **kwargs):
+    # The shared_with rows are gone by the time post_delete runs.
+    instance._shared_with_ids = list(instance.shared_with.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Request)
+def bump_shared_object_versions(sender, instance, **kwargs):
+    if hasattr(instance, "_shared_with_ids"):
+        community_ids = instance._shared_with_ids
+    else:
+        community_ids = list(instance.shared_with.values_list("id", flat=True))
+    bump_versions(user_ids=[instance.owner_id], community_ids=community_ids)
+
+
+@receiver(post_save, sender=Lease)
+@receiver(post_delete, sender=Lease)
+def bump_lease_versions(sender, instance, **kwargs):
+    item = Item.objects.filter(pk=instance.item_id).first()
+    if item is None:
+        bump_versions(user_ids=[instance.lessee_id])
+        return
+    bump_versions(
+        user_ids=[instance.lessee_id, item.owner_id],
+        community_ids=list(item.shared_with.values_list("id", flat=True)),
+    )
+
+
+@receiver(post_save, sender=Community)
+@receiver(post_delete, sender=Community)
+def bump_community_versions(sender, instance, **kwargs):
+    bump_versions(user_ids=[instance.owner_id], community_ids=[instance.pk])
+
+
+def _get_related_ids(through, instance, model) -> list:
+    source, target = None, None
+    for field in through._meta.fields:
+        if field.is_relation and field.related_model is instance._meta.model:
+            source = field.name
+        elif field.is_relation and field.related_model is model:
+            target = field.name
+    return list(
+        through.objects.filter(**{source: instance.pk}).values_list(
+            f"{target}_id", flat=True
+        )
+    )
+
+
+@receiver(m2m_changed, sender=Item.shared_with.through)
+@receiver(m2m_changed, sender=Subscription.shared_with.through)
+@receiver(m2m_changed, sender=Request.shared_with.through)
+@receiver(m2m_changed, sender=Subscription.shared_to.through)
+@receiver(m2m_changed, sender=Community.members.through)
+def bump_m2m_versions(sender, instance, action, model, pk_set, **kwargs):
+    if action == "pre_clear":
+        # Everything currently related is about to be removed.
+        pk_set = _get_related_ids(sender, instance, model)
+    elif action not in ("post_add", "post_remove"):
+        return
+    if not pk_set:
+        return
+
+    user_ids, community_ids = [], []
+    for side_model, ids in ((instance._meta.model, [instance.pk]), (model, pk_set)):
+        if side_model is Community:
+            community_ids += ids
+        elif side_model._meta.label == "auth.User":
+            user_ids += ids
+    bump_versions(user_ids=user_ids, community_ids=community_ids)
+
+
+@receiver(m2m_changed, sender=Item.shared_with.through)
+@receiver(m2m_changed, sender=Subscription.shared_with.through)
+@receiver(m2m_changed, sender=Request.shared_with.through)
+def publish_shared_objects(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        # community.shared_items.add(...), instance is the community.
+        shared = [(obj, [instance.pk]) for obj in model.objects.filter(pk__in=pk_set)]
+    else:
+        shared = [(instance, pk_set)]
+    for obj, community_ids in shared:
+        publish_shared(
+            obj._meta.model_name,
+            community_ids,
+            owner_id=obj.owner_id,
+            id=obj.pk,
+            name=obj.name,
+        )
+
+
+def _event_payload(instance) -> dict:
+    payload = {"id": instance.pk}
+    for field in instance._meta.concrete_fields:
+        if field.is_relation or isinstance(
+            field, (models.DateTimeField, models.BooleanField)
+        ):
+            payload[field.attname] = field.value_from_object(instance)
+    return payload
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Lease)
+@receiver(post_save, sender=Request)
+@receiver(post_save, sender=Community)
+def record_saved_event(sender, instance, created, **kwargs):
+    action = "created" if created else "updated"
+    Event.record(f"{sender._meta.model_name}.{action}", **_event_payload(instance))
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Lease)
+@receiver(post_delete, sender=Request)
+@receiver(post_delete, sender=Community)
+def record_deleted_event(sender, instance, **kwargs):
+    Event.record(f"{sender._meta.model_name}.deleted", **_event_payload(instance))
+
+
+@receiver(m2m_changed, sender=Community.members.through)
+def record_membership_event(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action == "pre_clear":
+        pk_set = _get_related_ids(sender, instance, model)
+        action = "post_remove"
+    elif action not in ("post_add", "post_remove"):
+        return
+    if not pk_set:
+        return
+
+    event_type = (
+        "community.members_added"
+        if action == "post_add"
+        else "community.members_removed"
+    )
+    if reverse:
+        # user.community_members.add(...), instance is the user.
+        for community_id in pk_set:
+            Event.record(event_type, community_id=community_id, user_ids=[instance.pk])
+    else:
+        Event.record(event_type, community_id=instance.pk, user_ids=sorted(pk_set))
+
+
+@receiver(m2m_changed, sender=Item.shared_with.through)
+@receiver(m2m_changed, sender=Subscription.shared_with.through)
+@receiver(m2m_changed, sender=Request.shared_with.through)
+def record_share_event(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action == "pre_clear":
+        pk_set = _get_related_ids(sender, instance, model)
+        action = "post_remove"
+    elif action not in ("post_add", "post_remove"):
+        return
+    if not pk_set:
+        return
+
+    if reverse:
+        # community.shared_items.add(...), instance is the community.
+        name, ids, community_ids = model._meta.model_name, sorted(pk_set), [instance.pk]
+    else:
+        name, ids, community_ids = (
+            instance._meta.model_name,
+            [instance.pk],
+            sorted(pk_set),
+        )
+    verb = "shared" if action == "post_add" else "unshared"
+    Event.record(f"{name}.{verb}", ids=ids, community_ids=community_ids)
+    mark_changed(object_key(name, pk) for pk in ids)
+
+
+@receiver(m2m_changed, sender=Community.members.through)
+def mark_changed_memberships(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    if action == "pre_clear":
+        pk_set = _get_related_ids(sender, instance, model)
+    elif action not in ("post_add", "post_remove"):
+        return
+    user_ids = [instance.pk] if reverse else pk_set or ()
+    mark_changed(user_key(user_id) for user_id in user_ids)
+
+
+@receiver(post_save, sender=Community)
+@receiver(post_delete, sender=Community)
+def mark_changed_communities(sender, instance, created=False, **kwargs):
+    # A new community has no members yet, any other change may activate or
+    # deactivate it.
+    if not created:
+        mark_changed([COMMUNITIES_KEY])
+
+
+def _recount_after_removal(sender, instance, action, pk_set) -> None:
+    # Removed pks are not necessarily related, recount instead of decrementing.
+    if isinstance(instance, Community):
+        if action in ("post_remove", "post_clear"):
+            Community.refresh_counts([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_community_ids = _get_related_ids(sender, instance, Community)
+    elif action == "post_remove":
+        Community.refresh_counts(pk_set)
+    elif action == "post_clear":
+        Community.refresh_counts(instance._cleared_community_ids)
+
+
+@receiver(m2m_changed, sender=Subscription.shared_to.through)
+def count_seats_taken(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # Seats given out by editing shared_to, claim_seat counts its own.
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            Subscription.refresh_seats_taken([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_subscription_ids = _get_related_ids(
+            sender, instance, Subscription
+        )
+    elif action in ("post_add", "post_remove"):
+        Subscription.refresh_seats_taken(pk_set)
+    elif action == "post_clear":
+        Subscription.refresh_seats_taken(instance._cleared_subscription_ids)
+
+
+@receiver(m2m_changed, sender=Community.members.through)
+def count_members(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # pk_set of post_add only holds the rows actually inserted.
+    if action == "post_add" and pk_set:
+        if reverse:
+            Community.add_to_counts(pk_set, member_count=1)
+        else:
+            Community.add_to_counts([instance.pk], member_count=len(pk_set))
+    else:
+        _recount_after_removal(sender, instance, action, pk_set)
+
+
+@receiver(m2m_changed, sender=Item.shared_with.through)
+@receiver(m2m_changed, sender=Subscription.shared_with.through)
+def count_shared_objects(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action == "post_add" and pk_set:
+        if reverse:
+            field = f"shared_{model._meta.model_name}_count"
+            added = model.objects.filter(pk__in=pk_set, is_active=True).count()
+            Community.add_to_counts([instance.pk], **{field: added})
+        elif instance.is_active:
+            field = f"shared_{instance._meta.model_name}_count"
+            Community.add_to_counts(pk_set, **{field: 1})
+    else:
+        _recount_after_removal(sender, instance, action, pk_set)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Subscription)
+def count_saved_object(sender, instance, created, **kwargs):
+    name = sender._meta.model_name
+    if created:
+        if not UserStats.add_to_counts(instance.owner_id, **{f"{name}_count": 1}):
+            UserStats.refresh_counts([instance.owner_id])
+    elif instance._loaded_is_active not in (None, instance.is_active):
+        Community.add_to_counts(
+            list(instance.shared_with.values_list("id", flat=True)),
+            **{f"shared_{name}_count": 1 if instance.is_active else -1},
+        )
+    instance._loaded_is_active = instance.is_active
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Subscription)
+def count_deleted_object(sender, instance, **kwargs):
+    name = sender._meta.model_name
+    UserStats.add_to_counts(instance.owner_id, **{f"{name}_count": -1})
+    if instance.is_active:
+        Community.add_to_counts(
+            instance._shared_with_ids, **{f"shared_{name}_count": -1}
+        )
+
+
+@receiver(pre_delete, sender="auth.User")
+def pre_delete_user(sender, instance, **kwargs):
+    # Deleting a user deletes their memberships without m2m_changed signals.
+    instance._member_of_ids = list(
+        instance.community_members.values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender="auth.User")
+def count_deleted_user(sender, instance, **kwargs):
+    Community.refresh_counts(instance._member_of_ids)
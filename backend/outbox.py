@@ -0,0 +1,125 @@
+"""
+Consumers of the ``Event`` outbox.
+
+A consumer is a function taking a batch of events. ``consume_batch`` hands it
+the events after the consumer's checkpoint and only then moves the checkpoint
+forward, so every event is delivered at least once and a consumer that fails
+halfway sees the whole batch again. Consumers have to be idempotent.
+
+Ids are handed out when a transaction inserts, not when it commits, so a long
+transaction can commit an event with a lower id than events consumed long
+before. Events are therefore read in the order of the transactions that wrote
+them, and only once every transaction up to theirs has finished: on Postgres
+the snapshot's xmin tells which have. A checkpoint is a ``(txid, id)`` pair.
+
+Register new consumers with the ``consumer`` decorator, run them with
+``python manage.py consume_events <name>``.
+"""
+
+import json
+import sys
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+
+from backend import feed
+from backend.models import ConsumerCheckpoint, Event
+
+# Past the largest event id, a position after every event of a transaction.
+END_OF_TRANSACTION = 2**63 - 1
+
+CONSUMERS = {}
+
+
+def consumer(name: str):
+    def register(func):
+        CONSUMERS[name] = func
+        return func
+
+    return register
+
+
+def _finished_transactions() -> Q | None:
+    """
+    Matches the events of transactions that have finished, None when every
+    visible event has. Events of the caller's own transaction count as
+    finished while no older transaction is still running.
+    """
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT txid_snapshot_xmin(txid_current_snapshot()), "
+            "txid_current_if_assigned()"
+        )
+        xmin, own = cursor.fetchone()
+    finished = Q(txid__lt=xmin)
+    if own is not None and own <= xmin:
+        finished |= Q(txid=own)
+    return finished
+
+
+def events_after(txid: int, event_id: int) -> QuerySet:
+    """Every visible event after the checkpoint, finished or not."""
+    return Event.objects.filter(Q(txid__gt=txid) | Q(txid=txid, id__gt=event_id))
+
+
+def read_events(txid: int, event_id: int, batch_size: int) -> list[Event]:
+    """The next events after the checkpoint that can't be overtaken anymore."""
+    finished = _finished_transactions()
+    events = events_after(txid, event_id)
+    if finished is not None:
+        events = events.filter(finished)
+    return list(events.order_by("txid", "id")[:batch_size])
+
+
+def current_position() -> tuple[int, int]:
+    """A checkpoint past every event of the transactions that have finished."""
+    if connection.vendor != "postgresql":
+        last = Event.objects.order_by("-id").values_list("id", flat=True).first()
+        return 0, last or 0
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        (xmin,) = cursor.fetchone()
+    return xmin - 1, END_OF_TRANSACTION
+
+
+def consume_batch(name: str, batch_size: int) -> int:
+    handler = CONSUMERS[name]
+    checkpoint, _ = ConsumerCheckpoint.objects.get_or_create(name=name)
+    events = read_events(checkpoint.last_txid, checkpoint.last_event_id, batch_size)
+    if not events:
+        return 0
+
+    with transaction.atomic():
+        handler(events)
+        checkpoint.last_txid = events[-1].txid
+        checkpoint.last_event_id = events[-1].id
+        checkpoint.save(update_fields=["last_txid", "last_event_id", "updated_at"])
+    return len(events)
+
+
+@consumer("jsonl")
+def write_jsonl(events):
+    """Writes events to stdout as JSON Lines, to pipe them into other systems."""
+    for event in events:
+        sys.stdout.write(
+            json.dumps(
+                {
+                    "id": event.pk,
+                    "type": event.event_type,
+                    "created_at": event.created_at,
+                    "payload": event.payload,
+                },
+                cls=DjangoJSONEncoder,
+            )
+            + "\n"
+        )
+    sys.stdout.flush()
+
+
+@consumer("feed")
+def fan_out_to_feeds(events):
+    """Writes the activity feeds, see backend/feed.py."""
+    feed.add_events(events)
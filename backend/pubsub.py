@@ -0,0 +1,155 @@
+"""
+In-process publish/subscribe for real-time events.
+
+Events are small JSON-serializable dicts. Every process keeps its own set of
+subscribers, usually one per open ``/events`` stream. The broker decides how
+an event published in one process reaches the subscribers of all others:
+
+- ``InMemoryBroker`` only delivers within the process. Fine for development
+  with a single process, and for tests.
+- ``PostgresBroker`` publishes with ``pg_notify`` and runs one ``LISTEN``
+  connection per process in a background thread.
+
+Pick one with the ``PUBSUB_BROKER`` setting.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Broker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def subscribe(self):
+        """
+        Yields an ``asyncio.Queue`` receiving every event published while the
+        block is open. Has to be entered from a running event loop.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def publish(self, event: dict) -> None:
+        raise NotImplementedError
+
+    def _deliver(self, event: dict) -> None:
+        # Publishers run in request threads, subscribers in event loops.
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # The loop was closed without leaving subscribe().
+                with self._lock:
+                    self._subscribers.discard((loop, queue))
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: dict) -> None:
+        # A client that stopped reading loses events rather than memory.
+        if not queue.full():
+            queue.put_nowait(event)
+
+
+class InMemoryBroker(Broker):
+    def publish(self, event: dict) -> None:
+        self._deliver(event)
+
+
+class PostgresBroker(Broker):
+    CHANNEL = "closeknit_events"
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, event: dict) -> None:
+        # Inside a transaction Postgres only delivers the notification on commit.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [self.CHANNEL, json.dumps(event)]
+            )
+
+    @contextmanager
+    def subscribe(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="pubsub-listener", daemon=True
+                )
+                self._listener.start()
+        with super().subscribe() as queue:
+            yield queue
+
+    def _connect(self):
+        database = settings.DATABASES["default"]
+        return psycopg.connect(
+            dbname=database["NAME"],
+            user=database["USER"],
+            password=database["PASSWORD"],
+            host=database["HOST"],
+            port=database["PORT"] or None,
+            autocommit=True,
+        )
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                with self._connect() as listen_connection:
+                    listen_connection.execute(f"LISTEN {self.CHANNEL}")
+                    for notify in listen_connection.notifies():
+                        self._deliver(json.loads(notify.payload))
+            except Exception:
+                logger.exception("Lost the pubsub LISTEN connection, reconnecting")
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> Broker:
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.PUBSUB_BROKER)()
+        return _broker
+
+
+def publish_shared(kind: str, community_ids, owner_id: int, **data) -> None:
+    """
+    Tells the members of the given communities that something of ``kind``
+    (item, subscription or request) was shared with them, once the current
+    transaction commits.
+    """
+    community_ids = list(community_ids)
+    if not community_ids:
+        return
+    event = {
+        "type": f"{kind}_shared",
+        "community_ids": community_ids,
+        "owner_id": owner_id,
+        **data,
+    }
+    transaction.on_commit(lambda: get_broker().publish(event))
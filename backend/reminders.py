@@ -0,0 +1,120 @@
+"""
+Due date reminders for leases.
+
+The ``send_lease_reminders`` job runs every hour. It finds the leases ending in
+the next ``LEASE_REMINDER_HOURS`` with one range scan of the ``end_date``
+index, groups them per recipient, and emails every lessee and owner one
+reminder listing all of their leases that are due. Work is proportional to
+the number of due leases, however many users and leases there are.
+
+Sent reminders are recorded in ``LeaseReminder``, one row per lease, recipient
+and end date, so the hourly runs don't remind anyone twice. They are recorded
+in the transaction that sends them: a batch that fails to send is sent again
+when the job is retried.
+"""
+
+from datetime import datetime, timedelta
+from itertools import batched
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from backend.models import Lease, LeaseReminder
+
+SEND_BATCH_SIZE = 100
+
+
+def get_due_leases(now: datetime) -> list[Lease]:
+    window = timedelta(hours=settings.LEASE_REMINDER_HOURS)
+    return list(
+        Lease.objects.filter(end_date__gt=now, end_date__lte=now + window)
+        .select_related("item__owner", "lessee")
+        .only(
+            "end_date",
+            "item__name",
+            "item__owner__username",
+            "item__owner__email",
+            "lessee__username",
+            "lessee__email",
+        )
+        .order_by("end_date")
+    )
+
+
+def _group_by_recipient(leases, sent) -> dict:
+    """Maps every recipient to the due leases they borrowed and lent out."""
+    recipients = {}
+    for lease in leases:
+        owner = lease.item.owner
+        for user, role in ((lease.lessee, "borrowed"), (owner, "lent")):
+            if role == "lent" and owner.pk == lease.lessee_id:
+                continue
+            if not user.email or (lease.pk, user.pk, lease.end_date) in sent:
+                continue
+            _, due = recipients.setdefault(
+                user.pk, (user, {"borrowed": [], "lent": []})
+            )
+            due[role].append(lease)
+    return recipients
+
+
+def format_reminder(user, borrowed, lent) -> str:
+    lines = [f"Hi {user.username},", ""]
+    if borrowed:
+        lines.append("These are due back soon:")
+        lines += [
+            f"- {lease.item.name}, return it to {lease.item.owner.username} by "
+            f"{lease.end_date:%Y-%m-%d %H:%M} UTC"
+            for lease in borrowed
+        ]
+        lines.append("")
+    if lent:
+        lines.append("These are coming back to you soon:")
+        lines += [
+            f"- {lease.item.name} from {lease.lessee.username}, due "
+            f"{lease.end_date:%Y-%m-%d %H:%M} UTC"
+            for lease in lent
+        ]
+        lines.append("")
+    lines.append("Closeknit")
+    return "\n".join(lines)
+
+
+def _send_batch(recipients) -> None:
+    from_email = f"Closeknit <{settings.DEFAULT_FROM_EMAIL}>"
+    messages, reminders = [], []
+    for user, due in recipients:
+        messages.append(
+            EmailMessage(
+                subject="Leases due soon on Closeknit",
+                body=format_reminder(user, due["borrowed"], due["lent"]),
+                from_email=from_email,
+                to=[user.email],
+            )
+        )
+        reminders += [
+            LeaseReminder(lease=lease, user=user, end_date=lease.end_date)
+            for lease in due["borrowed"] + due["lent"]
+        ]
+    with transaction.atomic():
+        LeaseReminder.objects.bulk_create(reminders, ignore_conflicts=True)
+        # One connection to the email provider for the whole batch.
+        get_connection().send_messages(messages)
+
+
+def send_lease_reminders(now: datetime | None = None) -> int:
+    """Sends the reminders that are due, returns how many emails were sent."""
+    leases = get_due_leases(now or timezone.now())
+    if not leases:
+        return 0
+    sent = set(
+        LeaseReminder.objects.filter(
+            lease_id__in=[lease.pk for lease in leases]
+        ).values_list("lease_id", "user_id", "end_date")
+    )
+    recipients = _group_by_recipient(leases, sent)
+    for batch in batched(recipients.values(), SEND_BATCH_SIZE):
+        _send_batch(batch)
+    return len(recipients)
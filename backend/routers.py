@@ -0,0 +1,103 @@
+"""
+Primary / replica database routing.
+
+Reads only go to the replica inside a ``use_replica()`` block or a service
+function decorated with ``reads_from_replica``. Everything else, including all
+writes, uses the primary. Once a request writes, it is pinned to the primary
+for the rest of the request and ``ReplicaPinningMiddleware`` keeps the user
+pinned for ``REPLICA_PIN_SECONDS`` afterwards, so users read their own writes.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import QuerySet
+
+REPLICA_DB_ALIAS = "replica"
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+# Only set while a request is being handled, holds {"pinned": bool, "wrote": bool}
+_request_pin_state = contextvars.ContextVar("request_pin_state", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def is_pinned_to_primary() -> bool:
+    state = _request_pin_state.get()
+    return state is not None and (state["pinned"] or state["wrote"])
+
+
+def get_read_db() -> str:
+    if _use_replica.get() and replica_configured() and not is_pinned_to_primary():
+        return REPLICA_DB_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def pinning_scope(pinned: bool):
+    state = {"pinned": pinned, "wrote": False}
+    token = _request_pin_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_pin_state.reset(token)
+
+
+def _bind_to_db(result, db: str):
+    # Querysets are lazy and usually evaluated by the template, long after the
+    # service function returned, so they are bound to the database explicitly.
+    if isinstance(result, QuerySet):
+        return result.using(db)
+    if isinstance(result, dict):
+        return {key: _bind_to_db(value, db) for key, value in result.items()}
+    if isinstance(result, list):
+        return [_bind_to_db(value, db) for value in result]
+    return result
+
+
+def reads_from_replica(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return _bind_to_db(func(*args, **kwargs), get_read_db())
+
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if get_read_db() == REPLICA_DB_ALIAS:
+            return REPLICA_DB_ALIAS
+        # Falls back to the database of the instance in hints, or the primary.
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_pin_state.get()
+        if state is not None:
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -1,9 +1,99 @@
+import codecs
+import csv
+import json
+from itertools import batched
+
+from allauth.socialaccount.adapter import get_adapter as get_social_adapter
 from allauth.socialaccount.models import SocialAccount
 from django.contrib.auth.models import User
-from django.db.models import QuerySet
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet
 from django.urls import reverse
 from django.utils import timezone
-from backend.models import Subscription, Community, Item, Lease, Request
+from django.utils.functional import cached_property
+from backend import feed, membership_index
+from backend.models import (
+    ArchivedLease,
+    Event,
+    Subscription,
+    Community,
+    Item,
+    Lease,
+    Request,
+    SeatWaitlistEntry,
+    UserStats,
+)
+from backend.pubsub import publish_shared
+from backend.routers import reads_from_replica
+from backend.versions import bump_versions
+
+BULK_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 100
+LEASE_HISTORY_LIMIT = 20
+
+
+class UserContext:
+    """
+    Everything the service functions need to know about the current user,
+    computed at most once per request. Attached to every request as
+    ``request.user_context`` by ``UserContextMiddleware``.
+    """
+
+    def __init__(self, user: User):
+        self.user = user
+
+    @cached_property
+    def community_ids(self) -> list[int]:
+        if not self.user.is_authenticated:
+            return []
+        community_ids = membership_index.get_community_ids(self.user.pk)
+        if community_ids is not None:
+            return community_ids
+        return list(
+            Community.active.filter(members=self.user).values_list("id", flat=True)
+        )
+
+
+def get_user_context(user: User | UserContext) -> UserContext:
+    if isinstance(user, UserContext):
+        return user
+    return UserContext(user)
+
+
+# Exactly what the listing partials in templates/backend/_partials render,
+# including the fields of their fragment cache keys.
+ITEM_CARD_FIELDS = ["name", "item_type", "updated_at", "owner__username"]
+SUBSCRIPTION_CARD_FIELDS = ["name", "updated_at", "owner__username"]
+REQUEST_CARD_FIELDS = ["name", "request_type", "updated_at", "owner__username"]
+LEASE_CARD_FIELDS = [
+    "start_date",
+    "end_date",
+    "updated_at",
+    "item__name",
+    "item__updated_at",
+    "item__owner",
+]
+COMMUNITY_CARD_FIELDS = ["name", "owner__username"]
+
+
+def item_cards(items: QuerySet[Item]) -> QuerySet[Item]:
+    return items.select_related("owner").only(*ITEM_CARD_FIELDS)
+
+
+def subscription_cards(subscriptions: QuerySet[Subscription]) -> QuerySet[Subscription]:
+    return subscriptions.select_related("owner").only(*SUBSCRIPTION_CARD_FIELDS)
+
+
+def request_cards(requests: QuerySet[Request]) -> QuerySet[Request]:
+    return requests.select_related("owner").only(*REQUEST_CARD_FIELDS)
+
+
+def lease_cards(leases: QuerySet[Lease]) -> QuerySet[Lease]:
+    return leases.select_related("item").only(*LEASE_CARD_FIELDS)
+
+
+def community_cards(communities: QuerySet[Community]) -> QuerySet[Community]:
+    return communities.select_related("owner").only(*COMMUNITY_CARD_FIELDS)
 
 
 def get_user(user_name: str) -> User | None:
@@ -13,105 +103,631 @@ def get_user(user_name: str) -> User | None:
         return None
 
 
-def get_all_users_from_communities_the_user_belongs_to(user: User) -> list[User]:
-    communities_the_user_belongs_to = Community.objects.filter(members=user)
+@reads_from_replica
+def get_all_users_from_communities_the_user_belongs_to(
+    user: User | UserContext,
+) -> list[User]:
+    user_context = get_user_context(user)
     return list(
-        User.objects.filter(community_members__in=communities_the_user_belongs_to)
-        .exclude(id=user.id)
+        User.objects.filter(community_members__in=user_context.community_ids)
+        .exclude(id=user_context.user.id)
         .distinct()
     )
 
 
-def get_items_available_for_lease(user: User) -> QuerySet[Item]:
-    communities_the_user_belongs_to = Community.objects.filter(members=user)
-    items_shared_to_communities_the_user_belongs_to = Item.objects.filter(
-        shared_with__in=communities_the_user_belongs_to
+@reads_from_replica
+def get_items_available_for_lease(user: User | UserContext) -> QuerySet[Item]:
+    user_context = get_user_context(user)
+    items_shared_to_communities_the_user_belongs_to = Item.active.filter(
+        shared_with__in=user_context.community_ids
     )
     items_already_leased_out = Lease.objects.filter(
         end_date__gt=timezone.now(),
         item__in=items_shared_to_communities_the_user_belongs_to,
     )
-    return items_shared_to_communities_the_user_belongs_to.exclude(owner=user).exclude(
-        pk__in=[lease.item.pk for lease in items_already_leased_out]
+    return items_shared_to_communities_the_user_belongs_to.exclude(
+        owner=user_context.user
+    ).exclude(
+        pk__in=items_already_leased_out.values("item_id")
     ).distinct()
 
-def get_pending_requests_for_user(user: User) -> QuerySet[Request]:
-    communities_the_user_belongs_to = Community.objects.filter(members=user)
-    requests_shared_to_communities_the_user_belongs_to = Request.objects.filter(
-        shared_with__in=communities_the_user_belongs_to
+@reads_from_replica
+def get_items_available_between(
+    user: User | UserContext, start, end
+) -> QuerySet[Item]:
+    """
+    Items shared with the user's communities that are free for the whole
+    window. Both conditions are correlated subqueries rather than joins, so
+    each item appears once and results can be paged by primary key. The
+    overlap check is answered by the (item, start_date, end_date) lease index,
+    and for windows in the past by the archived leases too.
+    """
+    user_context = get_user_context(user)
+    shared_with_user = Item.shared_with.through.objects.filter(
+        item=OuterRef("pk"), community_id__in=user_context.community_ids
+    )
+    overlapping_leases = Lease.objects.filter(
+        item=OuterRef("pk"), start_date__lt=end, end_date__gt=start
+    )
+    overlapping_archived_leases = ArchivedLease.objects.filter(
+        item=OuterRef("pk"), start_date__lt=end, end_date__gt=start
+    )
+    return (
+        Item.active.filter(Exists(shared_with_user))
+        .exclude(owner=user_context.user)
+        .exclude(Exists(overlapping_leases))
+        .exclude(Exists(overlapping_archived_leases))
+        .select_related("owner")
+        .order_by("pk")
+    )
+
+
+@reads_from_replica
+def shares_community(
+    user: User | UserContext, obj: Item | Subscription | Request
+) -> bool:
+    """
+    Whether the object is shared with one of the user's communities, answered
+    from the membership index when it is up to date.
+    """
+    user_context = get_user_context(user)
+    community_ids = membership_index.get_shared_community_ids(
+        obj._meta.model_name, obj.pk, obj.owner_id
     )
-    return requests_shared_to_communities_the_user_belongs_to.exclude(owner=user).filter(is_completed=False).distinct()
+    if community_ids is None:
+        return obj.shared_with.filter(pk__in=user_context.community_ids).exists()
+    return not set(community_ids).isdisjoint(user_context.community_ids)
+
 
-def get_subscriptions_available_for_share(user: User) -> QuerySet[Subscription]:
-    communities_the_user_belongs_to = Community.objects.filter(members=user)
+@reads_from_replica
+def is_item_available_for_lease(user: User | UserContext, item: Item) -> bool:
+    """Whether ``item`` is one of ``get_items_available_for_lease(user)``."""
+    user_context = get_user_context(user)
+    return (
+        item.is_active
+        and item.owner_id != user_context.user.pk
+        and shares_community(user_context, item)
+        and not Lease.objects.filter(item=item, end_date__gt=timezone.now()).exists()
+    )
+
+
+@reads_from_replica
+def get_pending_requests_for_user(user: User | UserContext) -> QuerySet[Request]:
+    user_context = get_user_context(user)
+    requests_shared_to_communities_the_user_belongs_to = Request.active.filter(
+        shared_with__in=user_context.community_ids
+    )
+    return requests_shared_to_communities_the_user_belongs_to.exclude(owner=user_context.user).filter(is_completed=False).distinct()
+
+@reads_from_replica
+def get_subscriptions_available_for_share(
+    user: User | UserContext,
+) -> QuerySet[Subscription]:
+    user_context = get_user_context(user)
     subscriptions_shared_to_communities_the_user_belongs_to = (
-        Subscription.objects.filter(shared_with__in=communities_the_user_belongs_to)
+        Subscription.active.filter(shared_with__in=user_context.community_ids)
+    )
+    return subscriptions_shared_to_communities_the_user_belongs_to.exclude(owner=user_context.user).distinct()
+
+
+@reads_from_replica
+def get_dashboard_data(user: User | UserContext) -> dict:
+    user_context = get_user_context(user)
+    items_available_for_lease = get_items_available_for_lease(user_context)
+    subscriptions_available_for_share = get_subscriptions_available_for_share(
+        user=user_context
     )
-    return subscriptions_shared_to_communities_the_user_belongs_to.exclude(owner=user).distinct()
+
+    return {
+        "items_available_for_lease": item_cards(items_available_for_lease),
+        "subscriptions_available_for_share": subscription_cards(
+            subscriptions_available_for_share
+        ),
+    }
 
 
-def get_dashboard_data(user: User) -> dict:
-    items_available_for_lease = get_items_available_for_lease(user)
-    subscriptions_available_for_share = get_subscriptions_available_for_share(user=user)
+@reads_from_replica
+def get_activity_feed(user: User | UserContext, cursor: str | None = None) -> dict:
+    """
+    A page of the user's activity feed, see backend/feed.py. Raises ValueError
+    for an invalid cursor.
+    """
+    user_context = get_user_context(user)
+    entries, next_cursor = feed.get_feed(
+        user_context.user,
+        user_context.community_ids,
+        after=feed.decode_cursor(cursor) if cursor else None,
+    )
+    return {"feed": entries, "next_cursor": next_cursor}
 
+
+@reads_from_replica
+def get_user_subscriptions(user: User | UserContext) -> dict:
+    user_context = get_user_context(user)
     return {
-        "items_available_for_lease": items_available_for_lease,
-        "subscriptions_available_for_share": subscriptions_available_for_share,
+        "owned": subscription_cards(
+            Subscription.objects.filter(owner=user_context.user)
+        ),
+        "shared": subscription_cards(
+            Subscription.objects.filter(shared_to=user_context.user)
+        ),
+        "discover": subscription_cards(
+            get_subscriptions_available_for_share(user_context)
+        ),
     }
 
 
-def get_user_subscriptions(user: User) -> dict:
+@reads_from_replica
+def get_user_communities(user: User | UserContext) -> dict:
+    user_context = get_user_context(user)
     return {
-        "owned": Subscription.objects.filter(owner=user),
-        "shared": Subscription.objects.filter(shared_to=user),
-        "discover": get_subscriptions_available_for_share(user),
+        "owned": community_cards(Community.objects.filter(owner=user_context.user)),
+        "shared": community_cards(
+            Community.objects.filter(id__in=user_context.community_ids)
+        ),
     }
 
 
-def get_user_communities(user: User) -> dict:
+@reads_from_replica
+def get_user_items(user: User | UserContext) -> dict:
+    user_context = get_user_context(user)
     return {
-        "owned": Community.objects.filter(owner=user),
-        "shared": Community.objects.filter(members=user),
+        "owned": item_cards(Item.objects.filter(owner=user_context.user)),
+        "leased": lease_cards(Lease.objects.filter(lessee=user_context.user)),
+        "leased_out": lease_cards(Lease.objects.filter(item__owner=user_context.user)),
+        "discover": item_cards(get_items_available_for_lease(user_context)),
     }
 
 
-def get_user_items(user: User) -> dict:
+@reads_from_replica
+def get_user_requests(user: User | UserContext) -> dict:
+    user_context = get_user_context(user)
+    owned = request_cards(Request.objects.filter(owner=user_context.user))
     return {
-        "owned": Item.objects.filter(owner=user),
-        "leased": Lease.objects.filter(lessee=user),
-        "leased_out": Lease.objects.filter(item__owner=user),
-        "discover": get_items_available_for_lease(user),
+        "discover": request_cards(get_pending_requests_for_user(user_context)),
+        "owned": {
+            "completed": owned.filter(is_completed=True),
+            "pending": owned.filter(is_completed=False),
+        },
     }
 
 
+def get_visible_items(user: User | UserContext) -> QuerySet[Item]:
+    user_context = get_user_context(user)
+    return Item.objects.filter(
+        Q(owner=user_context.user) | Q(shared_with__in=user_context.community_ids)
+    ).distinct()
+
+
+def merge_intervals(intervals) -> list[tuple]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def get_free_slots(busy: list[tuple], start, end) -> list[tuple]:
+    """The gaps between merged, sorted busy intervals within start and end."""
+    free, cursor = [], start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor:
+            free.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < end:
+        free.append((cursor, end))
+    return free
+
+
+@reads_from_replica
+def get_items_availability(item_ids, start, end) -> dict[int, dict]:
+    """
+    Busy and free intervals between start and end for many items, with a
+    single range query over the (item, start_date, end_date) lease index and
+    the archived leases, which windows in the past overlap.
+    """
+    busy = {item_id: [] for item_id in item_ids}
+    leases = Lease.objects.filter(
+        item_id__in=busy, start_date__lt=end, end_date__gt=start
+    ).values_list("item_id", "start_date", "end_date")
+    archived_leases = ArchivedLease.objects.filter(
+        item_id__in=busy, start_date__lt=end, end_date__gt=start
+    ).values_list("item_id", "start_date", "end_date")
+    leases = leases.union(archived_leases, all=True)
+    for item_id, lease_start, lease_end in leases:
+        busy[item_id].append((max(lease_start, start), min(lease_end, end)))
+
+    availability = {}
+    for item_id, intervals in busy.items():
+        merged = merge_intervals(intervals)
+        availability[item_id] = {
+            "busy": merged,
+            "free": get_free_slots(merged, start, end),
+        }
+    return availability
+
+
+@reads_from_replica
+def get_lease_history(item: Item, limit: int = LEASE_HISTORY_LIMIT) -> list:
+    """Most recent leases of an item first, including archived ones."""
+    recent = Lease.objects.filter(item=item).select_related("lessee")
+    archived = ArchivedLease.objects.filter(item=item).select_related("lessee")
+    leases = [
+        *recent.order_by("-end_date")[:limit],
+        *archived.order_by("-end_date")[:limit],
+    ]
+    return sorted(leases, key=lambda lease: lease.end_date, reverse=True)[:limit]
+
+
+def _insert_through_rows(through, field: str, value: int, other_field: str, ids) -> list:
+    """
+    Inserts a ``(value, id)`` row into an m2m through table for every id with a
+    single ``INSERT ... ON CONFLICT DO NOTHING RETURNING``, and returns the ids
+    that were actually inserted. ``bulk_create(ignore_conflicts=True)`` can't
+    tell them apart from rows that already existed.
+    """
+    ids = list(ids)
+    if not ids:
+        return []
+    connection = connections[router.db_for_write(through)]
+    quote = connection.ops.quote_name
+    column = through._meta.get_field(field).column
+    other_column = through._meta.get_field(other_field).column
+    sql = (
+        f"INSERT INTO {quote(through._meta.db_table)} "
+        f"({quote(column)}, {quote(other_column)}) VALUES "
+        + ", ".join(["(%s, %s)"] * len(ids))
+        + f" ON CONFLICT DO NOTHING RETURNING {quote(other_column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [param for pk in ids for param in (value, pk)])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def add_members(community: Community, user_ids) -> None:
+    """
+    Adds users to a community with a single ``INSERT ... ON CONFLICT DO
+    NOTHING`` into the membership table, so concurrent joins never race on a
+    read-then-write check and existing members are silently skipped. The
+    member count is incremented by the number of rows inserted; a full recount
+    is left to ``manage.py reconcile_counters``.
+    """
+    added = _insert_through_rows(
+        Community.members.through, "community", community.pk, "user", user_ids
+    )
+    if not added:
+        return
+    # The raw insert skips the m2m_changed signals that would do this.
+    bump_versions(user_ids=added, community_ids=[community.pk])
+    membership_index.mark_changed(
+        membership_index.user_key(user_id) for user_id in added
+    )
+    Community.add_to_counts([community.pk], member_count=len(added))
+    Event.record("community.members_added", community_id=community.pk, user_ids=added)
+
+
 def add_user_to_community(community: Community, user: User) -> None:
-    if not community.members.filter(username=user.username).exists():
-        community.members.add(user)
-        community.save()
+    add_members(community, [user.pk])
 
 
 def use_invite(invite_uuid: str, user: User) -> (bool, Community | None):
     community: Community = Community.objects.filter(invite_uuid=invite_uuid).first()
     if not community:
         return False, None
-    community.members.add(user)
+    add_members(community, [user.pk])
     return True, community
 
 
-def get_data_for_profile_view(user: User):
+def _take_seat(subscription_id: int, user_id: int, record_claim=False) -> bool:
+    """
+    Gives the user a free seat, if there is one. The seat is counted by a
+    single conditional ``UPDATE``, so the check and the increment can't
+    interleave. Concurrent claims of the subscription wait for the row lock of
+    that statement until the enclosing transaction commits, which for a claim
+    made in a view is the end of the request. It is the last statement of the
+    claim: the seat holder row and the claim event are written before it, and
+    rolled back when there is no free seat.
+    """
+    try:
+        with transaction.atomic():
+            Subscription.shared_to.through.objects.create(
+                subscription_id=subscription_id, user_id=user_id
+            )
+            if record_claim:
+                Event.record(
+                    "subscription.seat_claimed", id=subscription_id, user_id=user_id
+                )
+            taken = (
+                Subscription.active.filter(pk=subscription_id)
+                .filter(Q(seats__isnull=True) | Q(seats_taken__lt=F("seats")))
+                .update(seats_taken=F("seats_taken") + 1)
+            )
+            if not taken:
+                transaction.set_rollback(True)
+    except IntegrityError:
+        # A concurrent claim of the same user got a seat first.
+        return True
+    return bool(taken)
+
+
+def _promote_waitlist(subscription_id: int) -> list[int]:
+    """Gives free seats to the users waiting longest, returns their ids."""
+    waiting = SeatWaitlistEntry.objects.filter(
+        subscription_id=subscription_id
+    ).order_by("id")
+    promoted = []
+    while True:
+        entry = waiting.select_for_update(skip_locked=True).first()
+        if entry is None or not _take_seat(subscription_id, entry.user_id):
+            return promoted
+        entry.delete()
+        promoted.append(entry.user_id)
+
+
+def claim_seat(subscription: Subscription, user: User) -> bool:
+    """
+    Gives the user one of the subscription's seats, or puts them on its
+    waitlist when the seats are taken or others are waiting already. Returns
+    whether they got a seat. Claiming twice is harmless.
+    """
+    holders = Subscription.shared_to.through.objects
+    if holders.filter(subscription=subscription, user=user).exists():
+        return True
+    with transaction.atomic():
+        # Bumped before the seat is counted, see _take_seat. The pages of the
+        # user and the owner change whether they get a seat or wait.
+        bump_versions(user_ids=[user.pk, subscription.owner_id])
+        waiting = SeatWaitlistEntry.objects.filter(subscription=subscription)
+        if not waiting.exists() and _take_seat(
+            subscription.pk, user.pk, record_claim=True
+        ):
+            return True
+        SeatWaitlistEntry.objects.bulk_create(
+            [SeatWaitlistEntry(subscription=subscription, user=user)],
+            ignore_conflicts=True,
+        )
+        # Seats may have been added while others were waiting.
+        promoted = _promote_waitlist(subscription.pk)
+        seated = user.pk in promoted
+        bump_versions(user_ids=promoted)
+        Event.record(
+            "subscription.seat_claimed" if seated else "subscription.waitlisted",
+            id=subscription.pk,
+            user_id=user.pk,
+        )
+    return seated
+
+
+def release_seat(subscription: Subscription, user: User) -> None:
+    """
+    Gives up the user's seat, or their place on the waitlist. A freed seat
+    goes to whoever waited longest.
+    """
+    with transaction.atomic():
+        SeatWaitlistEntry.objects.filter(subscription=subscription, user=user).delete()
+        released, _ = Subscription.shared_to.through.objects.filter(
+            subscription=subscription, user=user
+        ).delete()
+        if not released:
+            return
+        Subscription.objects.filter(pk=subscription.pk, seats_taken__gt=0).update(
+            seats_taken=F("seats_taken") - 1
+        )
+        promoted = _promote_waitlist(subscription.pk)
+        bump_versions(user_ids=[user.pk, subscription.owner_id, *promoted])
+        Event.record(
+            "subscription.seat_released",
+            id=subscription.pk,
+            user_id=user.pk,
+            promoted_user_ids=promoted,
+        )
+
+
+def promote_waitlist(subscription: Subscription) -> list[int]:
+    """Fills seats freed by raising ``seats`` from the waitlist."""
+    with transaction.atomic():
+        promoted = _promote_waitlist(subscription.pk)
+        if promoted:
+            bump_versions(user_ids=[subscription.owner_id, *promoted])
+    return promoted
+
+
+def _share_with_community(model, object_ids, community_id: int) -> int:
+    """Shares the objects in batches, returns how many weren't shared before."""
+    through = model.shared_with.through
+    shared = 0
+    for batch in batched(object_ids, BULK_BATCH_SIZE):
+        shared += len(
+            _insert_through_rows(
+                through, "community", community_id, model._meta.model_name, batch
+            )
+        )
+    return shared
+
+
+def bulk_share_with_community(
+    user: User, model, community: Community, item_type: str | None = None
+) -> int:
+    """
+    Shares all of the user's active items, optionally only those of one type,
+    or all of their active subscriptions with a community. Rows already shared
+    are skipped by the database and not counted, and the affected pages are
+    invalidated once for the whole batch instead of once per object.
+    """
+    objects = model.active.filter(owner=user)
+    if item_type:
+        objects = objects.filter(item_type=item_type)
+    object_ids = objects.values_list("id", flat=True).iterator(
+        chunk_size=BULK_BATCH_SIZE
+    )
+    with transaction.atomic():
+        shared = _share_with_community(model, object_ids, community.pk)
+        if shared:
+            bump_versions(user_ids=[user.pk], community_ids=[community.pk])
+            membership_index.mark_changed(
+                [membership_index.owner_key(model._meta.model_name, user.pk)]
+            )
+            Community.add_to_counts(
+                [community.pk], **{f"shared_{model._meta.model_name}_count": shared}
+            )
+            Event.record(
+                f"{model._meta.model_name}.bulk_shared",
+                owner_id=user.pk,
+                community_id=community.pk,
+                count=shared,
+            )
+            publish_shared(
+                model._meta.model_name, [community.pk], owner_id=user.pk, count=shared
+            )
+    return shared
+
+
+def bulk_update_owned_objects(queryset: QuerySet, **changes) -> int:
+    """
+    Applies ``changes`` to every item, subscription, request or community of
+    the queryset with one ``UPDATE`` per batch of primary keys, for admin
+    actions on large tables. The model signals don't run for ``update()``,
+    so every batch does their work itself: pages are invalidated, counters
+    recounted and a single outbox event is recorded.
+    """
+    model = queryset.model
+    name = model._meta.model_name
+    updated, last_pk = 0, 0
+    while True:
+        # Keyset batches, the changes may remove rows from the queryset.
+        batch = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:BULK_BATCH_SIZE]
+        )
+        if not batch:
+            return updated
+        last_pk = batch[-1]
+        with transaction.atomic():
+            rows = model.objects.filter(pk__in=batch)
+            user_ids = set(rows.values_list("owner_id", flat=True))
+            rows.update(**changes, updated_at=timezone.now())
+            user_ids.add(changes.get("owner_id"))
+
+            if model is Community:
+                community_ids = batch
+                membership_index.mark_changed([membership_index.COMMUNITIES_KEY])
+            else:
+                community_ids = set(
+                    model.shared_with.through.objects.filter(
+                        **{f"{name}_id__in": batch}
+                    ).values_list("community_id", flat=True)
+                )
+            if model in (Item, Subscription):
+                Community.refresh_counts(community_ids)
+                if "owner_id" in changes:
+                    UserStats.refresh_counts(user_ids - {None})
+            bump_versions(user_ids=user_ids, community_ids=community_ids)
+            Event.record(f"{name}.bulk_updated", ids=batch, changes=changes)
+        updated += len(batch)
+
+
+def read_item_import(file, file_name: str):
+    """
+    Yields ``(line_number, row)`` for an uploaded CSV or JSON Lines file one
+    line at a time, so large files are never loaded into memory. Raises
+    ``ValueError`` once it reaches a line that isn't UTF-8 text or valid CSV.
+    """
+    lines = codecs.iterdecode(file, "utf-8-sig")
+    if file_name.endswith((".jsonl", ".ndjson")):
+        line_number = 0
+        try:
+            for line_number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, None
+        except UnicodeDecodeError:
+            raise ValueError(f"Line {line_number + 1}: not UTF-8 text") from None
+    else:
+        reader = csv.DictReader(lines)
+        try:
+            # The header is line 1.
+            yield from enumerate(reader, start=2)
+        except UnicodeDecodeError:
+            raise ValueError(f"Line {reader.line_num + 1}: not UTF-8 text") from None
+        except csv.Error as error:
+            raise ValueError(f"Line {reader.line_num}: {error}") from None
+
+
+def _build_imported_item(user: User, row) -> Item:
+    if not isinstance(row, dict):
+        raise ValueError("not a valid row")
+    name = str(row.get("name") or "").strip()
+    item_type = str(row.get("item_type") or Item.OTHER).strip().lower()
+    if not name:
+        raise ValueError("name is required")
+    if len(name) > Item._meta.get_field("name").max_length:
+        raise ValueError("name is too long")
+    if item_type not in dict(Item.ITEM_TYPE_CHOICES):
+        raise ValueError(f"unknown item type {item_type!r}")
+    return Item(owner=user, name=name, item_type=item_type)
+
+
+def import_items(user: User, rows, community_ids=()) -> (int, list[str]):
+    """
+    Creates items from ``(line_number, row)`` pairs, see ``read_item_import``,
+    and shares them with the given communities. Rows are inserted in batches
+    with ``bulk_create``, so no per-item signals are sent. Invalid rows are
+    skipped and reported, a ``ValueError`` of the rows rolls back the import.
+    """
+    created, errors = 0, []
+    with transaction.atomic():
+        for batch in batched(rows, BULK_BATCH_SIZE):
+            items = []
+            for line_number, row in batch:
+                try:
+                    items.append(_build_imported_item(user, row))
+                except ValueError as error:
+                    if len(errors) < MAX_IMPORT_ERRORS:
+                        errors.append(f"Line {line_number}: {error}")
+            items = Item.objects.bulk_create(items)
+            for community_id in community_ids:
+                _share_with_community(Item, [item.pk for item in items], community_id)
+            created += len(items)
+        bump_versions(user_ids=[user.pk], community_ids=community_ids)
+        membership_index.mark_changed([membership_index.owner_key("item", user.pk)])
+        if created:
+            UserStats.refresh_counts([user.pk])
+            Community.refresh_counts(community_ids)
+            Event.record(
+                "item.imported",
+                owner_id=user.pk,
+                community_ids=list(community_ids),
+                count=created,
+            )
+            publish_shared("item", community_ids, owner_id=user.pk, count=created)
+    return created, errors
+
+
+@reads_from_replica
+def get_data_for_profile_view(user: User | UserContext):
+    user_context = get_user_context(user)
+    user = user_context.user
     user_name = user.username
     user_profile_picture = SocialAccount.objects.get(user=user).get_avatar_url()
     user_email = user.email
-    communities_the_user_is_part_of = Community.objects.filter(members=user)
-    items_of_user = Item.objects.filter(owner=user)
-    subscriptions_of_user = Subscription.objects.filter(owner=user)
+    communities_the_user_is_part_of = Community.objects.filter(
+        id__in=user_context.community_ids
+    )
+    # No row yet means the user never owned anything.
+    stats = UserStats.objects.filter(user=user).first() or UserStats(user=user)
     return dict(
         user_name=user_name,
         user_profile_picture=user_profile_picture,
         user_email=user_email,
         communities_the_user_is_part_of=communities_the_user_is_part_of,
-        items_of_user_count=items_of_user.count(),
-        subscriptions_of_user_count=subscriptions_of_user.count(),
+        items_of_user_count=stats.item_count,
+        subscriptions_of_user_count=stats.subscription_count,
     )
 
 
@@ -119,19 +735,33 @@ def __get_invite_link(request, invite_uuid: str) -> str:
     return request.build_absolute_uri(reverse("accept_invite", args=[str(invite_uuid)]))
 
 
+def _get_avatar_url(request, user: User, providers: dict) -> str | None:
+    # Iterates the prefetched accounts, .first() and .exists() would query.
+    # Providers are looked up once per page, every lookup queries the apps.
+    for account in user.socialaccount_set.all():
+        if account.provider not in providers:
+            providers[account.provider] = get_social_adapter().get_provider(
+                request, provider=account.provider
+            )
+        return providers[account.provider].wrap_account(account).get_avatar_url()
+    return None
+
+
+@reads_from_replica
 def get_data_for_community_detail(community_id: int, request) -> dict | None:
     try:
-        community = Community.objects.get(id=community_id)
+        community = Community.objects.select_related("owner").get(id=community_id)
     except Community.DoesNotExist:
         return None
 
-    members = community.members.all()
+    members = community.members.prefetch_related("socialaccount_set")
 
-    shared_items = community.shared_items.all()
-    shared_items_count = shared_items.count()
-    shared_subscriptions = community.shared_subscriptions.all()
-    shared_subscriptions_count = shared_subscriptions.count()
+    shared_items = item_cards(Item.active.filter(shared_with=community))
+    shared_subscriptions = subscription_cards(
+        Subscription.active.filter(shared_with=community)
+    )
     invite_link = __get_invite_link(request, community.invite_uuid)
+    providers = {}
 
     return {
         "pk": community.pk,
@@ -139,20 +769,16 @@ def get_data_for_community_detail(community_id: int, request) -> dict | None:
         "community_name": community.name,
         "invite_link": invite_link,
         "created_by": community.owner.username,
-        "member_count": members.count(),
+        "member_count": community.member_count,
         "shared_items": shared_items,
-        "shared_items_count": shared_items_count,
+        "shared_items_count": community.shared_item_count,
         "shared_subscriptions": shared_subscriptions,
-        "shared_subscriptions_count": shared_subscriptions_count,
+        "shared_subscriptions_count": community.shared_subscription_count,
         "members": [
             {
                 "username": member.username,
                 "email": member.email,
-                "profile_picture": (
-                    member.socialaccount_set.first().get_avatar_url()
-                    if member.socialaccount_set.exists()
-                    else None
-                ),
+                "profile_picture": _get_avatar_url(request, member, providers),
             }
             for member in members
         ],
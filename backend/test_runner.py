@@ -0,0 +1,25 @@
+"""
+Test runner that lets SQLite test databases take concurrent writers.
+
+The concurrency tests write from several threads at the same time. On SQLite
+they wait for each other's transaction with a busy timeout instead of failing
+with "database is locked", and transactions take the write lock when they
+begin, so two readers never deadlock upgrading to writers. Only the test
+databases are configured this way, development databases keep SQLite's
+defaults.
+"""
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+SQLITE_TEST_OPTIONS = {"timeout": 20, "transaction_mode": "IMMEDIATE"}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        for connection in connections.all(initialized_only=False):
+            if connection.vendor == "sqlite":
+                # Every thread's connection shares this settings dict.
+                connection.close()
+                connection.settings_dict["OPTIONS"].update(SQLITE_TEST_OPTIONS)
+        return super().setup_databases(**kwargs)
@@ -1,15 +1,85 @@
-from datetime import timedelta
+import asyncio
+import io
+import json
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from unittest import skipUnless
+from unittest.mock import patch
 
+from allauth.socialaccount.models import SocialAccount
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from backend.models import Community, Item, Subscription, Lease, Request
+from backend import feed, reminders
+from backend.checks import check_shared_cache, ensure_shared_cache
+from backend.models import (
+    ArchivedLease,
+    Community,
+    ConsumerCheckpoint,
+    Event,
+    FeedEntry,
+    Item,
+    Job,
+    Subscription,
+    Lease,
+    LeaseReminder,
+    Request,
+    SeatWaitlistEntry,
+    UserStats,
+)
+from backend.jobs import (
+    JOBS,
+    JobHandler,
+    enqueue,
+    requeue_stale_jobs,
+    run_next_job,
+    schedule_periodic_jobs,
+)
+from backend.lazyload import LazyLoadError
+from backend.membership_index import get_index
+from backend.outbox import CONSUMERS, consume_batch
+from backend.pubsub import get_broker
+from backend.routers import (
+    REPLICA_DB_ALIAS,
+    pinning_scope,
+    use_replica,
+)
 from backend.services import (
+    UserContext,
+    add_members,
+    bulk_share_with_community,
+    claim_seat,
+    get_activity_feed,
+    get_dashboard_data,
+    get_data_for_community_detail,
+    get_free_slots,
     get_items_available_for_lease,
+    get_items_available_between,
+    get_items_availability,
+    get_pending_requests_for_user,
     get_subscriptions_available_for_share,
+    get_user_items,
+    get_user_requests,
+    import_items,
+    item_cards,
+    merge_intervals,
+    read_item_import,
+    release_seat,
+    shares_community,
 )
 
 
@@ -273,3 +343,1759 @@ class RequestCompletionTest(TestCase):
         Request.objects.all().delete()
         Community.objects.all().delete()
         User.objects.all().delete()
+
+
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        # The stand-in replica shares the default connection, so it sees the
+        # data created inside the test transaction.
+        connections[REPLICA_DB_ALIAS] = connections[DEFAULT_DB_ALIAS]
+        self.addCleanup(connections.__delitem__, REPLICA_DB_ALIAS)
+        for target in ("backend.routers", "backend.middleware"):
+            patcher = patch(f"{target}.replica_configured", return_value=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1)
+        self.item = Item.objects.create(name="Test Item", owner=self.user1)
+
+    def test_service_reads_use_replica(self):
+        owned = get_user_items(self.user1)["owned"]
+        self.assertEqual(owned.db, REPLICA_DB_ALIAS)
+        self.assertIn(self.item, owned)
+        self.assertEqual(Item.objects.all().db, DEFAULT_DB_ALIAS)
+
+    def test_campaign_reads_use_replica(self):
+        with use_replica():
+            self.assertEqual(User.objects.all().db, REPLICA_DB_ALIAS)
+
+    def test_pinned_request_reads_from_primary(self):
+        with pinning_scope(pinned=True):
+            self.assertEqual(get_user_items(self.user1)["owned"].db, DEFAULT_DB_ALIAS)
+
+    def test_write_pins_rest_of_request(self):
+        with pinning_scope(pinned=False):
+            self.assertEqual(get_user_items(self.user1)["owned"].db, REPLICA_DB_ALIAS)
+            Item.objects.create(name="Another Item", owner=self.user1)
+            self.assertEqual(get_user_items(self.user1)["owned"].db, DEFAULT_DB_ALIAS)
+
+    def test_write_sets_pin_cookie(self):
+        self.client.login(username="user1", password="password1")
+        response = self.client.get(reverse("item_list"))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        response = self.client.post(
+            reverse("item_add"), {"name": "New Item", "item_type": Item.OTHER}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertContains(self.client.get(reverse("item_list")), "New Item")
+
+
+class CachedSessionAndUserTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.client.login(username="user1", password="password1")
+
+    def test_authenticated_trivial_page_costs_no_queries(self):
+        # The first request fills the user cache.
+        self.client.get(reverse("about"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("about"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.user1)
+
+    def test_cached_user_is_invalidated_on_save(self):
+        self.client.get(reverse("about"))
+        self.user1.first_name = "Renamed"
+        self.user1.save()
+        response = self.client.get(reverse("about"))
+        self.assertEqual(response.wsgi_request.user.first_name, "Renamed")
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    def test_production_needs_a_shared_cache(self):
+        self.assertEqual(check_shared_cache(), [])
+        with patch.dict("os.environ", {"DJANGO_ENV": "production"}):
+            self.assertEqual([error.id for error in check_shared_cache()], ["backend.E001"])
+            with self.assertRaises(ImproperlyConfigured):
+                ensure_shared_cache()
+            redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+            with override_settings(CACHES=redis):
+                self.assertEqual(check_shared_cache(), [])
+                ensure_shared_cache()
+
+
+class UserContextTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        self.item = Item.objects.create(name="Test Item", owner=self.user2)
+        self.item.shared_with.add(self.community)
+
+    def test_community_ids_are_computed_once(self):
+        user_context = UserContext(self.user1)
+        with self.assertNumQueries(1):
+            self.assertEqual(user_context.community_ids, [self.community.pk])
+            get_dashboard_data(user_context)
+            get_user_items(user_context)
+            get_pending_requests_for_user(user_context)
+        self.assertIn(self.item, get_user_items(user_context)["discover"])
+
+    def test_membership_is_looked_up_once_per_request(self):
+        self.client.login(username="user1", password="password1")
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.get(reverse("item_add"))
+        self.assertContains(response, "Test Community")
+        membership_queries = [
+            query
+            for query in queries.captured_queries
+            if '"backend_community_members"' in query["sql"]
+        ]
+        self.assertEqual(len(membership_queries), 1)
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class ListingFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        for index in range(5):
+            item = Item.objects.create(name=f"Item {index}", owner=self.user2)
+            item.shared_with.add(self.community)
+        self.client.login(username="user1", password="password1")
+
+    def test_card_queries_do_not_grow_with_items(self):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as five_items:
+            self.client.get(reverse("item_list"))
+        for index in range(5, 10):
+            Item.objects.create(name=f"Item {index}", owner=self.user2).shared_with.add(self.community)
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as ten_items:
+            response = self.client.get(reverse("item_list"))
+        self.assertContains(response, "Shared by User2", count=10)
+        # The second request finds the user in the cache.
+        self.assertLessEqual(len(ten_items), len(five_items))
+
+    def test_updated_item_is_rendered_again(self):
+        self.client.get(reverse("item_list"))
+        item = Item.objects.get(name="Item 0")
+        item.name = "Renamed Item"
+        item.save()
+        response = self.client.get(reverse("item_list"))
+        self.assertContains(response, "Renamed Item")
+        self.assertNotContains(response, "Item 0")
+
+    def test_owner_controls_are_not_shared_with_other_users(self):
+        self.client.login(username="user2", password="password2")
+        self.assertContains(self.client.get(reverse("item_list")), "fa-edit")
+        self.client.login(username="user1", password="password1")
+        self.assertNotContains(self.client.get(reverse("item_list")), "fa-edit")
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        self.client.login(username="user1", password="password1")
+
+    def get_etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_unchanged_page_returns_not_modified(self):
+        for url in ("/", reverse("item_list"), reverse("subscription_list"), reverse("request_list")):
+            etag = self.get_etag(url)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_item_shared_into_community_changes_etag(self):
+        etag = self.get_etag(reverse("item_list"))
+        item = Item.objects.create(name="Shared Item", owner=self.user2)
+        self.assertEqual(
+            self.client.get(reverse("item_list"), HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        item.shared_with.add(self.community)
+        response = self.client.get(reverse("item_list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Shared Item")
+
+    def test_membership_change_changes_etag(self):
+        etag = self.get_etag(reverse("request_list"))
+        self.community.members.remove(self.user1)
+        response = self.client.get(reverse("request_list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class JsonApiTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        for i in range(5):
+            item = Item.objects.create(name=f"Item {i}", owner=self.user2)
+            item.shared_with.add(self.community)
+        self.request = Request.objects.create(name="Need a ladder", owner=self.user2)
+        self.request.shared_with.add(self.community)
+        self.client.login(username="user1", password="password1")
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        response = self.client.get(reverse("api_items", args=["discover"]))
+        self.assertEqual(response.status_code, 401)
+
+    def test_cursor_pagination_walks_all_items(self):
+        url = reverse("api_items", args=["discover"])
+        names, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get(url, params).json()
+            names += [item["name"] for item in page["results"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(names, [f"Item {i}" for i in range(5)])
+
+    def test_sparse_fields(self):
+        response = self.client.get(
+            reverse("api_items", args=["discover"]), {"fields": "name,owner"}
+        )
+        self.assertEqual(response.json()["results"][0], {"name": "Item 0", "owner": "user2"})
+        response = self.client.get(
+            reverse("api_items", args=["discover"]), {"fields": "name,secret"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_scope(self):
+        response = self.client.get(reverse("api_items", args=["everything"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch(self):
+        data = self.client.get(reverse("api_batch")).json()
+        self.assertEqual(len(data["dashboard"]["items"]["results"]), 5)
+        self.assertEqual(data["requests"]["results"][0]["name"], "Need a ladder")
+        self.assertEqual(
+            data["communities"],
+            [{"id": self.community.pk, "name": "Test Community", "member_count": 2}],
+        )
+
+    def test_gzip(self):
+        response = self.client.get(reverse("api_batch"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Request.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class BulkShareAndImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        self.client.login(username="user1", password="password1")
+
+    def test_bulk_share_items_of_one_type(self):
+        books = [Item.objects.create(name=f"Book {i}", owner=self.user1, item_type=Item.BOOK) for i in range(3)]
+        other = Item.objects.create(name="Lamp", owner=self.user1)
+        books[0].shared_with.add(self.community)
+
+        response = self.client.post(
+            reverse("bulk_share"),
+            {"kind": "items", "item_type": Item.BOOK, "community": self.community.pk},
+        )
+        self.assertRedirects(response, reverse("item_list"))
+        self.assertEqual(set(self.community.shared_items.all()), set(books))
+        self.assertNotIn(other, self.community.shared_items.all())
+
+    def test_bulk_share_subscriptions(self):
+        subscription = Subscription.objects.create(name="Music", owner=self.user1)
+        self.client.post(
+            reverse("bulk_share"), {"kind": "subscriptions", "community": self.community.pk}
+        )
+        self.assertIn(subscription, self.community.shared_subscriptions.all())
+
+    def test_bulk_share_with_foreign_community_is_rejected(self):
+        foreign = Community.objects.create(name="Other", owner=self.user2)
+        Item.objects.create(name="Lamp", owner=self.user1)
+        response = self.client.post(
+            reverse("bulk_share"), {"kind": "items", "community": foreign.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(foreign.shared_items.exists())
+
+    def test_bulk_share_counts_only_newly_shared_active_items(self):
+        shared = Item.objects.create(name="Lamp", owner=self.user1)
+        shared.shared_with.add(self.community)
+        unshared = Item.objects.create(name="Drill", owner=self.user1)
+        inactive = Item.objects.create(name="Saw", owner=self.user1, is_active=False)
+        self.assertEqual(bulk_share_with_community(self.user1, Item, self.community), 1)
+        self.assertEqual(set(self.community.shared_items.all()), {shared, unshared})
+        self.assertNotIn(inactive, self.community.shared_items.all())
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.shared_item_count, 2)
+        self.assertEqual(Event.objects.filter(event_type="item.bulk_shared").get().payload["count"], 1)
+
+        # Nothing left to share.
+        with self.assertNumQueries(4):
+            self.assertEqual(bulk_share_with_community(self.user1, Item, self.community), 0)
+        self.assertEqual(Event.objects.filter(event_type="item.bulk_shared").count(), 1)
+
+    def test_bulk_share_invalidates_community_pages(self):
+        Item.objects.create(name="Lamp", owner=self.user1)
+        self.client.login(username="user2", password="password2")
+        etag = self.client.get(reverse("item_list"))["ETag"]
+        bulk_share_with_community(self.user1, Item, self.community)
+        response = self.client.get(reverse("item_list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Lamp")
+
+    def test_import_csv(self):
+        upload = SimpleUploadedFile(
+            "items.csv",
+            b"name,item_type\nDune,book\nDrill,\n,book\nKettle,kitchen\n",
+        )
+        response = self.client.post(
+            reverse("item_import"), {"file": upload, "shared_with": [self.community.pk]}
+        )
+        self.assertContains(response, "Imported 2 items")
+        self.assertContains(response, "Line 4: name is required")
+        self.assertContains(response, "Line 5: unknown item type")
+        self.assertEqual(
+            set(self.community.shared_items.values_list("name", "item_type")),
+            {("Dune", Item.BOOK), ("Drill", Item.OTHER)},
+        )
+
+    def test_import_of_a_file_that_is_not_utf8(self):
+        for name, content, error in (
+            ("items.csv", b"name,item_type\nDune,book\n\xff\xfe,tool\n", "Line 3: not UTF-8 text"),
+            ("items.jsonl", b'{"name": "Dune"}\n\xff\xfe\n', "Line 2: not UTF-8 text"),
+        ):
+            upload = SimpleUploadedFile(name, content)
+            response = self.client.post(reverse("item_import"), {"file": upload})
+            self.assertEqual(response.status_code, 200)
+            self.assertFormError(response.context["form"], "file", error)
+            self.assertFalse(Item.objects.filter(name="Dune").exists())
+
+    def test_import_jsonl_in_batches(self):
+        lines = [json.dumps({"name": f"Item {i}"}) for i in range(25)] + ["{broken"]
+        with patch("backend.services.BULK_BATCH_SIZE", 10):
+            created, errors = import_items(
+                self.user1,
+                read_item_import(io.BytesIO("\n".join(lines).encode()), "items.jsonl"),
+            )
+        self.assertEqual(created, 25)
+        self.assertEqual(errors, ["Line 26: not a valid row"])
+        self.assertEqual(Item.objects.filter(owner=self.user1).count(), 25)
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Subscription.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        self.item = Item.objects.create(name="Drill", owner=self.user1)
+        self.item.shared_with.add(self.community)
+        Item.objects.create(name="Private", owner=self.user2)
+        Lease.objects.create(
+            item=self.item,
+            lessee=self.user2,
+            start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=1),
+        )
+        self.client.login(username="user1", password="password1")
+
+    def get_export(self, kind, **params):
+        response = self.client.get(reverse("export", args=[kind]), params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export_of_own_items(self):
+        lines = self.get_export("items").splitlines()
+        self.assertEqual(lines[0], "id,name,item_type,is_active,owner,created_at")
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Drill", lines[1])
+
+    def test_jsonl_export_of_lease_history(self):
+        response = self.client.get(reverse("export", args=["leases"]), {"format": "jsonl"})
+        # Item, owner and lessee are fetched with the leases themselves, live
+        # and archived.
+        with self.assertNumQueries(2):
+            content = b"".join(response.streaming_content).decode()
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows[0]["item"], "Drill")
+        self.assertEqual(rows[0]["lessee"], "user2")
+
+    def test_lease_export_includes_archived_leases(self):
+        old = Lease.objects.create(
+            item=self.item,
+            lessee=self.user2,
+            start_date=timezone.now() - timedelta(days=400),
+            end_date=timezone.now() - timedelta(days=399),
+        )
+        call_command("archive_leases", stdout=io.StringIO())
+        self.assertFalse(Lease.objects.filter(pk=old.pk).exists())
+
+        rows = [json.loads(line) for line in self.get_export("leases", format="jsonl").splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]["id"], old.pk)
+        self.assertEqual((rows[1]["item"], rows[1]["lessee"]), ("Drill", "user2"))
+        content = self.get_export("leases", community=self.community.pk)
+        self.assertEqual(len(content.splitlines()), 3)
+
+        user3 = User.objects.create_user(username="user3", password="password3")
+        self.community.members.add(user3)
+        self.client.login(username="user3", password="password3")
+        content = self.get_export("leases", community=self.community.pk)
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_community_export(self):
+        hidden = Item.objects.create(name="Hidden", owner=self.user1, is_active=False)
+        hidden.shared_with.add(self.community)
+        for name, is_completed in (("Open", False), ("Done", True)):
+            request = Request.objects.create(
+                name=name, owner=self.user1, is_completed=is_completed
+            )
+            request.shared_with.add(self.community)
+        self.client.login(username="user2", password="password2")
+
+        content = self.get_export("items", community=self.community.pk)
+        self.assertIn("Drill", content)
+        self.assertNotIn("Private", content)
+        self.assertNotIn("Hidden", content)
+        content = self.get_export("requests", community=self.community.pk)
+        self.assertIn("Open", content)
+        self.assertNotIn("Done", content)
+
+    def test_community_lease_export_is_limited_to_own_leases(self):
+        self.assertIn("Drill", self.get_export("leases", community=self.community.pk))
+        user3 = User.objects.create_user(username="user3", password="password3")
+        self.community.members.add(user3)
+        self.client.login(username="user3", password="password3")
+        content = self.get_export("leases", community=self.community.pk)
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_community_export_requires_membership(self):
+        other = Community.objects.create(name="Other", owner=self.user2)
+        response = self.client.get(reverse("export", args=["items"]), {"community": other.pk})
+        self.assertEqual(response.status_code, 400)
+        # A digit that isn't a decimal number.
+        response = self.client.get(reverse("export", args=["items"]), {"community": "²"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command(self):
+        out = io.StringIO()
+        call_command(
+            "export_data", "leases", community=self.community.pk, user="user2", stdout=out
+        )
+        self.assertIn("Drill", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("export_data", "leases", community=self.community.pk)
+
+    def tearDown(self):
+        Lease.objects.all().delete()
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class AvailabilityTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        self.item = Item.objects.create(name="Tent", owner=self.user2)
+        self.item.shared_with.add(self.community)
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        for start_day, end_day in ((1, 2), (2, 4), (6, 7)):
+            Lease.objects.create(
+                item=self.item,
+                lessee=self.user1,
+                start_date=self.start + timedelta(days=start_day),
+                end_date=self.start + timedelta(days=end_day),
+            )
+        self.client.login(username="user1", password="password1")
+
+    def days(self, intervals):
+        return [
+            [(datetime.fromisoformat(moment) - self.start).days for moment in interval]
+            for interval in intervals
+        ]
+
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([(5, 6), (1, 3), (2, 4), (4, 5)]), [(1, 6)])
+        self.assertEqual(get_free_slots([(1, 2), (3, 4)], 0, 5), [(0, 1), (2, 3), (4, 5)])
+
+    def test_item_availability(self):
+        response = self.client.get(
+            reverse("api_item_availability", args=[self.item.pk]),
+            {"start": self.start.isoformat(), "end": (self.start + timedelta(days=10)).isoformat()},
+        )
+        slots = response.json()["items"][str(self.item.pk)]
+        self.assertEqual(self.days(slots["busy"]), [[1, 4], [6, 7]])
+        self.assertEqual(self.days(slots["free"]), [[0, 1], [4, 6], [7, 10]])
+
+    def test_community_calendar(self):
+        other = Item.objects.create(name="Stove", owner=self.user2)
+        other.shared_with.add(self.community)
+        response = self.client.get(
+            reverse("api_availability"), {"community": self.community.pk}
+        )
+        items = response.json()["items"]
+        self.assertEqual(set(items), {str(self.item.pk), str(other.pk)})
+        self.assertEqual(len(items[str(other.pk)]["free"]), 1)
+
+    def test_invisible_item_is_not_found(self):
+        private = Item.objects.create(name="Private", owner=self.user2)
+        response = self.client.get(reverse("api_item_availability", args=[private.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse("api_availability"), {"items": str(private.pk)})
+        self.assertEqual(response.json()["items"], {})
+
+    def test_invalid_community_is_a_bad_request(self):
+        # "²" is a digit, but not a number int() parses.
+        for community in ("x", "²"):
+            response = self.client.get(reverse("api_availability"), {"community": community})
+            self.assertEqual(response.status_code, 400, community)
+
+    def tearDown(self):
+        Lease.objects.all().delete()
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class AvailableBetweenSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.other_community = Community.objects.create(name="Other Community", owner=self.user2)
+        self.community.members.add(self.user1, self.user2)
+        self.other_community.members.add(self.user1, self.user2)
+        self.start = timezone.now() + timedelta(days=10)
+        self.end = self.start + timedelta(days=2)
+
+        self.free = Item.objects.create(name="Free Tent", owner=self.user2)
+        self.free.shared_with.add(self.community, self.other_community)
+        self.busy = Item.objects.create(name="Busy Tent", owner=self.user2)
+        self.busy.shared_with.add(self.community)
+        Lease.objects.create(
+            item=self.busy,
+            lessee=self.user1,
+            start_date=self.start + timedelta(days=1),
+            end_date=self.end + timedelta(days=1),
+        )
+        # Leased out later, but free in the window.
+        self.later = Item.objects.create(name="Later Tent", owner=self.user2)
+        self.later.shared_with.add(self.community)
+        Lease.objects.create(
+            item=self.later,
+            lessee=self.user1,
+            start_date=self.end,
+            end_date=self.end + timedelta(days=1),
+        )
+        self.client.login(username="user1", password="password1")
+
+    def test_only_items_free_for_the_whole_window(self):
+        items = get_items_available_between(self.user1, self.start, self.end)
+        self.assertEqual(list(items), [self.free, self.later])
+
+    def test_search_page(self):
+        response = self.client.get(
+            reverse("item_available"),
+            {"start": self.start.strftime("%Y-%m-%dT%H:%M"), "end": self.end.strftime("%Y-%m-%dT%H:%M")},
+        )
+        self.assertContains(response, "Free Tent")
+        self.assertContains(response, "Later Tent")
+        self.assertNotContains(response, "Busy Tent")
+
+    def test_api_pages_through_results(self):
+        params = {"start": self.start.isoformat(), "end": self.end.isoformat(), "limit": 1}
+        first = self.client.get(reverse("api_items", args=["available"]), params).json()
+        self.assertEqual([item["name"] for item in first["results"]], ["Free Tent"])
+        second = self.client.get(
+            reverse("api_items", args=["available"]), {**params, "cursor": first["next_cursor"]}
+        ).json()
+        self.assertEqual([item["name"] for item in second["results"]], ["Later Tent"])
+        self.assertIsNone(second["next_cursor"])
+
+    def tearDown(self):
+        Lease.objects.all().delete()
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class LeaseArchiveTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.item = Item.objects.create(name="Drill", owner=self.user1)
+        now = timezone.now()
+        self.old_leases = [
+            Lease.objects.create(
+                item=self.item,
+                lessee=self.user2,
+                start_date=now - timedelta(days=400 + i * 2),
+                end_date=now - timedelta(days=399 + i * 2),
+            )
+            for i in range(5)
+        ]
+        self.recent_lease = Lease.objects.create(
+            item=self.item,
+            lessee=self.user2,
+            start_date=now - timedelta(days=3),
+            end_date=now - timedelta(days=2),
+        )
+
+    def test_old_leases_are_moved_in_batches(self):
+        out = io.StringIO()
+        call_command("archive_leases", days=180, batch_size=2, stdout=out)
+        self.assertEqual(list(Lease.objects.all()), [self.recent_lease])
+        self.assertEqual(
+            set(ArchivedLease.objects.values_list("lease_id", flat=True)),
+            {lease.pk for lease in self.old_leases},
+        )
+        self.assertIn("Archived 5 leases", out.getvalue())
+
+    def test_archiving_records_one_event_per_batch(self):
+        self.old_leases[0].reminders.create(
+            user=self.user2, end_date=self.old_leases[0].end_date
+        )
+        Event.objects.all().delete()
+        call_command("archive_leases", days=180, batch_size=3, stdout=io.StringIO())
+        events = list(Event.objects.order_by("id"))
+        self.assertEqual([event.event_type for event in events], ["lease.archived"] * 2)
+        self.assertEqual(
+            sorted(events[0].payload["ids"] + events[1].payload["ids"]),
+            sorted(lease.pk for lease in self.old_leases),
+        )
+        self.assertFalse(LeaseReminder.objects.exists())
+
+    def test_rerun_after_partial_run(self):
+        # A run that archived but died before deleting the batch.
+        lease = self.old_leases[0]
+        ArchivedLease.objects.create(
+            lease_id=lease.pk,
+            item=lease.item,
+            lessee=lease.lessee,
+            start_date=lease.start_date,
+            end_date=lease.end_date,
+        )
+        call_command("archive_leases", stdout=io.StringIO())
+        self.assertEqual(ArchivedLease.objects.count(), 5)
+        self.assertEqual(Lease.objects.count(), 1)
+
+    def test_archived_leases_still_block_their_period(self):
+        call_command("archive_leases", stdout=io.StringIO())
+        archived = self.old_leases[0]
+        lease = Lease(
+            item=self.item,
+            lessee=self.user1,
+            start_date=archived.start_date - timedelta(hours=1),
+            end_date=archived.start_date + timedelta(hours=1),
+        )
+        with self.assertRaisesMessage(ValidationError, "already leased"):
+            lease.clean()
+
+        start, end = archived.start_date - timedelta(hours=1), archived.end_date
+        availability = get_items_availability([self.item.pk], start, end)[self.item.pk]
+        self.assertEqual(availability["busy"], [(archived.start_date, archived.end_date)])
+        self.assertEqual(availability["free"], [(start, archived.start_date)])
+
+        community = Community.objects.create(name="Test Community", owner=self.user1)
+        community.members.add(self.user1, self.user2)
+        self.item.shared_with.add(community)
+        self.assertFalse(get_items_available_between(self.user2, start, end).exists())
+
+    def test_history_on_item_detail_includes_archived_leases(self):
+        call_command("archive_leases", stdout=io.StringIO())
+        self.client.login(username="user1", password="password1")
+        response = self.client.get(reverse("item_detail", args=[self.item.pk]))
+        self.assertEqual(len(response.context["lease_history"]), 6)
+        self.assertEqual(response.context["lease_history"][0].pk, self.recent_lease.pk)
+
+
+class LeaseReminderTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="owner", email="owner@example.com"
+        )
+        self.lessee = User.objects.create_user(
+            username="lessee", email="lessee@example.com"
+        )
+        self.now = timezone.now()
+
+    def lease(self, name, ends_in):
+        item = Item.objects.create(name=name, owner=self.owner)
+        return Lease.objects.create(
+            item=item,
+            lessee=self.lessee,
+            start_date=self.now - timedelta(days=1),
+            end_date=self.now + ends_in,
+        )
+
+    def test_one_email_per_recipient_for_leases_due_soon(self):
+        self.lease("Drill", timedelta(hours=2))
+        self.lease("Tent", timedelta(hours=20))
+        self.lease("Kayak", timedelta(days=3))
+        self.lease("Ladder", -timedelta(hours=1))
+
+        self.assertEqual(reminders.send_lease_reminders(self.now), 2)
+
+        by_recipient = {message.to[0]: message.body for message in mail.outbox}
+        self.assertEqual(len(mail.outbox), 2)
+        for body in by_recipient.values():
+            self.assertIn("Drill", body)
+            self.assertIn("Tent", body)
+            self.assertNotIn("Kayak", body)
+            self.assertNotIn("Ladder", body)
+        self.assertIn("return it to owner", by_recipient["lessee@example.com"])
+        self.assertIn("from lessee", by_recipient["owner@example.com"])
+
+    def test_reminders_are_sent_once_per_end_date(self):
+        lease = self.lease("Drill", timedelta(hours=2))
+        reminders.send_lease_reminders(self.now)
+        self.assertEqual(reminders.send_lease_reminders(self.now), 0)
+        self.assertEqual(LeaseReminder.objects.count(), 2)
+
+        # An extended lease is reminded of again.
+        lease.end_date += timedelta(hours=12)
+        lease.save()
+        self.assertEqual(reminders.send_lease_reminders(self.now), 2)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_queries_do_not_grow_with_due_leases(self):
+        self.lease("Drill", timedelta(hours=2))
+        with CaptureQueriesContext(connection) as few:
+            reminders.send_lease_reminders(self.now)
+        for i in range(10):
+            self.lease(f"Item {i}", timedelta(hours=3))
+        with CaptureQueriesContext(connection) as many:
+            reminders.send_lease_reminders(self.now)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(mail.outbox), 4)
+
+    def tearDown(self):
+        ArchivedLease.objects.all().delete()
+        Lease.objects.all().delete()
+        Item.objects.all().delete()
+        User.objects.all().delete()
+
+
+class ActiveManagerTest(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        self.item = Item.objects.create(name="Active Item", owner=self.user2)
+        self.inactive_item = Item.objects.create(name="Inactive Item", owner=self.user2, is_active=False)
+        self.subscription = Subscription.objects.create(name="Inactive Sub", owner=self.user2, is_active=False)
+        self.request = Request.objects.create(name="Inactive Request", owner=self.user2, is_active=False)
+        for obj in (self.item, self.inactive_item, self.subscription, self.request):
+            obj.shared_with.add(self.community)
+
+    def test_inactive_objects_drop_out_of_discover(self):
+        self.assertEqual(list(Item.active.filter(owner=self.user2)), [self.item])
+        self.assertEqual(list(get_items_available_for_lease(self.user1)), [self.item])
+        self.assertFalse(get_subscriptions_available_for_share(self.user1).exists())
+        self.assertFalse(get_pending_requests_for_user(self.user1).exists())
+
+    def test_inactive_community_stops_sharing(self):
+        self.community.is_active = False
+        self.community.save()
+        self.assertEqual(UserContext(self.user1).community_ids, [])
+        self.assertFalse(get_items_available_for_lease(self.user1).exists())
+        client = Client()
+        client.login(username="user1", password="password1")
+        response = client.get(reverse("community_detail", args=[self.community.pk]))
+        self.assertEqual(response.status_code, 200)
+        client.login(username="user2", password="password2")
+        response = client.get(reverse("community_detail", args=[self.community.pk]))
+        self.assertEqual(response.status_code, 400)
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Subscription.objects.all().delete()
+        Request.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class MembershipWriteTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.owner = User.objects.create_superuser(username="owner", password="password")
+        self.community = Community.objects.create(name="Test Community", owner=self.owner)
+        self.users = [User.objects.create_user(username=f"user{i}", password="password") for i in range(3)]
+
+    def test_add_members_is_a_single_idempotent_insert(self):
+        # The membership insert, the member count and the outbox event.
+        with self.assertNumQueries(3):
+            add_members(self.community, [self.users[0].pk, self.users[1].pk])
+        with self.assertNumQueries(3) as queries:
+            add_members(self.community, [self.users[0].pk, self.users[2].pk])
+        # Incremented by the one row inserted, not recounted.
+        self.assertNotIn("COUNT(", queries.captured_queries[1]["sql"].upper())
+        with self.assertNumQueries(1):
+            add_members(self.community, [self.users[1].pk])
+        self.assertEqual(set(self.community.members.all()), set(self.users))
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.member_count, 3)
+        event = Event.objects.filter(event_type="community.members_added").last()
+        self.assertEqual(event.payload["user_ids"], [self.users[2].pk])
+
+    def test_community_add_view_saves_once(self):
+        self.client.login(username="owner", password="password")
+        response = self.client.post(reverse("community_add"), {"name": "New Community"})
+        community = Community.objects.get(name="New Community")
+        self.assertRedirects(response, reverse("community_detail", args=[community.pk]))
+        self.assertEqual(list(community.members.all()), [self.owner])
+
+    def test_admin_bulk_add_by_username(self):
+        self.client.login(username="owner", password="password")
+        url = reverse("admin:backend_community_changelist")
+        data = {"action": "add_members_by_username", "_selected_action": [self.community.pk]}
+        response = self.client.post(url, data)
+        self.assertContains(response, "Add members by username")
+
+        response = self.client.post(
+            url, {**data, "apply": "1", "usernames": "user0, user1\nuser0 nobody"}, follow=True
+        )
+        self.assertContains(response, "Unknown usernames: nobody")
+        self.assertEqual(set(self.community.members.all()), set(self.users[:2]))
+
+    def tearDown(self):
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class ConcurrentInviteTest(TransactionTestCase):
+    def test_many_threads_accepting_the_same_invite(self):
+        owner = User.objects.create_user(username="owner", password="password")
+        community = Community.objects.create(name="Viral Community", owner=owner)
+        users = [User.objects.create_user(username=f"user{i}") for i in range(8)]
+        url = reverse("accept_invite", args=[community.invite_uuid])
+        # Every user joins twice at the same time.
+        clients = []
+        for user in users * 2:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        barrier = threading.Barrier(len(clients), timeout=30)
+        errors = []
+
+        def join(client):
+            try:
+                barrier.wait()
+                response = client.post(url)
+                if response.status_code != 302:
+                    errors.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=join, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            Community.members.through.objects.filter(community=community).count(),
+            len(users),
+        )
+
+
+class SeatAllocationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="password")
+        self.users = [
+            User.objects.create_user(username=f"user{i}", password="password")
+            for i in range(3)
+        ]
+        self.community = Community.objects.create(name="Family", owner=self.owner)
+        self.community.members.add(self.owner, *self.users)
+        self.subscription = Subscription.objects.create(
+            name="Streaming", owner=self.owner, seats=2
+        )
+        self.subscription.shared_with.add(self.community)
+
+    def waiting(self):
+        return list(
+            SeatWaitlistEntry.objects.filter(subscription=self.subscription)
+            .order_by("id")
+            .values_list("user_id", flat=True)
+        )
+
+    def test_claims_beyond_the_seats_are_waitlisted(self):
+        self.assertTrue(claim_seat(self.subscription, self.users[0]))
+        self.assertTrue(claim_seat(self.subscription, self.users[1]))
+        self.assertFalse(claim_seat(self.subscription, self.users[2]))
+        # Claiming again changes nothing.
+        self.assertTrue(claim_seat(self.subscription, self.users[0]))
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.seats_taken, 2)
+        self.assertEqual(self.subscription.seats_left, 0)
+        self.assertCountEqual(self.subscription.shared_to.all(), self.users[:2])
+        self.assertEqual(self.waiting(), [self.users[2].pk])
+
+    def test_released_seat_goes_to_the_first_waiting_user(self):
+        for user in self.users:
+            claim_seat(self.subscription, user)
+
+        release_seat(self.subscription, self.users[0])
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.seats_taken, 2)
+        self.assertCountEqual(self.subscription.shared_to.all(), self.users[1:])
+        self.assertEqual(self.waiting(), [])
+
+    def test_raising_the_seats_promotes_waiting_users(self):
+        for user in self.users:
+            claim_seat(self.subscription, user)
+        self.client.force_login(self.owner)
+
+        response = self.client.post(
+            reverse("subscription_update", args=[self.subscription.pk]),
+            {
+                "name": "Streaming",
+                "is_active": True,
+                "seats": 3,
+                "shared_with": [self.community.pk],
+                "shared_to": [user.pk for user in self.users[:2]],
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.seats_taken, 3)
+        self.assertEqual(self.waiting(), [])
+
+    def test_form_rejects_more_users_than_seats(self):
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse("subscription_update", args=[self.subscription.pk]),
+            {
+                "name": "Streaming",
+                "is_active": True,
+                "seats": 2,
+                "shared_with": [self.community.pk],
+                "shared_to": [user.pk for user in self.users],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("shared_to", response.context["form"].errors)
+
+    def test_claim_and_release_views(self):
+        self.client.force_login(self.users[0])
+        detail = reverse("subscription_detail", args=[self.subscription.pk])
+
+        response = self.client.post(
+            reverse("subscription_claim_seat", args=[self.subscription.pk])
+        )
+        self.assertRedirects(response, detail)
+        self.assertContains(self.client.get(detail), "Release my seat")
+
+        self.client.post(
+            reverse("subscription_release_seat", args=[self.subscription.pk])
+        )
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.seats_taken, 0)
+
+        stranger = User.objects.create_user(username="stranger")
+        self.client.force_login(stranger)
+        response = self.client.post(
+            reverse("subscription_claim_seat", args=[self.subscription.pk])
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentSeatClaimTest(TransactionTestCase):
+    def test_many_threads_claiming_the_last_seats(self):
+        owner = User.objects.create_user(username="owner")
+        subscription = Subscription.objects.create(
+            name="Streaming", owner=owner, seats=3
+        )
+        users = [User.objects.create_user(username=f"user{i}") for i in range(12)]
+        barrier = threading.Barrier(len(users), timeout=30)
+        errors = []
+
+        def claim(user):
+            try:
+                barrier.wait()
+                claim_seat(subscription, user)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.seats_taken, 3)
+        self.assertEqual(subscription.shared_to.count(), 3)
+        self.assertEqual(
+            SeatWaitlistEntry.objects.filter(subscription=subscription).count(), 9
+        )
+
+
+class SharedEventStreamTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1, self.user2)
+        self.item = Item.objects.create(name="Tent", owner=self.user2)
+
+    def share_item(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.shared_with.add(self.community)
+
+    def test_sharing_publishes_an_event(self):
+        async def receive():
+            with get_broker().subscribe() as events:
+                await sync_to_async(self.share_item)()
+                return await asyncio.wait_for(events.get(), 1)
+
+        event = async_to_sync(receive)()
+        self.assertEqual(event["type"], "item_shared")
+        self.assertEqual(event["community_ids"], [self.community.pk])
+        self.assertEqual(event["name"], "Tent")
+
+    async def test_stream_delivers_shares_to_community_members(self):
+        await self.async_client.aforce_login(self.user1)
+        response = await self.async_client.get(reverse("events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+        await sync_to_async(self.share_item)()
+        message = (await asyncio.wait_for(anext(stream), 1)).decode()
+        self.assertTrue(message.startswith("event: item_shared\n"))
+        self.assertIn('"name": "Tent"', message)
+        self.assertNotIn("community_ids", message)
+        await stream.aclose()
+
+    async def test_stream_requires_login(self):
+        response = await self.async_client.get(reverse("events"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_is_not_served_by_wsgi_workers(self):
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse("events"))
+        self.assertEqual(response.status_code, 204)
+
+    def test_pages_open_the_stream_only_when_enabled(self):
+        self.client.force_login(self.user1)
+        with self.settings(EVENT_STREAM_ENABLED=False):
+            self.assertNotContains(self.client.get(reverse("about")), "EventSource(")
+        with self.settings(EVENT_STREAM_ENABLED=True):
+            self.assertContains(self.client.get(reverse("about")), "EventSource(")
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        Event.objects.all().delete()
+
+    def test_changes_are_recorded(self):
+        self.community.members.add(self.user1, self.user2)
+        self.client.login(username="user1", password="password1")
+        self.client.post(reverse("item_add"), {"name": "Drill", "item_type": Item.OTHER})
+        item = Item.objects.get(name="Drill")
+        lease = Lease.objects.create(
+            item=item,
+            lessee=self.user2,
+            start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=1),
+        )
+        item_id = item.pk
+        item.delete()
+        self.assertEqual(
+            [(event.event_type, event.payload.get("id")) for event in Event.objects.order_by("id")],
+            [
+                ("community.members_added", None),
+                ("item.created", item_id),
+                ("lease.created", lease.pk),
+                ("lease.deleted", lease.pk),
+                ("item.deleted", item_id),
+            ],
+        )
+        self.assertEqual(
+            Event.objects.get(event_type="community.members_added").payload["user_ids"],
+            [self.user1.pk, self.user2.pk],
+        )
+
+    def test_failed_change_records_nothing(self):
+        with self.assertRaises(ValidationError):
+            with transaction.atomic():
+                item = Item.objects.create(name="Drill", owner=self.user1)
+                Lease.objects.create(
+                    item=item,
+                    lessee=self.user2,
+                    start_date=timezone.now(),
+                    end_date=timezone.now() - timedelta(days=1),
+                )
+        self.assertFalse(Event.objects.exists())
+
+    def test_consumer_resumes_from_checkpoint_and_retries_failed_batches(self):
+        for i in range(5):
+            Event.record("test.event", number=i)
+        seen, fail = [], [True]
+
+        def handler(events):
+            seen.extend(event.payload["number"] for event in events)
+            if fail.pop() if fail else False:
+                raise RuntimeError("consumer crashed")
+
+        with patch.dict(CONSUMERS, {"test": handler}):
+            with self.assertRaises(RuntimeError):
+                consume_batch("test", batch_size=2)
+            while consume_batch("test", batch_size=2):
+                pass
+        # The crashed batch is delivered again.
+        self.assertEqual(seen, [0, 1, 0, 1, 2, 3, 4])
+        self.assertEqual(
+            ConsumerCheckpoint.objects.get(name="test").last_event_id,
+            Event.objects.latest("id").id,
+        )
+
+    def test_events_are_consumed_in_transaction_order(self):
+        for number, txid in enumerate((7, 5, 6)):
+            Event.objects.create(
+                event_type="test.event", payload={"number": number}, txid=txid
+            )
+        seen = []
+        with patch.dict(
+            CONSUMERS,
+            {"test": lambda events: seen.extend(e.payload["number"] for e in events)},
+        ):
+            consume_batch("test", batch_size=2)
+            consume_batch("test", batch_size=2)
+        self.assertEqual(seen, [1, 2, 0])
+        checkpoint = ConsumerCheckpoint.objects.get(name="test")
+        self.assertEqual(checkpoint.last_txid, 7)
+
+    def test_consume_events_command(self):
+        Event.record("test.event", number=1)
+        with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            call_command("consume_events", "jsonl", once=True, stderr=io.StringIO())
+        self.assertEqual(json.loads(stdout.getvalue())["payload"], {"number": 1})
+
+    def tearDown(self):
+        Item.objects.all().delete()
+        Community.objects.all().delete()
+        User.objects.all().delete()
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "Only Postgres commits transactions out of the order of their event ids.",
+)
+class OutboxVisibilityTest(TransactionTestCase):
+    def test_events_of_slow_transactions_are_not_skipped(self):
+        recorded, commit = threading.Event(), threading.Event()
+
+        def slow_transaction():
+            try:
+                with transaction.atomic():
+                    Event.record("test.event", number=0)
+                    recorded.set()
+                    commit.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_transaction)
+        thread.start()
+        recorded.wait(10)
+        # Gets a higher id, but commits first.
+        Event.record("test.event", number=1)
+        seen = []
+        with patch.dict(
+            CONSUMERS,
+            {"test": lambda events: seen.extend(e.payload["number"] for e in events)},
+        ):
+            consume_batch("test", batch_size=10)
+            self.assertEqual(seen, [])
+            commit.set()
+            thread.join()
+            consume_batch("test", batch_size=10)
+        self.assertEqual(seen, [0, 1])
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def register(self, func=None, max_attempts=3, every=None):
+        def record(**kwargs):
+            self.calls.append(kwargs)
+
+        return patch.dict(
+            JOBS, {"test": JobHandler(func or record, max_attempts, every)}
+        )
+
+    def test_job_runs_once(self):
+        with self.register():
+            job = enqueue("test", number=1)
+            self.assertTrue(run_next_job("worker"))
+            self.assertFalse(run_next_job("worker"))
+        job.refresh_from_db()
+        self.assertEqual(self.calls, [{"number": 1}])
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.DONE, 1, ""))
+
+    def test_scheduled_job_waits_until_due(self):
+        with self.register():
+            job = enqueue("test", run_at=timezone.now() + timedelta(hours=1))
+            self.assertFalse(run_next_job("worker"))
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            self.assertTrue(run_next_job("worker"))
+
+    def test_failed_job_is_retried_with_backoff(self):
+        def fail():
+            raise RuntimeError("mail server down")
+
+        with self.register(fail, max_attempts=2):
+            job = enqueue("test")
+            with self.assertLogs("backend.jobs", "ERROR"):
+                run_next_job("worker")
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+            self.assertIn("mail server down", job.last_error)
+            self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=29))
+
+            # Not due yet.
+            self.assertFalse(run_next_job("worker"))
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            with self.assertLogs("backend.jobs", "ERROR"):
+                run_next_job("worker")
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_unique_key_allows_one_pending_job(self):
+        with self.register():
+            self.assertIsNotNone(enqueue("test", unique_key="digest:1"))
+            self.assertIsNone(enqueue("test", unique_key="digest:1"))
+            run_next_job("worker")
+            self.assertIsNotNone(enqueue("test", unique_key="digest:1"))
+
+    def test_periodic_job_schedules_its_next_run(self):
+        with patch.dict(JOBS, clear=True), self.register(every=timedelta(days=1)):
+            schedule_periodic_jobs()
+            schedule_periodic_jobs()
+            self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+            run_next_job("worker")
+        next_run = Job.objects.get(status=Job.QUEUED)
+        self.assertEqual(next_run.unique_key, "periodic:test")
+        self.assertGreater(next_run.run_at, timezone.now() + timedelta(hours=23))
+
+    def test_stale_running_job_is_requeued(self):
+        with self.register():
+            job = enqueue("test")
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING,
+            locked_at=timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT_SECONDS + 1),
+        )
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.QUEUED)
+
+    def test_weekly_summary_runs_as_jobs(self):
+        user1 = User.objects.create_user(username="user1", email="user1@example.com")
+        user2 = User.objects.create_user(username="user2", email="user2@example.com")
+        community = Community.objects.create(name="Test Community", owner=user1)
+        community.members.add(user1, user2)
+        item = Item.objects.create(name="Drill", owner=user1)
+        item.shared_with.add(community)
+
+        call_command("weekly_summary_campaign", enqueue=True)
+        self.assertEqual(Job.objects.filter(name="weekly_summary").count(), 2)
+        # The worker closes connections between jobs, which would close the
+        # connection holding the test's transaction.
+        with patch("sys.stdout", new_callable=io.StringIO), patch(
+            "backend.management.commands.run_workers.close_old_connections"
+        ):
+            call_command("run_workers", once=True, stdout=io.StringIO())
+
+        self.assertEqual(
+            set(Job.objects.filter(name="weekly_summary").values_list("status", flat=True)),
+            {Job.DONE},
+        )
+        self.assertEqual([message.to for message in mail.outbox], [["user2@example.com"]])
+
+
+class CounterTest(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+
+    def assertCounts(self, members, items, subscriptions):
+        self.community.refresh_from_db()
+        self.assertEqual(
+            (
+                self.community.member_count,
+                self.community.shared_item_count,
+                self.community.shared_subscription_count,
+            ),
+            (members, items, subscriptions),
+        )
+
+    def test_membership_changes_are_counted(self):
+        self.community.members.add(self.user1, self.user2)
+        self.community.members.add(self.user1)
+        self.assertCounts(2, 0, 0)
+        self.user1.community_members.remove(self.community)
+        self.assertCounts(1, 0, 0)
+        self.user2.delete()
+        self.assertCounts(0, 0, 0)
+
+    def test_sharing_and_deactivation_are_counted(self):
+        item = Item.objects.create(name="Drill", owner=self.user1)
+        inactive = Item.objects.create(name="Saw", owner=self.user1, is_active=False)
+        subscription = Subscription.objects.create(name="Netflix", owner=self.user1)
+        item.shared_with.add(self.community)
+        self.community.shared_items.add(inactive)
+        subscription.shared_with.add(self.community)
+        self.assertCounts(0, 1, 1)
+
+        item = Item.objects.get(pk=item.pk)
+        item.is_active = False
+        item.save()
+        self.assertCounts(0, 0, 1)
+        inactive.is_active = True
+        inactive.save()
+        self.assertCounts(0, 1, 1)
+
+        inactive.delete()
+        subscription.shared_with.clear()
+        self.assertCounts(0, 0, 0)
+
+    def test_owned_counts(self):
+        Item.objects.create(name="Drill", owner=self.user1)
+        item = Item.objects.create(name="Saw", owner=self.user1)
+        Subscription.objects.create(name="Netflix", owner=self.user1)
+        item.delete()
+        stats = UserStats.objects.get(user=self.user1)
+        self.assertEqual((stats.item_count, stats.subscription_count), (1, 1))
+
+    def test_bulk_writes_are_counted(self):
+        self.community.members.add(self.user1)
+        Item.objects.create(name="Drill", owner=self.user1)
+        import_items(self.user1, [(2, {"name": "Saw"})], community_ids=[self.community.pk])
+        self.assertEqual(UserStats.objects.get(user=self.user1).item_count, 2)
+        self.assertCounts(1, 1, 0)
+        bulk_share_with_community(self.user1, Item, self.community)
+        self.assertCounts(1, 2, 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.community.members.add(self.user1)
+        Item.objects.create(name="Drill", owner=self.user2).shared_with.add(self.community)
+        Community.objects.update(member_count=7, shared_item_count=0)
+        UserStats.objects.all().delete()
+
+        out = io.StringIO()
+        call_command("reconcile_counters", batch_size=1, stdout=out)
+        self.assertIn("Recounted 1 communities", out.getvalue())
+        self.assertCounts(1, 1, 0)
+        self.assertEqual(UserStats.objects.get(user=self.user2).item_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.user1).item_count, 0)
+
+    def test_stats_tiles_use_counters(self):
+        self.community.members.add(self.user1)
+        Item.objects.create(name="Drill", owner=self.user1).shared_with.add(self.community)
+        Community.objects.update(shared_item_count=5)
+        self.client.login(username="user1", password="password1")
+        response = self.client.get(reverse("community_detail", args=[self.community.pk]))
+        self.assertEqual(response.context["shared_items_count"], 5)
+        self.assertEqual(response.context["member_count"], 1)
+
+
+class CommunityDetailTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="password")
+        self.community = Community.objects.create(name="Test Community", owner=self.owner)
+        self.request = RequestFactory().get("/")
+
+    def add_member(self, username, picture=None):
+        user = User.objects.create_user(username=username)
+        if picture:
+            SocialAccount.objects.create(
+                user=user, provider="google", uid=username, extra_data={"picture": picture}
+            )
+        self.community.members.add(user)
+
+    def test_member_avatars_are_prefetched(self):
+        self.add_member("user0", "https://example.com/user0.png")
+        with self.assertNumQueries(4):
+            get_data_for_community_detail(self.community.pk, self.request)
+
+        # The community with its owner, the members, their social accounts and
+        # the social app, however many members there are.
+        self.add_member("user1", "https://example.com/user1.png")
+        self.add_member("user2")
+        with self.assertNumQueries(4):
+            data = get_data_for_community_detail(self.community.pk, self.request)
+        self.assertEqual(
+            sorted((member["username"], member["profile_picture"]) for member in data["members"]),
+            [
+                ("user0", "https://example.com/user0.png"),
+                ("user1", "https://example.com/user1.png"),
+                ("user2", None),
+            ],
+        )
+
+
+@skipUnless(settings.RAISE_ON_LAZY_LOADS, "the lazy load check is not installed")
+class LazyLoadCheckTest(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.community.members.add(self.user1)
+        item = Item.objects.create(name="Drill", owner=self.user1)
+        item.shared_with.add(self.community)
+        Request.objects.create(name="Ladder", owner=self.user1).shared_with.add(self.community)
+        Lease.objects.create(
+            item=item,
+            lessee=self.user1,
+            start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=1),
+        )
+        self.template = engines["django"].from_string("{% for item in items %}{{ item.owner }}{% endfor %}")
+
+    def test_lazy_relation_in_template_raises(self):
+        with self.assertRaisesMessage(LazyLoadError, "Item.owner"):
+            self.template.render({"items": Item.objects.all()})
+        self.assertEqual(self.template.render({"items": item_cards(Item.objects.all())}), "user1")
+
+    def test_deferred_field_in_template_raises(self):
+        template = engines["django"].from_string("{% for item in items %}{{ item.is_active }}{% endfor %}")
+        with self.assertRaisesMessage(LazyLoadError, "Item.is_active"):
+            template.render({"items": item_cards(Item.objects.all())})
+
+    def test_lazy_loads_outside_templates_are_allowed(self):
+        self.assertEqual(Item.objects.get().owner, self.user1)
+
+    def test_listing_pages_render(self):
+        self.client.login(username="user1", password="password1")
+        for url in (
+            "/",
+            reverse("item_list"),
+            reverse("subscription_list"),
+            reverse("request_list"),
+            reverse("community_list"),
+            reverse("community_detail", args=[self.community.pk]),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def test_request_listing_projection(self):
+        requests = get_user_requests(self.user1)["owned"]["pending"]
+        with self.assertNumQueries(1):
+            self.assertEqual([request.owner.username for request in requests], ["user1"])
+
+
+class AdminScalabilityTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community = Community.objects.create(name="Test Community", owner=self.user1)
+        self.items = [Item.objects.create(name=f"Item {i}", owner=self.user1) for i in range(3)]
+        for item in self.items:
+            item.shared_with.add(self.community)
+        self.client.login(username="admin", password="password")
+        self.url = reverse("admin:backend_item_changelist")
+
+    def test_changelists_render(self):
+        Request.objects.create(name="Ladder", owner=self.user1)
+        for model in ("item", "subscription", "request", "community", "lease", "archivedlease", "job"):
+            response = self.client.get(reverse(f"admin:backend_{model}_changelist"))
+            self.assertEqual(response.status_code, 200, model)
+
+    def test_item_changelist_queries_do_not_grow_with_rows(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as three_items:
+            self.client.get(self.url)
+        for i in range(3, 10):
+            Item.objects.create(name=f"Item {i}", owner=self.user2)
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as ten_items:
+            self.client.get(self.url)
+        self.assertEqual(len(ten_items), len(three_items))
+
+    def test_search_by_pk_or_name_prefix(self):
+        response = self.client.get(self.url, {"q": str(self.items[1].pk)})
+        self.assertEqual(list(response.context["cl"].result_list), [self.items[1]])
+        response = self.client.get(self.url, {"q": "Item"})
+        self.assertEqual(response.context["cl"].result_count, 3)
+        response = self.client.get(self.url, {"q": "tem"})
+        self.assertEqual(response.context["cl"].result_count, 0)
+        # A digit, but not a number the primary key lookup can take.
+        response = self.client.get(self.url, {"q": "²"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cl"].result_count, 0)
+
+    def test_bulk_deactivate(self):
+        data = {"action": "deactivate", "_selected_action": [item.pk for item in self.items[:2]]}
+        with patch("backend.services.BULK_BATCH_SIZE", 1):
+            self.client.post(self.url, data)
+        self.assertEqual(Item.active.count(), 1)
+        self.community.refresh_from_db()
+        self.assertEqual(self.community.shared_item_count, 1)
+        self.assertEqual(Event.objects.filter(event_type="item.bulk_updated").count(), 2)
+
+    def test_reassign_owner_of_all_matching(self):
+        data = {"action": "reassign_owner", "select_across": "1", "_selected_action": [self.items[0].pk]}
+        response = self.client.post(self.url, data)
+        self.assertContains(response, "Give all matching items to")
+
+        response = self.client.post(self.url, {**data, "apply": "1", "username": "nobody"})
+        self.assertContains(response, "No user with this username.")
+
+        self.client.post(self.url, {**data, "apply": "1", "username": "user2"})
+        self.assertFalse(Item.objects.filter(owner=self.user1).exists())
+        self.assertEqual(UserStats.objects.get(user=self.user2).item_count, 3)
+        self.assertEqual(UserStats.objects.get(user=self.user1).item_count, 0)
+
+
+class MembershipIndexTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            MEMBERSHIP_INDEX_PATH=f"{directory.name}/memberships.idx"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.community1 = Community.objects.create(name="Community 1", owner=self.user1)
+        self.community2 = Community.objects.create(name="Community 2", owner=self.user2)
+        self.community1.members.add(self.user1, self.user2)
+        self.community2.members.add(self.user2)
+        self.item = Item.objects.create(name="Drill", owner=self.user1)
+        self.item.shared_with.add(self.community1)
+        self.subscription = Subscription.objects.create(name="Netflix", owner=self.user2)
+        self.subscription.shared_with.add(self.community2)
+
+    def refresh_index(self):
+        call_command("membership_index", "--once", stderr=io.StringIO())
+
+    def test_lookups_are_answered_by_the_index(self):
+        self.refresh_index()
+        self.assertIsNotNone(get_index())
+        with self.assertNumQueries(0):
+            self.assertEqual(UserContext(self.user2).community_ids, [self.community1.pk, self.community2.pk])
+            self.assertTrue(shares_community(self.user2, self.item))
+            self.assertFalse(shares_community(self.user1, self.subscription))
+
+    def test_changes_are_seen_before_the_index_catches_up(self):
+        self.refresh_index()
+        self.community2.members.add(self.user1)
+        self.subscription.shared_with.remove(self.community2)
+        self.assertEqual(UserContext(self.user1).community_ids, [self.community1.pk, self.community2.pk])
+        self.assertFalse(shares_community(self.user2, self.subscription))
+
+        self.refresh_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(UserContext(self.user1).community_ids, [self.community1.pk, self.community2.pk])
+            self.assertFalse(shares_community(self.user2, self.subscription))
+
+    def test_inactive_communities_are_left_out(self):
+        self.refresh_index()
+        self.community1.is_active = False
+        self.community1.save()
+        self.refresh_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(UserContext(self.user2).community_ids, [self.community2.pk])
+
+    def test_rebuilt_index_matches_refreshed_index(self):
+        self.refresh_index()
+        bulk_share_with_community(self.user2, Subscription, self.community1)
+        self.user2.community_members.clear()
+        self.refresh_index()
+        refreshed = get_index()
+        call_command("membership_index", "--once", "--rebuild", stderr=io.StringIO())
+        rebuilt = get_index()
+        self.assertIsNot(rebuilt, refreshed)
+        for section in ("user", "item", "subscription", "request"):
+            self.assertEqual(dict(rebuilt.items(section)), dict(refreshed.items(section)), section)
+        self.assertEqual(rebuilt.shared_community_ids("subscription", self.subscription.pk), [self.community1.pk, self.community2.pk])
+        self.assertEqual(rebuilt.community_ids(self.user2.pk), [])
+
+
+class ActivityFeedTest(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.user3 = User.objects.create_user(username="user3", password="password3")
+        self.community1 = Community.objects.create(name="Community 1", owner=self.user1)
+        self.community2 = Community.objects.create(name="Community 2", owner=self.user1)
+        self.community1.members.add(self.user1, self.user2, self.user3)
+        self.community2.members.add(self.user1, self.user2)
+
+    def share(self, user, name, *communities):
+        item = Item.objects.create(name=name, owner=user)
+        item.shared_with.add(*communities)
+        consume_batch("feed", 100)
+        return item
+
+    def feed_names(self, user, cursor=None):
+        return [entry.object_name for entry in get_activity_feed(user, cursor)["feed"]]
+
+    def test_shares_are_fanned_out_to_members(self):
+        self.share(self.user1, "Drill", self.community1)
+        self.assertEqual(FeedEntry.objects.filter(user__isnull=False).count(), 2)
+        self.assertEqual(self.feed_names(self.user2), ["Drill"])
+        self.assertEqual(self.feed_names(self.user1), [])
+
+        self.client.login(username="user3", password="password3")
+        self.assertContains(self.client.get(reverse("index")), "Drill")
+        results = self.client.get(reverse("api_feed")).json()["results"]
+        self.assertEqual([(entry["verb"], entry["actor"]) for entry in results], [("item_shared", "user1")])
+
+    def test_closer_members_rank_first(self):
+        self.share(self.user1, "Drill", self.community1, self.community2)
+        self.share(self.user3, "Saw", self.community1)
+        # user2 shares two communities with user1, one with user3.
+        self.assertEqual(self.feed_names(self.user2), ["Drill", "Saw"])
+        self.assertEqual(self.feed_names(self.user1), ["Saw"])
+
+    def test_large_communities_are_read_from_their_timeline(self):
+        with patch("backend.feed.FAN_OUT_MAX_MEMBERS", 2):
+            self.share(self.user1, "Drill", self.community1)
+        entry = FeedEntry.objects.get()
+        self.assertIsNone(entry.user_id)
+        self.assertEqual(self.feed_names(self.user3), ["Drill"])
+
+        self.community1.members.remove(self.user3)
+        self.assertEqual(self.feed_names(self.user3), [])
+
+    def test_cursor_pagination(self):
+        for name in ("Drill", "Saw", "Ladder"):
+            self.share(self.user1, name, self.community1)
+        with patch("backend.feed.PAGE_SIZE", 2):
+            page = get_activity_feed(self.user3)
+            self.assertEqual([entry.object_name for entry in page["feed"]], ["Ladder", "Saw"])
+            self.assertEqual(self.feed_names(self.user3, page["next_cursor"]), ["Drill"])
+        self.client.login(username="user3", password="password3")
+        self.assertEqual(self.client.get(reverse("index"), {"cursor": "nope"}).status_code, 400)
+
+    def test_unshared_and_deleted_objects_leave_the_feed(self):
+        drill = self.share(self.user1, "Drill", self.community1)
+        saw = self.share(self.user1, "Saw", self.community1)
+        drill.shared_with.remove(self.community1)
+        saw.delete()
+        consume_batch("feed", 100)
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_deactivated_and_completed_objects_leave_the_feed(self):
+        drill = self.share(self.user1, "Drill", self.community1)
+        subscription = Subscription.objects.create(name="Music", owner=self.user1)
+        subscription.shared_with.add(self.community1)
+        request = Request.objects.create(name="Tent", owner=self.user1)
+        request.shared_with.add(self.community1)
+        consume_batch("feed", 100)
+        self.assertEqual(set(self.feed_names(self.user2)), {"Drill", "Music", "Tent"})
+
+        drill.is_active = False
+        drill.save()
+        subscription.is_active = False
+        subscription.save()
+        request.is_completed = True
+        request.save()
+        consume_batch("feed", 100)
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_returned_leases_are_announced(self):
+        item = self.share(self.user1, "Drill", self.community1)
+        lease = Lease.objects.create(
+            item=item,
+            lessee=self.user2,
+            start_date=timezone.now() - timedelta(days=2),
+            end_date=timezone.now() + timedelta(days=2),
+        )
+        lease.end_date = timezone.now()
+        lease.save()
+        consume_batch("feed", 100)
+        entry = FeedEntry.objects.filter(user=self.user3).order_by("-score").first()
+        self.assertEqual(entry.verb, FeedEntry.LEASE_RETURNED)
+
+    def test_trim_keeps_the_newest_entries(self):
+        for name in ("Drill", "Saw", "Ladder"):
+            self.share(self.user1, name, self.community1)
+        with patch("backend.feed.MAX_ENTRIES", 2):
+            feed.trim_feeds()
+        self.assertEqual(self.feed_names(self.user3), ["Ladder", "Saw"])
@@ -1,11 +1,22 @@
 from django.contrib.auth.decorators import login_required
 from django.urls import path
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from . import views
+from . import api, views
+from .versions import get_user_page_etag
 from .views import item_detail
 
+
+def user_page(view):
+    # Browsers revalidate on every load and get a 304 when nothing changed.
+    return cache_control(private=True, no_cache=True)(
+        condition(etag_func=get_user_page_etag)(view)
+    )
+
+
 urlpatterns = [
-    path("", views.index_view, name="index"),
+    path("", user_page(views.index_view), name="index"),
     path("about", views.about_view, name="about"),
     # auth
     path("signup", views.SignUpView.as_view(), name="signup"),
@@ -49,7 +60,7 @@ urlpatterns = [
     # subscriptions
     path(
         "subscriptions/list",
-        login_required(views.SubscriptionListView.as_view()),
+        login_required(user_page(views.SubscriptionListView.as_view())),
         name="subscription_list",
     ),
     path(
@@ -64,6 +75,16 @@ urlpatterns = [
         views.subscription_detail_view,
         name="subscription_detail",
     ),
+    path(
+        "subscriptions/<int:pk>/claim",
+        views.subscription_claim_seat,
+        name="subscription_claim_seat",
+    ),
+    path(
+        "subscriptions/<int:pk>/release",
+        views.subscription_release_seat,
+        name="subscription_release_seat",
+    ),
     path(
         "subscriptions/<int:pk>/update",
         login_required(
@@ -81,7 +102,7 @@ urlpatterns = [
     # items
     path(
         "items/list",
-        login_required(views.ItemsListView.as_view()),
+        login_required(user_page(views.ItemsListView.as_view())),
         name="item_list",
     ),
     path(
@@ -89,6 +110,21 @@ urlpatterns = [
         login_required(views.ItemCreateView.as_view(extra_context={"view": "add"})),
         name="item_add",
     ),
+    path(
+        "items/available",
+        login_required(views.ItemAvailabilitySearchView.as_view()),
+        name="item_available",
+    ),
+    path(
+        "items/import",
+        login_required(views.ItemImportView.as_view()),
+        name="item_import",
+    ),
+    path(
+        "items/share",
+        login_required(views.BulkShareView.as_view()),
+        name="bulk_share",
+    ),
     path(
         "items/<int:pk>/update",
         login_required(views.ItemUpdateView.as_view(extra_context={"view": "update"})),
@@ -123,7 +159,7 @@ urlpatterns = [
     # requests
     path(
         "requests/list",
-        login_required(views.RequestListView.as_view()),
+        login_required(user_page(views.RequestListView.as_view())),
         name="request_list",
     ),
     path(
@@ -146,6 +182,31 @@ urlpatterns = [
         login_required(views.RequestDeleteView.as_view(extra_context={"view": "delete"})),
         name="request_delete",
     ),
+    # real-time events
+    path("events", views.event_stream_view, name="events"),
+    # exports
+    path("export/<slug:kind>", views.export_view, name="export"),
     # invite endpoints
     path("invite/<uuid:token>/", views.accept_invite, name="accept_invite"),
+    # json api
+    path("api/v1/batch", api.batch_view, name="api_batch"),
+    path("api/v1/feed", api.feed_view, name="api_feed"),
+    path("api/v1/availability", api.availability_view, name="api_availability"),
+    path(
+        "api/v1/items/<int:pk>/availability",
+        api.item_availability_view,
+        name="api_item_availability",
+    ),
+    path("api/v1/items/<slug:scope>", api.items_view, name="api_items"),
+    path(
+        "api/v1/subscriptions/<slug:scope>",
+        api.subscriptions_view,
+        name="api_subscriptions",
+    ),
+    path("api/v1/requests/<slug:scope>", api.requests_view, name="api_requests"),
+    path(
+        "api/v1/communities/<slug:scope>",
+        api.communities_view,
+        name="api_communities",
+    ),
 ]
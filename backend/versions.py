@@ -0,0 +1,74 @@
+"""
+Version stamps for per-user conditional GETs.
+
+Every user and every community has a random version stamp in the cache. It is
+replaced whenever something shown on a user's pages changes: their own objects,
+their memberships, or anything shared with one of their communities. The ETag
+of a page is a hash over these stamps, so checking it costs the single
+community membership query of the request's ``UserContext``.
+"""
+
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def user_version_key(user_id) -> str:
+    return f"user_version:{user_id}"
+
+
+def community_version_key(community_id) -> str:
+    return f"community_version:{community_id}"
+
+
+def _set_new_versions(keys: list[str]) -> None:
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def bump_versions(user_ids=(), community_ids=()) -> None:
+    keys = [user_version_key(user_id) for user_id in user_ids if user_id]
+    keys += [community_version_key(community_id) for community_id in community_ids]
+    if not keys:
+        return
+    _set_new_versions(keys)
+    # Bump again once the transaction is visible to other requests, otherwise a
+    # page rendered in between would be stored under the new version.
+    transaction.on_commit(lambda: _set_new_versions(keys))
+
+
+def get_versions(keys: list[str]) -> list[str]:
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Evicted or never written, start a fresh version rather than reusing
+        # an empty one that an earlier ETag may have been built from.
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [str(versions.get(key)) for key in keys]
+
+
+def get_user_page_etag(request, *args, **kwargs) -> str | None:
+    if not request.user.is_authenticated:
+        return None
+
+    user_context = request.user_context
+    keys = [user_version_key(user_context.user.pk)]
+    keys += [
+        community_version_key(community_id)
+        for community_id in sorted(user_context.community_ids)
+    ]
+    # Leases expire without any write, so ETags only live for a time bucket.
+    time_bucket = int(time.time() // settings.ETAG_TIME_BUCKET_SECONDS)
+    parts = [
+        settings.RELEASE_VERSION,
+        request.path,
+        str(user_context.user.pk),
+        str(time_bucket),
+        *get_versions(keys),
+    ]
+    return hashlib.md5(":".join(parts).encode()).hexdigest()
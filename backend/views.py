@@ -1,12 +1,29 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from django import forms
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import HttpResponseBadRequest
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse_lazy, reverse
 from django.views import generic
 from django.views.generic import CreateView
 
+from backend.exports import (
+    EXPORT_COLUMNS,
+    EXPORT_FORMATS,
+    get_export_querysets,
+    stream_export,
+)
 from backend.forms import (
     RegistrationForm,
     SubscriptionAddForm,
@@ -15,24 +32,44 @@ from backend.forms import (
     UpdateCommunityMembersForm,
     ItemCreateForm,
     ItemUpdateForm,
+    ItemImportForm,
+    AvailabilitySearchForm,
+    BulkShareForm,
     RequestCreateForm,
     RequestUpdateForm,
 )
-from backend.models import Subscription, Community, Item, Lease, Request
+from backend.models import (
+    Subscription,
+    Community,
+    Item,
+    Lease,
+    Request,
+    SeatWaitlistEntry,
+)
+from backend.pubsub import get_broker
 from backend.services import (
     get_user,
     get_all_users_from_communities_the_user_belongs_to,
-    get_dashboard_data,
+    get_activity_feed,
     get_user_subscriptions,
     get_user_communities,
     get_user_items,
+    get_user_requests,
+    item_cards,
     add_user_to_community,
     use_invite,
     get_data_for_profile_view,
     get_data_for_community_detail,
-    get_items_available_for_lease,
-    get_subscriptions_available_for_share,
-    get_pending_requests_for_user,
+    is_item_available_for_lease,
+    get_items_available_between,
+    get_lease_history,
+    shares_community,
+    claim_seat,
+    release_seat,
+    promote_waitlist,
+    bulk_share_with_community,
+    read_item_import,
+    import_items,
 )
 
 
@@ -50,9 +87,11 @@ def index_view(request):
     if not request.user.is_authenticated:
         return render(request, "backend/index.html")
 
-    dashboard_data = get_dashboard_data(request.user)
-    dashboard_data["requests"] = Request.objects.filter(owner=request.user)
-    return render(request, "backend/index.html", dashboard_data)
+    try:
+        feed = get_activity_feed(request.user_context, request.GET.get("cursor"))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, "backend/index.html", feed)
 
 
 def about_view(request):
@@ -62,7 +101,9 @@ def about_view(request):
 @login_required
 def profile_view(request):
     return render(
-        request, "backend/profile.html", context=get_data_for_profile_view(request.user)
+        request,
+        "backend/profile.html",
+        context=get_data_for_profile_view(request.user_context),
     )
 
 
@@ -70,7 +111,7 @@ def get_subscription_list_view(request):
     return render(
         request,
         "backend/subscription/list.html",
-        context=get_user_subscriptions(request.user),
+        context=get_user_subscriptions(request.user_context),
     )
 
 
@@ -79,33 +120,66 @@ class SubscriptionListView(generic.ListView):
     context_object_name = "subscriptions"
 
     def get_queryset(self):
-        return get_user_subscriptions(self.request.user)
+        return get_user_subscriptions(self.request.user_context)
+
+
+def _can_see_subscription(request, subscription):
+    return subscription.owner_id == request.user.pk or (
+        subscription.is_active and shares_community(request.user_context, subscription)
+    )
 
 
 def subscription_detail_view(request, pk):
+    subscription = get_object_or_404(Subscription.objects.select_related("owner"), pk=pk)
+    if not _can_see_subscription(request, subscription):
+        return HttpResponseBadRequest("You do not have access to this subscription")
+    context = {"subscription": subscription}
+    if subscription.owner_id != request.user.pk:
+        context["has_seat"] = subscription.shared_to.filter(pk=request.user.pk).exists()
+        entry = SeatWaitlistEntry.objects.filter(
+            subscription=subscription, user=request.user
+        ).first()
+        if entry is not None:
+            context["waitlist_position"] = SeatWaitlistEntry.objects.filter(
+                subscription=subscription, id__lte=entry.pk
+            ).count()
+    return render(request, "backend/subscription/detail.html", context)
+
+
+@login_required
+def subscription_claim_seat(request, pk):
+    if request.method != "POST":
+        return HttpResponseBadRequest("Seats can only be claimed with a POST.")
     subscription = get_object_or_404(Subscription, pk=pk)
-    if (
-        subscription.owner != request.user
-        and subscription not in get_subscriptions_available_for_share(request.user)
+    if subscription.owner_id == request.user.pk or not _can_see_subscription(
+        request, subscription
     ):
-        return HttpResponseBadRequest("You do not have access to this subscription")
-    return render(
-        request, "backend/subscription/detail.html", {"subscription": subscription}
-    )
+        return HttpResponseBadRequest("You can't claim a seat of this subscription.")
+    claim_seat(subscription, request.user)
+    return redirect("subscription_detail", subscription.pk)
+
+
+@login_required
+def subscription_release_seat(request, pk):
+    if request.method != "POST":
+        return HttpResponseBadRequest("Seats can only be released with a POST.")
+    subscription = get_object_or_404(Subscription, pk=pk)
+    release_seat(subscription, request.user)
+    return redirect("subscription_detail", subscription.pk)
 
 
 class SubscriptionBaseView(generic.View):
     def get_form(self, *args, **kwargs):
         form = super().get_form(*args, **kwargs)
         form.fields["shared_with"].queryset = Community.objects.filter(
-            members=self.request.user
+            pk__in=self.request.user_context.community_ids
         )
         form.instance.owner = self.request.user
         form.fields["shared_to"].queryset = User.objects.filter(
             pk__in=[
                 user.pk
                 for user in get_all_users_from_communities_the_user_belongs_to(
-                    self.request.user
+                    self.request.user_context
                 )
             ]
         ).exclude(pk=self.request.user.pk)
@@ -132,6 +206,12 @@ class SubscriptionUpdateView(SubscriptionBaseView, generic.UpdateView):
     def get_queryset(self):
         return Subscription.objects.filter(owner=self.request.user)
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # More seats may have been added.
+        promote_waitlist(self.object)
+        return response
+
 
 class SubscriptionDeleteView(generic.DeleteView):
     template_name = "backend/subscription/cud.html"
@@ -147,15 +227,17 @@ class CommunityListView(generic.ListView):
     context_object_name = "communities"
 
     def get_queryset(self):
-        return get_user_communities(self.request.user)
+        return get_user_communities(self.request.user_context)
 
 
 @login_required
 def community_detail_view(request, pk):
-    does_user_belong_to_community = Community.objects.filter(
-        pk=pk, members=request.user
-    ).exists()
-    if not does_user_belong_to_community:
+    does_user_belong_to_community = pk in request.user_context.community_ids
+    # Deactivated communities are only visible to their owner.
+    if (
+        not does_user_belong_to_community
+        and not Community.objects.filter(pk=pk, owner=request.user).exists()
+    ):
         return HttpResponseBadRequest("You do not belong to this community")
 
     return render(
@@ -205,9 +287,9 @@ class CommunityAddView(generic.CreateView):
 
     def form_valid(self, form):
         form.instance.owner = self.request.user
-        community = form.save()
-        community.members.add(self.request.user)
-        return super().form_valid(form)
+        self.object = form.save()
+        add_user_to_community(self.object, self.request.user)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse("community_detail", kwargs={"pk": self.object.pk})
@@ -227,24 +309,53 @@ class ItemsListView(generic.ListView):
     context_object_name = "items"
 
     def get_queryset(self):
-        return get_user_items(self.request.user)
+        return get_user_items(self.request.user_context)
+
+
+class ItemAvailabilitySearchView(generic.ListView):
+    template_name = "backend/item/available.html"
+    context_object_name = "items"
+    paginate_by = 30
+
+    def get_queryset(self):
+        self.form = AvailabilitySearchForm(self.request.GET or None)
+        if not self.form.is_valid():
+            return Item.objects.none()
+        return item_cards(
+            get_items_available_between(
+                self.request.user_context,
+                self.form.cleaned_data["start"],
+                self.form.cleaned_data["end"],
+            )
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["form"] = self.form
+        query = self.request.GET.copy()
+        query.pop("page", None)
+        context["query"] = query.urlencode()
+        return context
 
 
 @login_required
 def item_detail(request, pk):
-    item = get_object_or_404(Item, pk=pk)
-    if item.owner != request.user and item not in get_items_available_for_lease(
-        request.user
+    item = get_object_or_404(Item.objects.select_related("owner"), pk=pk)
+    if item.owner_id != request.user.pk and not is_item_available_for_lease(
+        request.user_context, item
     ):
         return HttpResponseBadRequest("You do not have access to this item")
-    return render(request, "backend/item/detail.html", {"item": item})
+    context = {"item": item}
+    if item.owner == request.user:
+        context["lease_history"] = get_lease_history(item)
+    return render(request, "backend/item/detail.html", context)
 
 
 class ItemBaseView(generic.View):
     def get_form(self, *args, **kwargs):
         form = super().get_form(*args, **kwargs)
         form.fields["shared_with"].queryset = Community.objects.filter(
-            members=self.request.user
+            pk__in=self.request.user_context.community_ids
         )
         return form
 
@@ -285,18 +396,69 @@ class ItemDeleteView(generic.DeleteView):
         return Item.objects.filter(owner=self.request.user)
 
 
+class ItemImportView(ItemBaseView, generic.FormView):
+    template_name = "backend/item/import.html"
+    form_class = ItemImportForm
+
+    def form_valid(self, form):
+        file = form.cleaned_data["file"]
+        try:
+            created, errors = import_items(
+                self.request.user,
+                read_item_import(file, file.name),
+                community_ids=[
+                    community.pk for community in form.cleaned_data["shared_with"]
+                ],
+            )
+        except ValueError as error:
+            # The file can't be read past this line, nothing was imported.
+            form.add_error("file", str(error))
+            return self.form_invalid(form)
+        return self.render_to_response(
+            self.get_context_data(form=form, created=created, errors=errors)
+        )
+
+
+class BulkShareView(generic.FormView):
+    template_name = "backend/item/bulk_share.html"
+    form_class = BulkShareForm
+
+    def get_form(self, *args, **kwargs):
+        form = super().get_form(*args, **kwargs)
+        form.fields["community"].queryset = Community.objects.filter(
+            pk__in=self.request.user_context.community_ids
+        )
+        return form
+
+    def form_valid(self, form):
+        if form.cleaned_data["kind"] == BulkShareForm.SUBSCRIPTIONS:
+            bulk_share_with_community(
+                self.request.user, Subscription, form.cleaned_data["community"]
+            )
+            return redirect("subscription_list")
+
+        bulk_share_with_community(
+            self.request.user,
+            Item,
+            form.cleaned_data["community"],
+            item_type=form.cleaned_data["item_type"],
+        )
+        return redirect("item_list")
+
+
 class LeaseBaseView(generic.View):
     def get_form(self, *args, **kwargs):
         form = super().get_form(*args, **kwargs)
+        # Item labels include the owner's username.
         form.fields["item"].queryset = Item.objects.filter(
             owner=self.request.user
-        ).exclude(is_active=False)
+        ).exclude(is_active=False).select_related("owner")
 
         form.fields["lessee"].queryset = User.objects.filter(
             pk__in=[
                 user.pk
                 for user in get_all_users_from_communities_the_user_belongs_to(
-                    self.request.user
+                    self.request.user_context
                 )
             ]
         ).exclude(pk=self.request.user.pk)
@@ -343,7 +505,7 @@ class RequestBaseView(generic.View):
     def get_form(self, *args, **kwargs):
         form = super().get_form(*args, **kwargs)
         form.fields["shared_with"].queryset = Community.objects.filter(
-            members=self.request.user
+            pk__in=self.request.user_context.community_ids
         )
         return form
 
@@ -388,8 +550,12 @@ class RequestDeleteView(generic.DeleteView):
 
 @login_required
 def request_detail_view(request, pk):
-    request_obj = get_object_or_404(Request, pk=pk)
-    if request_obj.owner != request.user and request_obj not in get_pending_requests_for_user(request.user):
+    request_obj = get_object_or_404(Request.objects.select_related("owner"), pk=pk)
+    if request_obj.owner_id != request.user.pk and not (
+        request_obj.is_active
+        and not request_obj.is_completed
+        and shares_community(request.user_context, request_obj)
+    ):
         return HttpResponseBadRequest("You do not have access to this request")
     return render(request, "backend/request/detail.html", {"request": request_obj})
 
@@ -399,16 +565,87 @@ class RequestListView(generic.ListView):
     context_object_name = "requests"
 
     def get_queryset(self):
-        owned = Request.objects.filter(owner=self.request.user)
-        completed = owned.filter(is_completed=True)
-        pending = owned.filter(is_completed=False)
-        return {
-            "discover": get_pending_requests_for_user(self.request.user),
-            "owned": {
-                "completed": completed,
-                "pending": pending,
-            },
-        }
+        return get_user_requests(self.request.user_context)
+
+
+@login_required
+def export_view(request, kind):
+    if kind not in EXPORT_COLUMNS:
+        raise Http404
+    file_format = request.GET.get("format", "csv")
+    if file_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown export format")
+
+    community = None
+    if "community" in request.GET:
+        community_id = request.GET["community"]
+        if not community_id.isdecimal() or int(community_id) not in (
+            request.user_context.community_ids
+        ):
+            return HttpResponseBadRequest("You do not belong to this community")
+        community = get_object_or_404(Community, pk=community_id)
+
+    querysets = get_export_querysets(kind, user=request.user, community=community)
+    response = StreamingHttpResponse(
+        stream_export(kind, querysets, file_format),
+        content_type=EXPORT_FORMATS[file_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{file_format}"'
+    return response
+
+
+async def _stream_events(user_id: int, community_ids: set[int]):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.SSE_MAX_SECONDS
+    with get_broker().subscribe() as events:
+        yield "retry: 5000\n\n"
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(
+                    events.get(), min(settings.SSE_KEEPALIVE_SECONDS, remaining)
+                )
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event["owner_id"] == user_id or community_ids.isdisjoint(
+                event["community_ids"]
+            ):
+                continue
+            data = {
+                key: value
+                for key, value in event.items()
+                if key not in ("type", "community_ids")
+            }
+            yield f"event: {event['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream_view(request):
+    """
+    Server-Sent Events telling the user about things shared with their
+    communities as they happen. Only served over ASGI, every open stream is a
+    single coroutine there.
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI buffers async streams until they end, holding a worker thread
+        # all along. Browsers don't reconnect after a 204.
+        return HttpResponse(status=204)
+
+    def get_user_and_communities():
+        if not request.user.is_authenticated:
+            return None, set()
+        return request.user, set(request.user_context.community_ids)
+
+    user, community_ids = await sync_to_async(get_user_and_communities)()
+    if user is None:
+        return HttpResponse(status=401)
+
+    response = StreamingHttpResponse(
+        _stream_events(user.pk, community_ids), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Keep proxies from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 def accept_invite(request, token):
@@ -36,7 +36,9 @@ if os.environ.get("DJANGO_ENV") == "production":
 SECRET_KEY = os.environ.get("SECRET_KEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get(
+    "DJANGO_DEBUG", "false" if os.environ.get("DJANGO_ENV") == "production" else "true"
+).lower() == "true"
 
 ALLOWED_HOSTS = ["closeknit.bharatkalluri.com", "localhost", "127.0.0.1"]
 CSRF_TRUSTED_ORIGINS = ["https://closeknit.bharatkalluri.com"]
@@ -64,16 +66,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "backend.middleware.ReplicaPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "backend.middleware.CachedAuthenticationMiddleware",
+    "backend.middleware.UserContextMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
     "allauth.account.middleware.AccountMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
+    # Innermost, so it wraps exactly the view.
+    "backend.middleware.AtomicWritesMiddleware",
 ]
 
 ROOT_URLCONF = "closeknit.urls"
@@ -82,13 +86,24 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [],
-        "APP_DIRS": True,
         "OPTIONS": {
+            # Always compile templates once per process, the development server
+            # resets the cache whenever a template changes.
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "backend.context_processors.event_stream",
             ],
         },
     },
@@ -112,6 +127,138 @@ DATABASES = {
     )
 }
 
+# Optional read replica, reads are routed by backend.routers.PrimaryReplicaRouter.
+# Any second database works as a stand-in replica during local development.
+if os.environ.get("REPLICA_DATABASE_URL"):
+    DATABASES["replica"] = dj_database_url.parse(
+        os.environ["REPLICA_DATABASE_URL"],
+        conn_max_age=600,
+        conn_health_checks=True,
+        test_options={"MIRROR": "default"},
+    )
+
+DATABASE_ROUTERS = ["backend.routers.PrimaryReplicaRouter"]
+
+# Lets SQLite test databases take concurrent writers.
+TEST_RUNNER = "backend.test_runner.TestRunner"
+
+# Keep users on the primary for a while after they wrote, to read their writes.
+REPLICA_PIN_COOKIE = "pin_primary"
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 15))
+
+for database in DATABASES.values():
+    if database.get("ENGINE") != "django.db.backends.postgresql":
+        continue
+    database_options = database.setdefault("OPTIONS", {})
+
+    # psycopg 3 native connection pool, see
+    # https://docs.djangoproject.com/en/5.1/ref/databases/#connection-pool
+    # Pooled connections go back to the pool at the end of every request, so
+    # persistent connections and their per request health check are disabled.
+    if os.environ.get("DATABASE_POOL", "false").lower() == "true":
+        database["CONN_MAX_AGE"] = 0
+        database["CONN_HEALTH_CHECKS"] = False
+        database_options["pool"] = {
+            "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DATABASE_POOL_MAX_SIZE", 10)),
+            "timeout": float(os.environ.get("DATABASE_POOL_TIMEOUT", 10)),
+            "max_idle": float(os.environ.get("DATABASE_POOL_MAX_IDLE", 300)),
+            "max_lifetime": float(os.environ.get("DATABASE_POOL_MAX_LIFETIME", 3600)),
+        }
+
+    # PgBouncer in transaction pooling mode hands a different server connection
+    # to every transaction, so cursors can't outlive one. Prepared statements
+    # are already disabled by Django for psycopg 3.
+    if os.environ.get("DATABASE_PGBOUNCER", "false").lower() == "true":
+        database["DISABLE_SERVER_SIDE_CURSORS"] = True
+        database_options["server_side_binding"] = False
+
+for database in DATABASES.values():
+    if database.get("ENGINE") != "django.db.backends.sqlite3":
+        continue
+    # The default in-memory test database uses SQLite's shared cache, whose
+    # locks fail at once instead of waiting. Tests that write from several
+    # threads at the same time need a file, see backend/test_runner.py.
+    if database["NAME"] != ":memory:":
+        database.setdefault("TEST", {}).setdefault(
+            "NAME", str(Path(database["NAME"]).with_name("test_db.sqlite3"))
+        )
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Sessions, users, ETag version stamps and membership index stamps are cached,
+# so production needs one cache shared by every worker on every machine, that
+# never evicts the stamps at random. Run Redis with a volatile-* maxmemory
+# policy, the stamps are stored without expiry. Production web servers refuse
+# to start without it, see backend/checks.py; commands like collectstatic and
+# migrate don't need it.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Conditional GETs, see backend/versions.py. The release is part of every ETag
+# so a deploy never answers 304 for a page rendered by older templates.
+RELEASE_VERSION = os.environ.get("FLY_IMAGE_REF", "")
+ETAG_TIME_BUCKET_SECONDS = 5 * 60
+AUTH_USER_CACHE_TIMEOUT = 60 * 60
+
+# Real-time events, see backend/pubsub.py. Pages only open the /events stream
+# when it is enabled, which needs an ASGI server answering /events: the WSGI
+# workers would buffer every stream and hold a thread for SSE_MAX_SECONDS.
+EVENT_STREAM_ENABLED = (
+    os.environ.get("EVENT_STREAM_ENABLED", "false").lower() == "true"
+)
+# Events published by the WSGI workers reach the ASGI process through Postgres.
+PUBSUB_BROKER = os.environ.get(
+    "PUBSUB_BROKER",
+    "backend.pubsub.PostgresBroker"
+    if os.environ.get("DJANGO_ENV") == "production"
+    else "backend.pubsub.InMemoryBroker",
+)
+SSE_KEEPALIVE_SECONDS = 20
+# Streams are closed after this long, browsers reconnect on their own.
+SSE_MAX_SECONDS = int(os.environ.get("SSE_MAX_SECONDS", 300))
+
+# Leases that ended longer ago than this are moved to the archive table by
+# `python manage.py archive_leases`.
+LEASE_ARCHIVE_AFTER_DAYS = int(os.environ.get("LEASE_ARCHIVE_AFTER_DAYS", 180))
+
+# Lessees and owners are reminded of leases ending within this many hours, see
+# backend/reminders.py.
+LEASE_REMINDER_HOURS = int(os.environ.get("LEASE_REMINDER_HOURS", 24))
+
+# Background jobs, see backend/jobs.py. A job still running after
+# JOB_TIMEOUT_SECONDS is assumed to have lost its worker and runs again.
+JOB_TIMEOUT_SECONDS = int(os.environ.get("JOB_TIMEOUT_SECONDS", 15 * 60))
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", 7))
+
+# Memory-mapped community membership index, see backend/membership_index.py.
+# Written by `python manage.py membership_index`, off while unset. An index that
+# fell further behind than MEMBERSHIP_INDEX_MAX_LAG_SECONDS is ignored.
+MEMBERSHIP_INDEX_PATH = os.environ.get("MEMBERSHIP_INDEX_PATH") or None
+MEMBERSHIP_INDEX_MAX_LAG_SECONDS = int(
+    os.environ.get("MEMBERSHIP_INDEX_MAX_LAG_SECONDS", 10 * 60)
+)
+
+# Raise while rendering a template that loads relations one object at a time,
+# see backend/lazyload.py.
+RAISE_ON_LAZY_LOADS = (
+    os.environ.get("RAISE_ON_LAZY_LOADS", str(DEBUG)).lower() == "true"
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "closeknit.settings")
 
 application = get_wsgi_application()
+
+# Imported once Django is set up.
+from backend.checks import ensure_shared_cache  # noqa: E402
+
+ensure_shared_cache()
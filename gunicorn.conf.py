@@ -0,0 +1,120 @@
+"""
+Gunicorn configuration for closeknit.
+
+Gunicorn picks this file up automatically when started from the project root,
+the Dockerfile also passes it explicitly. Every knob can be overridden through
+the environment so fly.io machines of different sizes can be tuned without a
+rebuild.
+
+For the full list of settings, see
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+import logging
+import multiprocessing
+import os
+
+# Never serve production traffic with DEBUG on, every worker would keep every
+# executed SQL statement in ``connection.queries`` for the lifetime of a request.
+os.environ.setdefault("DJANGO_DEBUG", "false")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "closeknit.settings")
+
+logger = logging.getLogger("gunicorn.error")
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+# Workers / concurrency
+workers = int(
+    os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Load the Django app once in the master so workers share its memory pages.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Recycle workers every ~N requests to cap slow memory growth, the jitter keeps
+# them from all restarting at the same moment.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def _warm_up_urls():
+    from django.urls import get_resolver
+
+    # Accessing the reverse dict populates the resolver, including all includes.
+    return len(get_resolver().reverse_dict)
+
+
+def _warm_up_templates():
+    from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+
+    compiled = 0
+    for engine in engines.all():
+        template_dirs = set()
+        for loader in engine.engine.template_loaders:
+            for inner_loader in getattr(loader, "loaders", [loader]):
+                if hasattr(inner_loader, "get_dirs"):
+                    template_dirs.update(inner_loader.get_dirs())
+
+        for template_dir in template_dirs:
+            for root, _, files in os.walk(template_dir):
+                for file_name in files:
+                    if not file_name.endswith((".html", ".txt")):
+                        continue
+                    template_name = os.path.relpath(
+                        os.path.join(root, file_name), template_dir
+                    )
+                    try:
+                        engine.get_template(template_name)
+                        compiled += 1
+                    except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+                        logger.debug("Skipping template %s: %s", template_name, exc)
+    return compiled
+
+
+def when_ready(server):
+    """
+    Resolve URLs and compile templates before accepting traffic. With
+    ``preload_app`` this runs in the master, so forked workers inherit the warm
+    resolver and the cached template loader's compiled templates.
+    """
+    if not preload_app:
+        return
+
+    from django.conf import settings
+    from django.db import connections
+
+    if settings.DEBUG:
+        logger.warning("DEBUG is on, SQL queries will be recorded on every request")
+
+    url_count = _warm_up_urls()
+    template_count = _warm_up_templates()
+    logger.info(
+        "Warmed up %d url patterns and %d templates", url_count, template_count
+    )
+
+    # Nothing opened in the master may leak into the workers.
+    connections.close_all()
+    for connection in connections.all():
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+
+
+def post_fork(server, worker):
+    """
+    Drop any database connection inherited from the master without closing it,
+    closing would terminate the server side session shared with the parent.
+    """
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None